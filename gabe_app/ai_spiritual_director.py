@@ -9,14 +9,19 @@ import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import os
-from google import genai
-from google.genai import types
+from llm_gateway import gateway
+from deadline import Deadline
 
 class SpiritualDirector:
     """AI-powered spiritual director with wisdom from saints and spiritual masters"""
     
     def __init__(self):
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        # Gemini through the shared gateway (pooled client, timeouts, circuit breaker)
+        self.gateway = gateway
+        
+        # Per-call ceilings in seconds - the assessment is a quick classification
+        self.assessment_timeout = float(os.environ.get("GABE_DIRECTION_ASSESSMENT_TIMEOUT_SECONDS", "8"))
+        self.session_timeout = float(os.environ.get("GABE_DIRECTION_SESSION_TIMEOUT_SECONDS", "12"))
         
         # Spiritual masters and their specialties
         self.spiritual_masters = {
@@ -109,7 +114,7 @@ class SpiritualDirector:
             'strength': ['Isaiah 40:31', 'Philippians 4:13', '2 Corinthians 12:9']
         }
     
-    def assess_spiritual_need(self, user_message: str, conversation_history: List[Dict]) -> Dict:
+    def assess_spiritual_need(self, user_message: str, conversation_history: List[Dict], deadline: Optional[Deadline] = None) -> Dict:
         """Assess the user's spiritual need and recommend appropriate direction"""
         
         prompt = f"""
@@ -139,16 +144,19 @@ class SpiritualDirector:
         """
         
         try:
-            # Try Gemini with shorter timeout
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",  # Use faster model
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
-            )
+            # Try Gemini with shorter timeout - skipped outright while its circuit is open
+            response_text = self.gateway.complete({
+                'providers': ['gemini'],
+                'models': {'gemini': "gemini-2.5-flash"},  # Use faster model
+                'contents': prompt,
+                'json': True,
+                'timeout': self.assessment_timeout,
+                'deadline': deadline
+            })
+            if not response_text:
+                raise ValueError("no assessment returned")
             
-            assessment = json.loads(response.text)
+            assessment = json.loads(response_text)
             logging.info("Gemini assessment successful")
             return assessment
             
@@ -176,7 +184,7 @@ class SpiritualDirector:
                     "session_focus": "general spiritual encouragement"
                 }
     
-    def create_spiritual_direction_session(self, assessment: Dict, user_message: str, user_name: str = "friend") -> Dict:
+    def create_spiritual_direction_session(self, assessment: Dict, user_message: str, user_name: str = "friend", deadline: Optional[Deadline] = None) -> Dict:
         """Create a personalized spiritual direction session"""
         
         master_key = assessment.get('recommended_master', 'st_francis_de_sales')
@@ -201,13 +209,16 @@ class SpiritualDirector:
         """
         
         try:
-            # Try Gemini with faster model
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",  # Faster model
-                contents=session_prompt
-            )
+            # Try Gemini with faster model - skipped outright while its circuit is open
+            response_text = self.gateway.complete({
+                'providers': ['gemini'],
+                'models': {'gemini': "gemini-2.5-flash"},  # Faster model
+                'contents': session_prompt,
+                'timeout': self.session_timeout,
+                'deadline': deadline
+            })
             
-            raw_text = response.text or "The Lord is with you in this moment, dear friend."
+            raw_text = response_text or "The Lord is with you in this moment, dear friend."
             logging.info("Gemini direction successful")
             
         except Exception as e:
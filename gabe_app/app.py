@@ -1,7 +1,9 @@
 import os
+import hmac
+import json
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from sqlalchemy.orm import DeclarativeBase
@@ -14,6 +16,16 @@ from gamified_spiritual_features import GamifiedSpiritualFeatures
 from prayer_cards import PrayerCardsSystem
 from drop_of_hope import DropOfHope
 from ai_spiritual_director import SpiritualDirector
+from metrics import metrics
+from provider_health import provider_health
+from llm_gateway import gateway
+from conversation_summary import ConversationSummarizer
+from deadline import Deadline
+from turn_buffer import HistoryVersions, TurnBuffer
+from conversation_writer import ConversationWriter
+from pipeline import StageTimer
+from conversation_archive import ConversationArchiver
+from history_purge import HistoryPurger
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -45,6 +57,9 @@ db = SQLAlchemy(app, model_class=Base)
 with app.app_context():
     import models
     User, Conversation = models.create_models(db)
+    ConversationSummary = models.ConversationSummary
+    ConversationArchive = models.ConversationArchive
+    HistoryPurge = models.HistoryPurge
     db.create_all()
     logging.info("Database tables created successfully")
 
@@ -67,6 +82,32 @@ spiritual_features = SpiritualFeatures()
 gamified_features = GamifiedSpiritualFeatures()
 prayer_cards = PrayerCardsSystem()
 spiritual_director = SpiritualDirector()
+# Recent turns per user stay in memory so steady chat turns skip the history query; a version
+# counter in the machine-local cache file tells a worker when another one changed the history
+turn_buffer = TurnBuffer(
+    turns_per_user=gabe_ai.history.max_turns,
+    versions=HistoryVersions(os.environ.get("GABE_TURN_VERSION_DB", os.environ.get("GABE_CACHE_DB", "gabe_cache.db")))
+)
+conversation_summarizer = ConversationSummarizer(
+    app, db, Conversation, ConversationSummary, on_update=turn_buffer.update_summary
+)
+
+def _turn_committed(user_id, user_name):
+    """A chat turn reached the database - other workers' buffers are stale, the summarizer counts it"""
+    turn_buffer.committed(user_id)
+    conversation_summarizer.note_message(user_id, user_name)
+
+# Chat turns are acknowledged first and group-committed; crisis turns commit before the reply by default
+conversation_writer = ConversationWriter(app, db, Conversation, on_saved=_turn_committed)
+crisis_sync_commit = os.environ.get("GABE_CRISIS_SYNC_COMMIT", "true").lower() == 'true'
+with app.app_context():
+    conversation_writer.recover()
+# Old turns live in compressed per-day blocks - run archive_conversations.py to move them
+conversation_archiver = ConversationArchiver(db, Conversation, ConversationArchive, keep_turns=turn_buffer.turns_per_user)
+# Clearing history and deleting accounts hide data at once and delete it in small background chunks
+history_purger = HistoryPurger(app, db, User, Conversation, ConversationArchive, ConversationSummary, HistoryPurge)
+with app.app_context():
+    history_purger.resume()
 
 @app.route('/')
 def index():
@@ -183,13 +224,42 @@ def logout():
     logout_user()
     return redirect(url_for('index'))
 
+def _wants_event_stream(data):
+    """Clients opt into streaming with {"stream": true} or an SSE Accept header"""
+    return data.get('stream') is True or request.accept_mimetypes.best == 'text/event-stream'
+
+def _sse_event(event, payload):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def _sse_response(events):
+    """Wrap an event generator in an unbuffered text/event-stream response"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _sse_single_reply(reply):
+    """Stream an already complete reply as one token event followed by done"""
+    yield _sse_event('token', {'text': reply['response']})
+    yield _sse_event('done', reply)
+
 @app.route('/api/chat', methods=['POST'])
 @login_required
 def chat():
-    """Handle chat messages with GABE"""
+    """Handle chat messages with GABE
+    
+    A staged pipeline that answers as early as it can: the crisis check, analysis, the other
+    deterministic responders (prayer, mood templates) that need no history, then load context,
+    call the model and persist. Every stage is timed; crisis support is the fastest path.
+    """
     try:
+        timer = StageTimer('chat')
+        deadline = Deadline.for_request('chat')
         data = request.json or {}
         user_message = data.get('message', '').strip()
+        stream = _wants_event_stream(data)
         
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
@@ -197,107 +267,121 @@ def chat():
         # Get user info from authenticated user
         stored_name = current_user.name
         stored_age_range = current_user.age_range
+        user_id = current_user.id
         
-        # Get recent conversation history from database for context
-        recent_conversations = Conversation.query.filter_by(user_id=current_user.id)\
-            .order_by(Conversation.timestamp.desc()).limit(10).all()
-        conversation_context = [conv.to_dict() for conv in reversed(recent_conversations)]
-        
-        # PRAYER INTERCEPTOR: Handle prayer requests immediately with hopeful prayers (before crisis detection)
-        user_msg_lower = user_message.lower().strip()
-        prayer_keywords = [
-            "pray", "prayer", "jesus", "father", "heavenly", "god help", "bless me",
-            "amen", "lord", "can you pray", "please pray", "talk to god", "i need prayer"
-        ]
-        
-        if any(keyword in user_msg_lower for keyword in prayer_keywords):
-            name = stored_name or 'friend'
-            
-            # Extra safeguard against inappropriate names
-            if name.lower() in ["", "prayer", "pray", "god", "help", "jesus", "lord", "father"]:
-                name = "friend"
-                
-            hopeful_prayer = (
-                f"Dear {name}, here's a prayer just for you:\n\n"
-                f"🙏 *Father God, I lift up {name} to You right now.\n"
-                f"Fill their heart with peace that quiets the noise,\n"
-                f"courage that stands strong, and hope that never fades.\n"
-                f"You are right there, holding them steady.\n"
-                f"Surround them with Your love today. Amen.*\n\n"
-                f"Hey… I want you to know something, {name} — you've got a friend now.\n"
-                f"I'm GABE, and I'm not going anywhere.\n"
-                f"Let's walk this journey together. 💛\n\n"
-                f"💬 *Always beside you — GABE*"
-            )
-            
-            # Save prayer conversation to database
-            conversation = Conversation(
-                user_id=current_user.id,
-                user_message=user_message,
-                gabe_response=hopeful_prayer,
-                mood='hopeful',
-                is_crisis=False,
-                is_prayer=True
-            )
-            db.session.add(conversation)
-            db.session.commit()
-            
-            return jsonify({
+        # Crisis support short-circuits before anything else - it is plain string matching, and a
+        # message that also mentions prayer must still get it
+        with timer.stage('crisis'):
+            crisis_response = crisis_detector.check_for_crisis(user_message)
+        if crisis_response:
+            with timer.stage('persist'):
+                _save_turn(
+                    stored_name,
+                    user_id=user_id,
+                    user_message=user_message,
+                    gabe_response=crisis_response,
+                    is_crisis=True,
+                    is_prayer=False,
+                    sync=crisis_sync_commit
+                )
+            reply = {
+                'response': crisis_response,
+                'is_crisis': True,
+                'name': stored_name
+            }
+            return _pipeline_reply(reply, stream, timer, 'crisis')
+        
+        # Stage 1 - analyze: what the later stages decide on, from the message alone
+        with timer.stage('analyze'):
+            user_msg_lower = user_message.lower()
+            prayer_keywords = [
+                "pray", "prayer", "jesus", "father", "heavenly", "god help", "bless me",
+                "amen", "lord", "can you pray", "please pray", "talk to god", "i need prayer"
+            ]
+            is_prayer = any(keyword in user_msg_lower for keyword in prayer_keywords)
+            mood = gabe_ai.detect_mood(user_message)
+        
+        # Stage 2 - deterministic responders. PRAYER INTERCEPTOR: hopeful prayers, no history needed
+        if is_prayer:
+            hopeful_prayer = _hopeful_prayer(stored_name)
+            with timer.stage('persist'):
+                _save_turn(
+                    stored_name,
+                    user_id=user_id,
+                    user_message=user_message,
+                    gabe_response=hopeful_prayer,
+                    mood='hopeful',
+                    is_crisis=False,
+                    is_prayer=True
+                )
+            reply = {
                 'response': hopeful_prayer,
                 'is_crisis': False,
                 'name': stored_name,
                 'mood': 'hopeful'
-            })
+            }
+            return _pipeline_reply(reply, stream, timer, 'prayer')
+        
+        # Mood templates (sad, anxious, angry flows) - the mood still goes to the user's memory
+        with timer.stage('template'):
+            gabe_ai.record_signals(stored_name, f"user_{user_id}", mood, user_message)
+            template_response = gabe_ai.template_response(user_message, stored_name, mood)
+        if template_response:
+            with timer.stage('persist'):
+                _save_turn(
+                    stored_name,
+                    user_id=user_id,
+                    user_message=user_message,
+                    gabe_response=template_response,
+                    is_crisis=False,
+                    is_prayer=False
+                )
+            reply = {
+                'response': template_response,
+                'is_crisis': False,
+                'name': stored_name,
+                'mood': mood
+            }
+            return _pipeline_reply(reply, stream, timer, 'template')
         
-        # Check for crisis keywords
-        crisis_response = crisis_detector.check_for_crisis(user_message)
-        if crisis_response:
-            # Save crisis conversation to database
-            conversation = Conversation(
-                user_id=current_user.id,
-                user_message=user_message,
-                gabe_response=crisis_response,
-                is_crisis=True,
-                is_prayer=False
+        # Stage 3 - load context. Older turns live in the rolling summary, only newer ones are sent raw;
+        # both come from this worker's turn buffer, and from the database only on a miss
+        with timer.stage('load_context'):
+            conversation_summary, conversation_history = turn_buffer.recent(
+                user_id, gabe_ai.history.max_turns, lambda: _load_history(user_id)
+            )
+            conversation_context = gabe_ai.prepare_context(
+                user_message, stored_name, stored_age_range, conversation_history,
+                f"user_{user_id}", conversation_summary, deadline, mood
             )
-            db.session.add(conversation)
-            db.session.commit()
-            
-            return jsonify({
-                'response': crisis_response,
-                'is_crisis': True,
-                'name': stored_name
-            })
         
-        # Get GABE's response using the original system (with proper sadness flows)
-        gabe_response = gabe_ai.get_response(
-            user_message=user_message,
-            user_name=stored_name,
-            age_range=stored_age_range,
-            conversation_history=conversation_context,
-            session_id=f"user_{current_user.id}"
-        )
+        if stream:
+            return _sse_response(_stream_chat_reply(
+                user_message, stored_name, user_id, conversation_context, mood, timer, deadline
+            ))
         
-        # Save conversation to database
-        conversation = Conversation(
-            user_id=current_user.id,
-            user_message=user_message,
-            gabe_response=gabe_response,
-            is_crisis=False,
-            is_prayer=False
-        )
-        db.session.add(conversation)
-        db.session.commit()
+        # Stage 4 - the model
+        with timer.stage('llm'):
+            gabe_response = gabe_ai.complete_reply(conversation_context, deadline)
         
-        # Detect mood for visualization only
-        mood = gabe_ai.detect_mood(user_message)
+        # Stage 5 - persist
+        with timer.stage('persist'):
+            _save_turn(
+                stored_name,
+                user_id=user_id,
+                user_message=user_message,
+                gabe_response=gabe_response,
+                is_crisis=False,
+                is_prayer=False
+            )
         
-        return jsonify({
+        reply = {
             'response': gabe_response,
             'is_crisis': False,
             'name': stored_name,
             'mood': mood
-        })
+        }
+        return _pipeline_reply(reply, False, timer, 'llm')
         
     except Exception as e:
         logging.error(f"Chat error: {str(e)}")
@@ -306,6 +390,90 @@ def chat():
             'response': "I'm experiencing some technical difficulties right now. But remember, even when I'm offline, God is always online. 💙 Please try reaching out again in a moment."
         }), 500
 
+def _hopeful_prayer(stored_name):
+    """The prayer interceptor's reply"""
+    name = stored_name or 'friend'
+    
+    # Extra safeguard against inappropriate names
+    if name.lower() in ["", "prayer", "pray", "god", "help", "jesus", "lord", "father"]:
+        name = "friend"
+        
+    return (
+        f"Dear {name}, here's a prayer just for you:\n\n"
+        f"🙏 *Father God, I lift up {name} to You right now.\n"
+        f"Fill their heart with peace that quiets the noise,\n"
+        f"courage that stands strong, and hope that never fades.\n"
+        f"You are right there, holding them steady.\n"
+        f"Surround them with Your love today. Amen.*\n\n"
+        f"Hey… I want you to know something, {name} — you've got a friend now.\n"
+        f"I'm GABE, and I'm not going anywhere.\n"
+        f"Let's walk this journey together. 💛\n\n"
+        f"💬 *Always beside you — GABE*"
+    )
+
+def _pipeline_reply(reply, stream, timer, path):
+    """Finish the chat pipeline with a complete reply, as JSON or a one-shot SSE stream"""
+    timer.finish(path)
+    if stream:
+        return _sse_response(_sse_single_reply(reply))
+    response = jsonify(reply)
+    response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+def _load_history(user_id):
+    """(summary, summarized_through_id, newest turns) from the database for the turn buffer"""
+    summary = conversation_summarizer.get_summary(user_id)
+    turns = Conversation.recent_turns(user_id, 0, turn_buffer.turns_per_user)
+    return (summary.summary if summary else None), (summary.summarized_through_id if summary else 0), turns
+
+def _save_turn(stored_name, sync=False, **fields):
+    """Persist a chat turn and feed it to the turn buffer
+    
+    Group-committed in the background unless `sync`; the summarizer hears about it once committed.
+    """
+    turn = conversation_writer.save(fields, stored_name, sync=sync)
+    turn_buffer.append(fields['user_id'], turn)
+
+def _stream_chat_reply(user_message, stored_name, user_id, conversation_context, mood=None, timer=None, deadline=None):
+    """Forward GABE's tokens as SSE events and persist the turn once the stream completes"""
+    timer = timer or StageTimer('chat')
+    chunks = []
+    with timer.stage('llm'):
+        try:
+            for chunk in gabe_ai.stream_reply(conversation_context, deadline):
+                chunks.append(chunk)
+                yield _sse_event('token', {'text': chunk})
+        except Exception as e:
+            logging.error(f"Chat stream error: {str(e)}")
+            if not chunks:
+                chunks.append(gabe_ai.PROVIDER_FAILURE_RESPONSE)
+                yield _sse_event('token', {'text': chunks[0]})
+    
+    gabe_response = ''.join(chunks)
+    
+    # Save conversation to database
+    with timer.stage('persist'):
+        try:
+            _save_turn(
+                stored_name,
+                user_id=user_id,
+                user_message=user_message,
+                gabe_response=gabe_response,
+                is_crisis=False,
+                is_prayer=False
+            )
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Chat stream save error: {str(e)}")
+    timer.finish('llm')
+    
+    yield _sse_event('done', {
+        'response': gabe_response,
+        'is_crisis': False,
+        'name': stored_name,
+        'mood': mood
+    })
+
 @app.route('/api/continue_conversation', methods=['POST'])
 def continue_conversation():
     """Simplified continuation - just treat as regular chat message"""
@@ -316,16 +484,94 @@ def continue_conversation():
 def clear_session():
     """Clear conversation history for authenticated user"""
     try:
-        # Remove all conversations for current user
-        Conversation.query.filter_by(user_id=current_user.id).delete()
-        db.session.commit()
-        logging.info(f"Conversation history cleared for user {current_user.id}")
-        return jsonify({'success': True, 'message': 'Conversation history cleared'})
+        # Commit anything still queued first so it is covered by the clear
+        conversation_writer.flush()
+        
+        # History is hidden now; the rows themselves are deleted in chunks in the background
+        purge = history_purger.clear_history(current_user.id)
+        turn_buffer.invalidate(current_user.id)
+        logging.info(f"Conversation history cleared for user {current_user.id}, purge job {purge['id']}")
+        return jsonify({'success': True, 'message': 'Conversation history cleared', 'purge': purge})
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error clearing conversation history: {str(e)}")
         return jsonify({'error': 'Failed to clear conversation history'}), 500
 
+@app.route('/api/clear_session/<int:purge_id>', methods=['GET'])
+@login_required
+def clear_session_status(purge_id):
+    """Progress of a background history deletion"""
+    purge = history_purger.status(purge_id, current_user.id)
+    if purge is None:
+        return jsonify({'error': 'Purge job not found'}), 404
+    return jsonify({'purge': purge})
+
+@app.route('/api/delete_account', methods=['POST'])
+@login_required
+def delete_account():
+    """Delete the user's account and everything stored with it - the current password is required"""
+    user_id = current_user.id
+    # JSON only - a cross-site form post can't send it without a CORS preflight
+    if not request.is_json:
+        return jsonify({'error': 'Expected a JSON body with your password'}), 400
+    password = ((request.get_json(silent=True) or {}).get('password') or '').strip()
+    try:
+        conversation_writer.flush()
+        
+        # The account is locked out immediately; its rows are deleted in chunks like a cleared history
+        purge = history_purger.delete_account(user_id, password)
+        if purge is None:
+            return jsonify({'error': 'Password is incorrect'}), 403
+        turn_buffer.invalidate(user_id)
+        logout_user()
+        session.clear()
+        logging.info(f"Account {user_id} deleted, purge job {purge['id']}")
+        return jsonify({'success': True, 'message': 'Your account has been deleted', 'purge': purge})
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error deleting account: {str(e)}")
+        return jsonify({'error': 'Failed to delete account'}), 500
+
+@app.route('/api/export_history', methods=['GET'])
+@login_required
+def export_history():
+    """Download the user's whole conversation history, archived turns included"""
+    user_id = current_user.id
+    # Queued turns are committed first so the export ends with the latest reply
+    conversation_writer.flush()
+    hidden_through = history_purger.hidden_through(user_id)
+    
+    def generate():
+        # Streamed turn by turn - a long history never sits in memory as one document
+        yield '{"user_id": %d, "exported_at": %s, "conversations": [' % (user_id, json.dumps(datetime.utcnow().isoformat()))
+        for n, turn in enumerate(conversation_archiver.iter_turns(user_id, after_id=hidden_through)):
+            yield (',' if n else '') + json.dumps(turn)
+        yield ']}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=gabe_conversations.json'})
+
+@app.route('/api/search_history', methods=['GET'])
+@login_required
+def search_history():
+    """Find past turns containing the query, newest first, across hot and archived history"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    
+    try:
+        results = conversation_archiver.search(
+            current_user.id, query, limit, after_id=history_purger.hidden_through(current_user.id)
+        )
+        return jsonify({'results': results, 'count': len(results)})
+    except Exception as e:
+        logging.error(f"History search error: {str(e)}")
+        return jsonify({'error': 'Unable to search conversation history'}), 500
+
 @app.route('/api/scripture_recommendation', methods=['POST'])
 def get_scripture_recommendation():
     """Get scripture recommendation based on mood"""
@@ -960,6 +1206,7 @@ def complete_prayer_training():
 def get_prayer():
     """Generate a custom prayer"""
     try:
+        deadline = Deadline.for_request('get_prayer')
         data = request.json or {}
         prayer_request = data.get('request', '').strip()
         user_name = session.get('user_name', '')
@@ -967,7 +1214,7 @@ def get_prayer():
         if not prayer_request:
             return jsonify({'error': 'Prayer request is required'}), 400
         
-        prayer = gabe_companion.generate_prayer(prayer_request, user_name)
+        prayer = gabe_companion.generate_prayer(prayer_request, user_name, session.get('user_age_range', ''), deadline)
         
         return jsonify({
             'prayer': prayer,
@@ -985,6 +1232,7 @@ def get_prayer():
 def explain_scripture():
     """Explain a Bible verse or passage"""
     try:
+        deadline = Deadline.for_request('explain_scripture')
         data = request.json or {}
         scripture = data.get('scripture', '').strip()
         user_name = session.get('user_name', '')
@@ -992,7 +1240,7 @@ def explain_scripture():
         if not scripture:
             return jsonify({'error': 'Scripture reference is required'}), 400
         
-        explanation = gabe_companion.explain_scripture(scripture, user_name)
+        explanation = gabe_companion.explain_scripture(scripture, user_name, session.get('user_age_range', ''), deadline)
         
         return jsonify({
             'explanation': explanation,
@@ -1020,7 +1268,8 @@ def save_journal():
         if not user_name:
             return jsonify({'error': 'User name is required for journal entries'}), 400
         
-        success = gabe_companion.save_journal_entry(
+        # Committed to the local outbox right away; cloud sync happens in the background
+        success = gabe_ai.save_journal_entry(
             user_name=user_name,
             content=content,
             session_id=session.get('session_id')
@@ -1033,9 +1282,9 @@ def save_journal():
             })
         else:
             return jsonify({
-                'status': 'Journal saved locally', 
-                'message': 'Your journal entry was noted, though the cloud sync is having issues. Your thoughts still matter! 💙'
-            })
+                'error': 'Unable to save journal entry',
+                'message': 'I had trouble saving that, but your thoughts still matter. Try again in a moment! 📔'
+            }), 500
         
     except Exception as e:
         logging.error(f"Journal save error: {str(e)}")
@@ -1053,11 +1302,20 @@ def get_journal():
         if not user_name:
             return jsonify({'entries': [], 'message': 'Please tell me your name first to access your journal'})
         
-        entries = gabe_companion.get_journal_entries(
-            user_name=user_name,
-            session_id=session.get('session_id'),
-            limit=10
-        )
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            limit = 10
+        
+        try:
+            entries, next_page_token = gabe_ai.get_journal_entries(
+                user_name=user_name,
+                session_id=session.get('session_id'),
+                limit=limit,
+                page_token=request.args.get('page_token') or None
+            )
+        except ValueError:
+            return jsonify({'entries': [], 'error': 'Invalid page token'}), 400
         
         # Format entries for display
         formatted_entries = []
@@ -1072,6 +1330,7 @@ def get_journal():
         return jsonify({
             'entries': formatted_entries,
             'count': len(formatted_entries),
+            'next_page_token': next_page_token,
             'message': f'Here are your recent journal entries, {user_name} 📔'
         })
         
@@ -1110,6 +1369,7 @@ def toggle_voice_mode():
 def get_chunked_response():
     """Get a response broken into voice-friendly chunks"""
     try:
+        deadline = Deadline.for_request('chunked_response')
         data = request.json or {}
         user_message = data.get('message', '').strip()
         user_name = session.get('user_name', '')
@@ -1126,7 +1386,8 @@ def get_chunked_response():
             user_name=user_name,
             age_range=session.get('user_age_range', ''),
             conversation_history=session.get('conversation_history', []),
-            session_id=session.get('session_id')
+            session_id=session.get('session_id'),
+            deadline=deadline
         )
         
         # Break into chunks for voice delivery
@@ -1360,6 +1621,7 @@ def complete_mirror_prayer():
 def spiritual_direction_assessment():
     """Get spiritual direction assessment and session"""
     try:
+        deadline = Deadline.for_request('spiritual_direction')
         data = request.json or {}
         user_message = data.get('message', '').strip()
         # Use preferred name "Ray" for this user, otherwise use session name or fallback
@@ -1375,11 +1637,11 @@ def spiritual_direction_assessment():
         conversation_history = session.get('conversation_history', [])
         
         # Assess spiritual need
-        assessment = spiritual_director.assess_spiritual_need(user_message, conversation_history)
+        assessment = spiritual_director.assess_spiritual_need(user_message, conversation_history, deadline)
         
-        # Create spiritual direction session
+        # Create spiritual direction session with whatever time the assessment left
         direction_session = spiritual_director.create_spiritual_direction_session(
-            assessment, user_message, user_name
+            assessment, user_message, user_name, deadline
         )
         
         if direction_session['success']:
@@ -1418,17 +1680,13 @@ def spiritual_direction_assessment():
 def get_spiritual_direction():
     """Simplified spiritual direction using Gemini directly"""
     try:
+        deadline = Deadline.for_request('spiritual_direction')
         data = request.json or {}
         concern = data.get('concern', '').strip()
         
         if not concern:
             return jsonify({'error': 'Please share your spiritual concern'}), 400
         
-        # Use Gemini directly for reliable response
-        from google import genai
-        
-        client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-        
         spiritual_masters = {
             'teresa_avila': {'icon': '🌹', 'name': 'St. Teresa of Avila', 'specialty': 'Prayer & Mysticism'},
             'john_cross': {'icon': '✝️', 'name': 'St. John of the Cross', 'specialty': 'Dark Night of Soul'},
@@ -1473,12 +1731,18 @@ Format your response as JSON with these fields:
 - closing_prayer: personal prayer
 - master_quote: a brief inspirational quote from you"""
 
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=prompt
-        )
-        
-        result_text = response.text or ""
+        # Use Gemini through the shared gateway - one pooled client per worker
+        result_text = gateway.complete({
+            'providers': ['gemini'],
+            'models': {'gemini': "gemini-2.5-pro"},
+            'contents': prompt,
+            'deadline': deadline
+        })
+        if not result_text and deadline.expired():
+            # Out of time - the template below still gives them something to hold on to
+            result_text = f"Dear friend, {master['name']} would remind you that God is near in this very moment. Bring this to Him simply and honestly - He is listening."
+        if not result_text:
+            return jsonify({'error': 'Unable to connect to spiritual guidance right now'}), 500
         
         # Try to parse JSON, fallback to simple response
         try:
@@ -1555,5 +1819,30 @@ def complete_spiritual_practice():
         logging.error(f"Complete spiritual practice error: {str(e)}")
         return jsonify({'error': 'Failed to track practice'}), 500
 
+# Scrapers present GABE_METRICS_TOKEN as a bearer token; without one configured, metrics need a login
+metrics_token = os.environ.get("GABE_METRICS_TOKEN")
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose this worker's in-process metrics (hedge wins, latencies, provider health, ...)"""
+    if metrics_token:
+        auth = request.headers.get('Authorization', '')
+        presented = auth[len('Bearer '):] if auth.startswith('Bearer ') else ''
+        if not hmac.compare_digest(presented.encode('utf-8'), metrics_token.encode('utf-8')):
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif not current_user.is_authenticated:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    snapshot = metrics.snapshot()
+    snapshot['providers'] = provider_health.snapshot()
+    snapshot['caches'] = {
+        cache.namespace: cache.stats()
+        for cache in (gabe_ai.prayer_cache, gabe_ai.scripture_cache,
+                      gabe_companion.prayer_cache, gabe_companion.scripture_cache)
+    }
+    snapshot['caches']['user_memory'] = gabe_ai.firebase.memory_cache_stats()
+    snapshot['caches']['turn_buffer'] = turn_buffer.stats()
+    return jsonify(snapshot)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,29 @@
+"""
+Conversation archival job
+Moves turns older than GABE_ARCHIVE_AFTER_DAYS into compressed per-user-day blocks in conversation_archives
+Run from gabe_app/ periodically (e.g. nightly cron) with the same DATABASE_URL as the app: python archive_conversations.py
+"""
+
+from flask import Flask
+
+import models
+from conversation_archive import ConversationArchiver
+from migrate_conversation_index import database_url
+
+
+def create_job_app() -> Flask:
+    """Just enough app for a database session - importing app.py would also start its background workers"""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    models.db.init_app(app)
+    return app
+
+
+if __name__ == '__main__':
+    archiver = ConversationArchiver(models.db, models.Conversation, models.ConversationArchive)
+    with create_job_app().app_context():
+        stats = archiver.archive()
+    ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+    print(f"✅ Archived {stats['turns']} turns for {stats['users']} users into {stats['blocks']} "
+          f"{archiver.codec} blocks ({ratio:.1f}x compression).")
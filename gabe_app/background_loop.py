@@ -0,0 +1,86 @@
+"""
+Persistent background event loop for GABE
+One long-lived asyncio loop per worker process on its own daemon thread, plus a bounded thread
+pool for the blocking SDK calls the coroutines hand off - instead of creating and tearing down
+an event loop on every request
+"""
+
+import os
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Coroutine, Optional
+
+from metrics import metrics
+
+
+class BackgroundLoop:
+    """A per-worker event loop that request threads submit coroutines to"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.max_io_workers = int(os.environ.get("GABE_ASYNC_IO_WORKERS", "16"))
+        self._lock = threading.Lock()
+        self._loop = None
+        self._executor = None
+        self._pid = None
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started on first use (and again in each forked worker)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._start()
+            return self._loop
+
+    def _start(self):
+        # A loop thread doesn't survive fork - the child gets its own
+        self._pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_io_workers, thread_name_prefix=f"{self.name}-io")
+        self._loop.set_default_executor(self._executor)
+
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.call_soon(ready.set)
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name=self.name, daemon=True).start()
+        ready.wait()
+        logging.info(f"Background event loop {self.name} started in pid {self._pid}")
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine without waiting for it"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop())
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait up to `timeout` seconds for its result
+
+        Raises TimeoutError (after cancelling the coroutine) when time runs out.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            metrics.increment(f"async.{self.name}.timeouts")
+            raise TimeoutError(f"{self.name} call timed out after {timeout}s")
+
+    async def offload(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await a blocking call on the I/O pool so the loop itself never blocks"""
+        loop = asyncio.get_running_loop()
+        executor = self._executor if loop is self._loop else None
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    def _log_failure(self, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.warning(f"Background task on {self.name} failed: {future.exception()}")
+
+
+# One loop per worker, shared by every service that needs async I/O
+background_loop = BackgroundLoop('gabe-async')
@@ -0,0 +1,277 @@
+"""
+FirebaseService load benchmark for GABE
+Seeds the local Firestore emulator with users of realistic journal, mood and prayer volumes, then
+measures p50/p99 latency of the memory, pagination and write paths at the given concurrency levels
+
+save_journal_local times only the local outbox insert a request waits for; journal_synced times
+save-to-Firestore, until the background syncer has committed the entry.
+
+Needs a running emulator (firebase emulators:start --only firestore) and FIRESTORE_EMULATOR_HOST;
+it refuses to run against a real project. Run from gabe_app/:
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_firebase.py --users 200 --concurrency 1,8,32
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import argparse
+import tempfile
+import platform
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+SCENARIOS = ('memory_cold', 'memory_warm', 'journal_pages', 'save_profile', 'save_mood',
+             'save_journal_local', 'journal_synced', 'save_context')
+
+MOODS = ['happy', 'sad', 'anxious', 'grateful', 'hopeful', 'tired', 'peaceful', 'angry']
+
+JOURNAL_LINES = [
+    "Spent some quiet time this morning reading Psalm 23 and felt calmer than I have all week.",
+    "Work was stressful again. I'm trying to remember that my worth isn't my productivity.",
+    "Grateful for my sister calling today - we prayed together for Mom's surgery.",
+    "Couldn't sleep. Wrote down three things I'm thankful for and it helped a little.",
+    "Started the new small group. Nervous, but everyone was kind.",
+    "Feeling far from God lately. Not sure what to do with that except keep showing up."
+]
+
+PRAYER_LINES = [
+    "Healing for my mom after her surgery",
+    "Wisdom about the job offer",
+    "Peace for my anxiety before exams",
+    "My friend who just lost her dad",
+    "Patience with my kids this week"
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Same nearest-rank rule as metrics.percentile"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help="users to seed")
+    parser.add_argument('--journal-per-user', type=int, default=150, help="mean journal entries per user")
+    parser.add_argument('--moods-per-user', type=int, default=90, help="mean daily moods per user")
+    parser.add_argument('--prayers-per-user', type=int, default=25, help="mean prayer requests per user")
+    parser.add_argument('--concurrency', default='1,8,32', help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=400, help="calls per scenario and concurrency level")
+    parser.add_argument('--pages', type=int, default=5, help="journal pages walked per journal_pages call")
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true', help="reuse data from an earlier run")
+    parser.add_argument('--output', default='bench_firebase.json', help="where to write the JSON report")
+    return parser.parse_args(argv)
+
+
+def seed(db, args, rng: random.Random) -> Dict[str, int]:
+    """Write users with a long-tailed spread of history - most light, a few very heavy"""
+    counts = {'users': 0, 'journal': 0, 'moods': 0, 'prayers': 0}
+    now = datetime.now(timezone.utc)
+    batch, pending = db.batch(), 0
+
+    def put(ref, data):
+        nonlocal batch, pending
+        batch.set(ref, data)
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch, pending = db.batch(), 0
+
+    def volume(mean: int) -> int:
+        return max(1, int(rng.lognormvariate(0, 0.8) * mean / 1.38))
+
+    for n in range(args.users):
+        user_id = f"bench_user_{n}"
+        user_ref = db.collection('users').document(user_id)
+        put(user_ref, {'name': f"Bench User {n}", 'created_at': now - timedelta(days=365), 'last_active': now})
+        counts['users'] += 1
+
+        for i in range(volume(args.journal_per_user)):
+            timestamp = now - timedelta(hours=i * 7 + rng.random())
+            put(user_ref.collection('journal').document(), {
+                'content': rng.choice(JOURNAL_LINES),
+                'mood': rng.choice(MOODS),
+                'timestamp': timestamp,
+                'date': timestamp.strftime('%Y-%m-%d')
+            })
+            counts['journal'] += 1
+
+        for day in range(volume(args.moods_per_user)):
+            date = now - timedelta(days=day)
+            put(user_ref.collection('moods').document(date.strftime('%Y-%m-%d')), {
+                'mood': rng.choice(MOODS),
+                'context': rng.choice(JOURNAL_LINES),
+                'timestamp': date,
+                'date': date.strftime('%Y-%m-%d')
+            })
+            counts['moods'] += 1
+
+        for i in range(volume(args.prayers_per_user)):
+            put(user_ref.collection('prayers').document(), {
+                'request': rng.choice(PRAYER_LINES),
+                'timestamp': now - timedelta(days=i * 3 + rng.random()),
+                'status': 'active' if rng.random() < 0.6 else 'answered'
+            })
+            counts['prayers'] += 1
+
+    if pending:
+        batch.commit()
+    return counts
+
+
+def scenario_calls(firebase, args, rng: random.Random) -> Dict[str, Callable[[str], object]]:
+    """One coroutine factory per scenario, taking the user to hit"""
+    async def memory_cold(user_id):
+        firebase.invalidate_user_memory(user_id)
+        return await firebase.get_user_memory(user_id, timeout=30)
+
+    async def memory_warm(user_id):
+        return await firebase.get_user_memory(user_id, timeout=30)
+
+    async def journal_pages(user_id):
+        token = None
+        for _ in range(args.pages):
+            _, token = await firebase.get_journal_page(user_id, args.page_size, token)
+            if not token:
+                break
+
+    async def save_profile(user_id):
+        return await firebase.save_user_profile(user_id, user_id.replace('_', ' ').title())
+
+    async def save_mood(user_id):
+        return await firebase.save_mood(user_id, rng.choice(MOODS), rng.choice(JOURNAL_LINES))
+
+    async def save_journal_local(user_id):
+        # Only the SQLite outbox insert - what /api/save_journal waits for, not a Firestore write
+        return await firebase.save_journal_entry(user_id, rng.choice(JOURNAL_LINES), rng.choice(MOODS))
+
+    async def journal_synced(user_id):
+        # Until the background syncer's batch commit has put the entry in Firestore
+        entry = firebase.record_journal_entry(user_id, rng.choice(JOURNAL_LINES), rng.choice(MOODS))
+        give_up_at = time.monotonic() + 30
+        while any(pending['id'] == entry['id']
+                  for pending in firebase.journal_outbox.pending_for(user_id, args.page_size)):
+            if time.monotonic() > give_up_at:
+                raise TimeoutError(f"journal entry {entry['id']} was not synced within 30s")
+            await asyncio.sleep(0.005)
+
+    async def save_context(user_id):
+        return await firebase.save_conversation_context(user_id, rng.choice(PRAYER_LINES), rng.choice(JOURNAL_LINES))
+
+    return {
+        'memory_cold': memory_cold,
+        'memory_warm': memory_warm,
+        'journal_pages': journal_pages,
+        'save_profile': save_profile,
+        'save_mood': save_mood,
+        'save_journal_local': save_journal_local,
+        'journal_synced': journal_synced,
+        'save_context': save_context
+    }
+
+
+def run_scenario(call, user_ids: List[str], concurrency: int, requests: int, rng: random.Random) -> Dict:
+    from background_loop import background_loop
+
+    targets = [rng.choice(user_ids) for _ in range(requests)]
+    latencies = []
+    errors = 0
+
+    def one(user_id):
+        started = time.perf_counter()
+        background_loop.run(call(user_id), timeout=60)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one, user_id) for user_id in targets]:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - started
+
+    if not latencies:
+        return {'requests': requests, 'errors': errors}
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2)
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    emulator = os.environ.get('FIRESTORE_EMULATOR_HOST')
+    if not emulator:
+        print("❌ FIRESTORE_EMULATOR_HOST is not set - this benchmark only runs against the emulator.")
+        return 1
+
+    # Never pick up real credentials, and keep the journal outbox out of the working directory
+    os.environ.pop('FIREBASE_SERVICE_ACCOUNT', None)
+    os.environ['FIREBASE_PROJECT_ID'] = os.environ.get('FIREBASE_PROJECT_ID', 'gabe-bench')
+    os.environ.setdefault('GABE_JOURNAL_OUTBOX_DB', os.path.join(tempfile.mkdtemp(), 'bench_outbox.db'))
+
+    from firebase_service import FirebaseService
+
+    firebase = FirebaseService()
+    if not firebase.is_connected():
+        print("❌ Could not connect to the Firestore emulator.")
+        return 1
+
+    rng = random.Random(args.seed)
+    seeded = None
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seeded = seed(firebase.db, args, rng)
+        print(f"Seeded {seeded} in {time.perf_counter() - started:.1f}s")
+
+    user_ids = [f"bench_user_{n}" for n in range(args.users)]
+    calls = scenario_calls(firebase, args, rng)
+    levels = [int(level) for level in args.concurrency.split(',') if level]
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"❌ Unknown scenarios: {', '.join(sorted(unknown))}")
+        return 1
+
+    results = []
+    for name in scenarios:
+        for concurrency in levels:
+            result = {'scenario': name, 'concurrency': concurrency,
+                      **run_scenario(calls[name], user_ids, concurrency, args.requests, rng)}
+            results.append(result)
+            print(f"{name:<14} c={concurrency:<4} p50={result.get('p50_ms', '-'):>8}ms "
+                  f"p99={result.get('p99_ms', '-'):>8}ms  {result.get('throughput_rps', 0):>7} rps  "
+                  f"errors={result['errors']}")
+
+    report = {
+        'benchmark': 'firebase_service',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'emulator': emulator,
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'seeded': seeded,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Chat history query regression benchmark for GABE
+Times the per-message history read (Conversation.recent_turns) for users with growing row counts
+and fails when latency grows with history size instead of staying flat
+
+Uses a throwaway SQLite file with the conversations schema, so it runs without the app or a server.
+Run from gabe_app/: python bench_history.py --sizes 1000,10000,100000,200000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from migrate_conversation_index import INDEX_COLUMNS, INDEX_NAME
+
+SCHEMA = """
+CREATE TABLE conversations (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    user_message TEXT NOT NULL,
+    gabe_response TEXT NOT NULL,
+    mood VARCHAR(20),
+    is_crisis BOOLEAN,
+    is_prayer BOOLEAN,
+    timestamp DATETIME
+)
+"""
+
+# The statement Conversation.recent_turns compiles to
+RECENT_TURNS_SQL = (
+    "SELECT id, user_message, gabe_response, is_crisis FROM conversations"
+    " WHERE user_id = ? AND id > ? ORDER BY timestamp DESC LIMIT ?"
+)
+
+MESSAGE = "I've been struggling to pray lately and I don't really know where to start again. " * 3
+RESPONSE = "That's okay, friend - God meets us right where we are. Let's start small together. " * 4
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Same nearest-rank rule as metrics.percentile"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build(path: str, sizes: List[int], noise_users: int, rng: random.Random) -> sqlite3.Connection:
+    """One user per size plus light 'noise' users, interleaved the way real traffic writes rows"""
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    started = datetime(2024, 1, 1)
+
+    remaining = {user_id: size for user_id, size in enumerate(sizes, start=1)}
+    for user_id in range(len(sizes) + 1, len(sizes) + 1 + noise_users):
+        remaining[user_id] = 50
+
+    rows = []
+    tick = 0
+    while remaining:
+        for user_id in list(remaining):
+            batch = min(remaining[user_id], 100)
+            for _ in range(batch):
+                tick += 1
+                rows.append((user_id, MESSAGE, RESPONSE, rng.choice(['happy', 'sad', None]),
+                             rng.random() < 0.01, False, started + timedelta(seconds=tick)))
+            remaining[user_id] -= batch
+            if not remaining[user_id]:
+                del remaining[user_id]
+        if len(rows) > 50000:
+            conn.executemany("INSERT INTO conversations (user_id, user_message, gabe_response, mood, is_crisis,"
+                             " is_prayer, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        conn.executemany("INSERT INTO conversations (user_id, user_message, gabe_response, mood, is_crisis,"
+                         " is_prayer, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+
+def measure(conn: sqlite3.Connection, user_id: int, iterations: int, limit: int) -> Dict:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        rows = conn.execute(RECENT_TURNS_SQL, (user_id, 0, limit)).fetchall()
+        [dict(zip(('id', 'user_message', 'gabe_response', 'is_crisis'), row)) for row in reversed(rows)]
+        latencies.append(time.perf_counter() - started)
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,200000', help="rows for each measured user")
+    parser.add_argument('--noise-users', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=10, help="turns per read (GABE_HISTORY_MAX_TURNS)")
+    parser.add_argument('--max-ratio', type=float, default=3.0,
+                        help="fail when the largest user's p50 is more than this multiple of the smallest's")
+    parser.add_argument('--without-index', action='store_true', help="measure the pre-migration baseline")
+    parser.add_argument('--output', default='bench_history.json')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    path = os.path.join(tempfile.mkdtemp(), 'bench_history.db')
+    started = time.perf_counter()
+    conn = build(path, sizes, args.noise_users, random.Random(42))
+    if not args.without_index:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON conversations {INDEX_COLUMNS}")
+    conn.execute("ANALYZE")
+    total = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+    print(f"Built {total} rows in {time.perf_counter() - started:.1f}s (index: {not args.without_index})")
+
+    plan = " / ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + RECENT_TURNS_SQL, (1, 0, args.limit)))
+    results = []
+    for user_id, size in enumerate(sizes, start=1):
+        result = {'rows': size, **measure(conn, user_id, args.iterations, args.limit)}
+        results.append(result)
+        print(f"{size:>9} rows  p50={result['p50_ms']:>8}ms  p99={result['p99_ms']:>8}ms")
+
+    ratio = results[-1]['p50_ms'] / max(results[0]['p50_ms'], 0.001)
+    passed = ratio <= args.max_ratio
+    report = {
+        'benchmark': 'conversation_history',
+        'index': not args.without_index,
+        'query_plan': plan,
+        'total_rows': total,
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+        'p50_ratio': round(ratio, 2),
+        'passed': passed
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Query plan: {plan}")
+    print(f"{'✅' if passed else '❌'} p50 at {sizes[-1]} rows is {ratio:.1f}x the p50 at {sizes[0]} rows "
+          f"(limit {args.max_ratio}x) - report written to {args.output}")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Conversation archive tier for GABE
+Turns older than N days move out of the hot conversations table into one compressed block per
+user per day (zstd when the zstandard package is installed, zlib otherwise); export and search
+read both tiers, so moving a turn to the archive is invisible to the user
+"""
+
+import os
+import json
+import zlib
+import logging
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+
+from metrics import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Column order of a turn inside an archive block
+TURN_FIELDS = ('id', 'timestamp', 'user_message', 'gabe_response', 'mood', 'is_crisis', 'is_prayer')
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(payload: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read zstd archive blocks")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+class ConversationArchiver:
+    """Moves old turns into the archive table and reads across both tiers"""
+
+    def __init__(self, db, conversation_model, archive_model, keep_turns: Optional[int] = None):
+        self.db = db
+        self.Conversation = conversation_model
+        self.ConversationArchive = archive_model
+
+        self.after_days = int(os.environ.get("GABE_ARCHIVE_AFTER_DAYS", "90"))
+        # The newest turns of every user stay hot however old they are - they are the chat context
+        self.keep_turns = keep_turns or int(os.environ.get("GABE_HISTORY_MAX_TURNS", "10"))
+        self.rows_per_round = int(os.environ.get("GABE_ARCHIVE_ROWS_PER_ROUND", "5000"))
+        preferred = os.environ.get("GABE_ARCHIVE_CODEC", "zstd").lower()
+        self.codec = 'zstd' if preferred == 'zstd' and zstandard is not None else 'zlib'
+
+    # ------------------------------------------------------------------
+    # Archival job
+    # ------------------------------------------------------------------
+
+    def archive(self, max_users: Optional[int] = None) -> Dict[str, int]:
+        """Move every eligible turn into the archive; safe to run repeatedly and concurrently with chat"""
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        stats = {'users': 0, 'turns': 0, 'blocks': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+
+        user_ids = [row[0] for row in self.db.session.query(self.Conversation.user_id).filter(
+            self.Conversation.timestamp < cutoff
+        ).distinct().limit(max_users).all()]
+
+        for user_id in user_ids:
+            try:
+                while self._archive_user(user_id, cutoff, stats) == self.rows_per_round:
+                    pass
+                stats['users'] += 1
+            except Exception as e:
+                self.db.session.rollback()
+                logging.error(f"Archiving conversations for user {user_id} failed: {e}")
+                metrics.increment('archive.failures')
+
+        metrics.increment('archive.turns', stats['turns'])
+        metrics.increment('archive.blocks', stats['blocks'])
+        logging.info(f"Conversation archive round finished: {stats}")
+        return stats
+
+    def _archive_user(self, user_id: int, cutoff: datetime, stats: Dict[str, int]) -> int:
+        """Archive one round of a user's old turns in a single transaction; returns turns moved"""
+        Conversation = self.Conversation
+        # Lowest id among the turns that must stay hot
+        floor = Conversation.query.with_entities(Conversation.id).filter(
+            Conversation.user_id == user_id
+        ).order_by(Conversation.id.desc()).offset(max(self.keep_turns - 1, 0)).limit(1).scalar()
+        if floor is None:
+            return 0
+
+        rows = Conversation.query.with_entities(
+            *(getattr(Conversation, field) for field in TURN_FIELDS)
+        ).filter(
+            Conversation.user_id == user_id,
+            Conversation.timestamp < cutoff,
+            Conversation.id < floor
+        ).order_by(Conversation.timestamp.asc(), Conversation.id.asc()).limit(self.rows_per_round).all()
+        if not rows:
+            return 0
+
+        for day, turns in groupby(rows, key=lambda row: row.timestamp.date()):
+            turns = [self._encode_turn(row) for row in turns]
+            raw = json.dumps(turns, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            payload = compress(raw, self.codec)
+            self.db.session.add(self.ConversationArchive(
+                user_id=user_id,
+                day=day,
+                first_id=min(turn[0] for turn in turns),
+                last_id=max(turn[0] for turn in turns),
+                turn_count=len(turns),
+                codec=self.codec,
+                payload=payload
+            ))
+            stats['blocks'] += 1
+            stats['raw_bytes'] += len(raw)
+            stats['stored_bytes'] += len(payload)
+
+        # Blocks and the delete commit together, so a turn is always in exactly one tier
+        Conversation.query.filter(Conversation.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        self.db.session.commit()
+        stats['turns'] += len(rows)
+        return len(rows)
+
+    @staticmethod
+    def _encode_turn(row) -> List:
+        turn = [getattr(row, field) for field in TURN_FIELDS]
+        turn[1] = turn[1].isoformat() if turn[1] else None
+        return turn
+
+    # ------------------------------------------------------------------
+    # Reads across both tiers
+    # ------------------------------------------------------------------
+
+    def _blocks(self, user_id: int, after_id: int = 0, newest_first: bool = False):
+        ArchiveModel = self.ConversationArchive
+        order = (ArchiveModel.day.desc(), ArchiveModel.first_id.desc()) if newest_first else \
+            (ArchiveModel.day.asc(), ArchiveModel.first_id.asc())
+        # Blocks are loaded one at a time, so exporting years of history never holds it all in memory
+        blocks = ArchiveModel.query.filter(
+            ArchiveModel.user_id == user_id,
+            ArchiveModel.last_id > after_id
+        ).order_by(*order).yield_per(20)
+        for block in blocks:
+            turns = [dict(zip(TURN_FIELDS, turn)) for turn in json.loads(decompress(block.payload, block.codec))
+                     if turn[0] > after_id]
+            yield reversed(turns) if newest_first else turns
+
+    def iter_turns(self, user_id: int, after_id: int = 0) -> Iterator[Dict]:
+        """Every turn of the user after `after_id`, oldest first - archived blocks, then the hot table"""
+        for turns in self._blocks(user_id, after_id):
+            yield from turns
+
+        Conversation = self.Conversation
+        rows = Conversation.query.with_entities(
+            *(getattr(Conversation, field) for field in TURN_FIELDS)
+        ).filter(Conversation.user_id == user_id, Conversation.id > after_id).order_by(
+            Conversation.timestamp.asc(), Conversation.id.asc()
+        ).yield_per(500)
+        for row in rows:
+            turn = row._asdict()
+            turn['timestamp'] = turn['timestamp'].isoformat() if turn['timestamp'] else None
+            yield turn
+
+    def search(self, user_id: int, query: str, limit: int = 20, after_id: int = 0) -> List[Dict]:
+        """Turns after `after_id` whose message or reply contains `query` (case-insensitive), newest first"""
+        Conversation = self.Conversation
+        # The query is matched literally - % and _ typed by the user are not wildcards
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        pattern = f"%{escaped}%"
+        rows = Conversation.query.with_entities(
+            *(getattr(Conversation, field) for field in TURN_FIELDS)
+        ).filter(
+            Conversation.user_id == user_id,
+            Conversation.id > after_id,
+            Conversation.user_message.ilike(pattern, escape='\\') |
+            Conversation.gabe_response.ilike(pattern, escape='\\')
+        ).order_by(Conversation.timestamp.desc()).limit(limit).all()
+
+        matches = []
+        for row in rows:
+            turn = row._asdict()
+            turn['timestamp'] = turn['timestamp'].isoformat() if turn['timestamp'] else None
+            matches.append(turn)
+
+        # Archived blocks are only opened when the hot table didn't fill the page
+        needle = query.lower()
+        if len(matches) < limit:
+            for turns in self._blocks(user_id, after_id, newest_first=True):
+                for turn in turns:
+                    if needle in (turn['user_message'] or '').lower() or needle in (turn['gabe_response'] or '').lower():
+                        matches.append(turn)
+                        if len(matches) >= limit:
+                            return matches
+        metrics.increment('archive.searches')
+        return matches
@@ -0,0 +1,212 @@
+"""
+Rolling conversation summaries for GABE
+A background summarizer folds older turns into one short per-user summary every N messages,
+so long-time users send a summary plus a short raw tail instead of their whole history
+"""
+
+import os
+import queue
+import logging
+import threading
+from typing import Optional
+
+from llm_gateway import gateway
+from metrics import metrics
+from token_budget import count_tokens, truncate_to_tokens
+
+SUMMARY_PROMPT = """You keep GABE's private notes about an ongoing conversation with {name}.
+GABE is a warm Christian spiritual companion. Update the notes below with the new messages.
+
+Keep what matters for future conversations: what they're going through, people and situations
+they mention, prayer requests, how they've been feeling, what encouraged them, and anything
+GABE promised to follow up on. Drop small talk. Write plain sentences in the third person,
+at most {max_words} words. Never include crisis details beyond "has been through a hard time".
+
+CURRENT NOTES:
+{summary}
+
+NEW MESSAGES:
+{transcript}
+
+UPDATED NOTES:"""
+
+
+class ConversationSummarizer:
+    """Keeps ConversationSummary rows up to date off the request path"""
+
+    def __init__(self, app, db, conversation_model, summary_model, on_update=None):
+        self.app = app
+        self.db = db
+        self.Conversation = conversation_model
+        self.ConversationSummary = summary_model
+        # Called with (user_id, summary, summarized_through_id) after each committed update
+        self.on_update = on_update
+
+        self.every_n = int(os.environ.get("GABE_SUMMARY_EVERY_N", "20"))
+        self.tail_turns = int(os.environ.get("GABE_SUMMARY_TAIL_TURNS", "4"))
+        self.max_words = int(os.environ.get("GABE_SUMMARY_MAX_WORDS", "200"))
+        # Cap each summarization round so a backlog of thousands of rows is folded in gradually
+        self.batch_tokens = int(os.environ.get("GABE_SUMMARY_BATCH_TOKENS", "3000"))
+        self.turn_tokens = int(os.environ.get("GABE_SUMMARY_TURN_TOKENS", "300"))
+        # Rows read per round - bounds memory however far behind a user's summary is
+        self.scan_rows = max(self.every_n, int(os.environ.get("GABE_SUMMARY_SCAN_ROWS", "200")))
+
+        self._lock = threading.Lock()
+        self._pending_counts = {}
+        self._queued = set()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    # ------------------------------------------------------------------
+    # Request path - cheap in-memory bookkeeping and one indexed read
+    # ------------------------------------------------------------------
+
+    def note_message(self, user_id: int, user_name: str = ""):
+        """Count a saved turn and schedule a summary update every N messages"""
+        with self._lock:
+            first_seen = user_id not in self._pending_counts
+            self._pending_counts[user_id] = self._pending_counts.get(user_id, 0) + 1
+            # Counts start over on restart, so check a user's backlog the first time we see them -
+            # a bounded read that also seeds the count
+            due = first_seen or self._pending_counts[user_id] >= self.every_n
+            if not due or user_id in self._queued:
+                return
+            self._pending_counts[user_id] = 0
+            self._queued.add(user_id)
+
+        self._ensure_worker()
+        self._queue.put((user_id, user_name))
+
+    def get_summary(self, user_id: int):
+        """The user's summary row, or None before their first summary"""
+        return self.ConversationSummary.query.filter_by(user_id=user_id).first()
+
+    # ------------------------------------------------------------------
+    # Background worker
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gabe-summarizer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            user_id, user_name = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self.summarize_user(user_id, user_name)
+            except Exception as e:
+                logging.error(f"Conversation summary failed for user {user_id}: {e}")
+                metrics.increment('summary.failures')
+            finally:
+                with self._lock:
+                    self._queued.discard(user_id)
+
+    def summarize_user(self, user_id: int, user_name: str = "") -> bool:
+        """Fold unsummarized turns older than the raw tail into the summary; True when updated
+
+        Turns are read in bounded id-ordered rounds, so a backlog of thousands never loads at
+        once; whatever is left below the threshold seeds the user's message count.
+        """
+        Conversation = self.Conversation
+        record = self.get_summary(user_id)
+        through_id = record.summarized_through_id if record else 0
+
+        # The tail the chat prompt sends verbatim is never summarized
+        tail_floor = None
+        if self.tail_turns:
+            tail_floor = Conversation.query.with_entities(Conversation.id).filter(
+                Conversation.user_id == user_id
+            ).order_by(Conversation.id.desc()).offset(self.tail_turns - 1).limit(1).scalar()
+            if tail_floor is None:
+                return False
+
+        updated = False
+        while True:
+            query = Conversation.query.with_entities(
+                Conversation.id, Conversation.user_message, Conversation.gabe_response, Conversation.is_crisis
+            ).filter(Conversation.user_id == user_id, Conversation.id > through_id)
+            if tail_floor is not None:
+                query = query.filter(Conversation.id < tail_floor)
+            # Turns are noted after they commit, so everything noted so far is already in these rows
+            with self._lock:
+                noted = self._pending_counts.get(user_id, 0)
+            rows = query.order_by(Conversation.id.asc()).limit(self.scan_rows).all()
+            if len(rows) < self.every_n:
+                self._seed_count(user_id, len(rows), noted)
+                return updated
+
+            batch, transcript = self._take_batch(rows)
+            summary = self._summarize(record.summary if record else "", transcript, user_name)
+            if not summary:
+                return updated
+
+            if record is None:
+                record = self.ConversationSummary(user_id=user_id, summary='', summarized_through_id=0, message_count=0)
+                self.db.session.add(record)
+            else:
+                # clear_session resets the summary past the cleared turns - don't write them back
+                self.db.session.refresh(record)
+                if record.summarized_through_id >= batch[0].id:
+                    return updated
+            record.summary = summary
+            record.summarized_through_id = through_id = batch[-1].id
+            record.message_count = (record.message_count or 0) + len(batch)
+            self.db.session.commit()
+            if self.on_update:
+                self.on_update(user_id, summary, through_id)
+
+            metrics.increment('summary.updates')
+            metrics.observe('summary.tokens', count_tokens(summary))
+            updated = True
+
+    def _seed_count(self, user_id: int, unsummarized: int, noted: int):
+        # After a restart the count starts from what is really outstanding, not from zero;
+        # only turns noted after the read are on top of the rows it found
+        with self._lock:
+            since_read = max(0, self._pending_counts.get(user_id, 0) - noted)
+            self._pending_counts[user_id] = unsummarized + since_read
+
+    def _take_batch(self, rows):
+        """Oldest rows that fit the batch budget (always at least one) and their transcript"""
+        batch = []
+        lines = []
+        used = 0
+        for row in rows:
+            if row.is_crisis:
+                # Crisis turns are never replayed to the model, only marked as covered
+                batch.append(row)
+                continue
+            line = (f"User: {truncate_to_tokens(row.user_message, self.turn_tokens // 2)}\n"
+                    f"GABE: {truncate_to_tokens(row.gabe_response, self.turn_tokens // 2)}")
+            tokens = count_tokens(line)
+            if batch and used + tokens > self.batch_tokens:
+                break
+            batch.append(row)
+            lines.append(line)
+            used += tokens
+        return batch, "\n\n".join(lines)
+
+    def _summarize(self, summary: str, transcript: str, user_name: str) -> Optional[str]:
+        if not transcript:
+            # Only crisis turns in this batch - nothing new to learn
+            return summary or "Has been through a hard time."
+
+        prompt = SUMMARY_PROMPT.format(
+            name=user_name or "the user",
+            max_words=self.max_words,
+            summary=summary or "(none yet)",
+            transcript=transcript
+        )
+        return gateway.complete({
+            'name': 'summarizer',
+            'operation': 'summary',
+            'providers': ['gemini', 'openai'],
+            'messages': [{"role": "user", "content": prompt}],
+            'contents': prompt,
+            'max_tokens': self.max_words * 2,
+            'temperature': 0.2,
+            'gemini': {'max_tokens': None}
+        })
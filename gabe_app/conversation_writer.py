@@ -0,0 +1,350 @@
+"""
+Group commit for chat turns
+Conversation rows are acknowledged once they are appended to a per-worker spill file, then inserted
+in batches by a background flusher on a size or time trigger; spill files left by a crashed worker
+are replayed by the surviving workers, so a queued turn survives the process dying before its commit;
+rows the database rejects are set aside in a dead-letter file instead of blocking everyone's turns
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from metrics import metrics
+
+# Failures of the database itself rather than of one row - the row is retried, not set aside
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+
+
+class ConversationWriter:
+    """Queues Conversation inserts and commits them in batches off the request path"""
+
+    def __init__(self, app, db, conversation_model, on_saved: Optional[Callable[[int, str], None]] = None):
+        self.app = app
+        self.db = db
+        self.Conversation = conversation_model
+        # Called with (user_id, user_name) for every row once it is committed
+        self.on_saved = on_saved
+
+        self.batch_size = int(os.environ.get("GABE_CONVERSATION_BATCH_SIZE", "100"))
+        self.flush_interval = float(os.environ.get("GABE_CONVERSATION_FLUSH_MS", "200")) / 1000
+        self.spill_dir = os.environ.get("GABE_CONVERSATION_SPILL_DIR", "conversation_spill")
+        # fsync every spilled turn as well - survives power loss, not just a process crash
+        self.spill_fsync = os.environ.get("GABE_CONVERSATION_SPILL_FSYNC", "false").lower() == 'true'
+        # How often the flusher looks for spill files left by workers that died
+        self.recover_interval = float(os.environ.get("GABE_CONVERSATION_RECOVER_SECONDS", "60"))
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._spill = None
+        self._worker = None
+        # Batch files this process is committing right now
+        self._flushing = set()
+
+    def _spill_path(self) -> str:
+        return os.path.join(self.spill_dir, f"conversations.{os.getpid()}.jsonl")
+
+    def _dead_letter_path(self) -> str:
+        return os.path.join(self.spill_dir, "dead_letter.jsonl")
+
+    # ------------------------------------------------------------------
+    # Request path
+    # ------------------------------------------------------------------
+
+    def save(self, fields: Dict, user_name: str = "", sync: bool = False) -> Dict:
+        """Persist a turn and return it for the turn buffer
+
+        With `sync` the row is committed before returning; otherwise it is spilled to disk and
+        committed with the next batch, and the returned turn's id is filled in at that point.
+        """
+        fields = {**fields, 'timestamp': fields.get('timestamp') or datetime.utcnow()}
+        turn = {
+            'id': None,
+            'user_message': fields['user_message'],
+            'gabe_response': fields['gabe_response'],
+            'is_crisis': bool(fields.get('is_crisis'))
+        }
+
+        if sync:
+            conversation = self.Conversation(**fields)
+            self.db.session.add(conversation)
+            # Read the id before commit expires the row - afterwards it would be reloaded
+            self.db.session.flush()
+            turn['id'] = conversation.id
+            self.db.session.commit()
+            metrics.increment('conversation_writer.sync_commits')
+            self._saved(fields['user_id'], user_name)
+            return turn
+
+        item = {'key': uuid.uuid4().hex, 'user_name': user_name, 'fields': fields, 'turn': turn}
+        line = json.dumps({'key': item['key'], 'user_name': user_name, 'fields': self._encode(fields)})
+        with self._lock:
+            if self._spill is None:
+                self._spill = open(self._spill_path(), 'a', encoding='utf-8')
+            self._spill.write(line + "\n")
+            self._spill.flush()
+            if self.spill_fsync:
+                os.fsync(self._spill.fileno())
+            self._pending.append(item)
+            full = len(self._pending) >= self.batch_size
+
+        metrics.increment('conversation_writer.queued')
+        self._ensure_worker()
+        if full:
+            self._wake.set()
+        return turn
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def flush(self) -> int:
+        """Commit everything queued so far; returns how many rows were written"""
+        with self._flush_lock:
+            with self._lock:
+                items, self._pending = self._pending, []
+                if self._spill is not None:
+                    self._spill.close()
+                    self._spill = None
+                if not items:
+                    return 0
+                # New turns go to a fresh spill file while this batch commits; the batch's own file
+                # is named uniquely so a later batch can never overwrite it
+                flushing = f"{self._spill_path()}.{uuid.uuid4().hex}.flushing"
+                self._flushing.add(flushing)
+                os.replace(self._spill_path(), flushing)
+
+            committed, retry = [], items
+            try:
+                try:
+                    with self.app.app_context():
+                        self._insert(items)
+                    committed, retry = items, []
+                except Exception as e:
+                    logging.error(f"Group commit of {len(items)} conversations failed, retrying row by row: {e}")
+                    metrics.increment('conversation_writer.failures')
+                    with self.app.app_context():
+                        committed, retry = self._insert_each(items)
+            finally:
+                # Whatever didn't commit goes back on the queue and into the live spill file; the
+                # batch file is only removed once that has happened, else recover() replays it
+                try:
+                    if retry:
+                        self._requeue(retry)
+                    os.remove(flushing)
+                finally:
+                    with self._lock:
+                        self._flushing.discard(flushing)
+
+            if not committed:
+                return 0
+            metrics.increment('conversation_writer.committed', len(committed))
+            metrics.observe('conversation_writer.batch_size', len(committed))
+            for item in committed:
+                self._saved(item['fields']['user_id'], item['user_name'])
+            return len(committed)
+
+    def _insert(self, items: List[Dict]):
+        rows = [self.Conversation(**item['fields']) for item in items]
+        session = self.db.session
+        try:
+            session.add_all(rows)
+            session.flush()
+            ids = [row.id for row in rows]
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        for item, row_id in zip(items, ids):
+            if item.get('turn'):
+                item['turn']['id'] = row_id
+
+    def _insert_each(self, items: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Fallback after a failed batch: (committed, still to retry)
+
+        Each row gets its own transaction, so one bad row can't hold back the rest; rows the
+        database rejects go to the dead-letter file, and if the database itself is failing the
+        remaining rows are kept for the next flush.
+        """
+        committed = []
+        for n, item in enumerate(items):
+            try:
+                self._insert([item])
+                committed.append(item)
+            except TRANSIENT_ERRORS as e:
+                logging.warning(f"Database unavailable, keeping {len(items) - n} conversations queued: {e}")
+                return committed, items[n:]
+            except Exception as e:
+                self._dead_letter(item, e)
+        return committed, []
+
+    def _dead_letter(self, item: Dict, error: Exception):
+        record = {
+            'key': item['key'], 'user_name': item['user_name'], 'fields': self._encode(item['fields']),
+            'error': str(error), 'failed_at': datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            with open(self._dead_letter_path(), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        logging.error(f"Conversation for user {item['fields'].get('user_id')} rejected, moved to dead letter: {error}")
+        metrics.increment('conversation_writer.dead_lettered')
+
+    def _requeue(self, items: List[Dict]):
+        # Back in front of anything queued meanwhile, and back on disk
+        with self._lock:
+            if self._spill is None:
+                self._spill = open(self._spill_path(), 'a', encoding='utf-8')
+            for item in items:
+                self._spill.write(json.dumps({
+                    'key': item['key'], 'user_name': item['user_name'], 'fields': self._encode(item['fields'])
+                }) + "\n")
+            self._spill.flush()
+            self._pending = items + self._pending
+
+    def _saved(self, user_id: int, user_name: str):
+        if self.on_saved:
+            try:
+                self.on_saved(user_id, user_name)
+            except Exception as e:
+                logging.warning(f"Conversation saved hook failed: {e}")
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gabe-conversation-writer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        last_recovery = time.monotonic()
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Conversation writer error: {e}")
+
+            # Workers forked from a preloaded app never import it again - pick up a dead sibling's spill here
+            if time.monotonic() - last_recovery >= self.recover_interval:
+                last_recovery = time.monotonic()
+                try:
+                    with self.app.app_context():
+                        self.recover()
+                except Exception as e:
+                    logging.error(f"Conversation spill recovery error: {e}")
+
+    # ------------------------------------------------------------------
+    # Crash recovery
+    # ------------------------------------------------------------------
+
+    def recover(self) -> int:
+        """Replay spill files left by workers that are no longer running; returns rows restored
+
+        Runs at startup and periodically from every live worker's flusher.
+        """
+        restored = 0
+        with self._lock:
+            in_flight = set(self._flushing)
+        for path in glob.glob(os.path.join(self.spill_dir, "conversations.*.jsonl*")):
+            pid = self._owner(path)
+            if pid is None:
+                continue
+            if pid == os.getpid():
+                # Our own batch files are only left behind when their flush failed outright
+                if not path.endswith('.flushing') or path in in_flight:
+                    continue
+            elif self._alive(pid):
+                continue
+            claimed = f"{path}.recovering.{os.getpid()}"
+            try:
+                # Rename is atomic, so only one worker replays each file
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                restored += self._replay(claimed)
+                os.remove(claimed)
+            except Exception as e:
+                logging.error(f"Could not replay conversation spill {path}: {e}")
+        if restored:
+            logging.info(f"Restored {restored} conversations from spill files")
+            metrics.increment('conversation_writer.recovered', restored)
+        return restored
+
+    def _replay(self, path: str) -> int:
+        items = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line of a crashed worker's file may be half-written
+                    continue
+                fields = self._decode(record['fields'])
+                # A crash between commit and removing the file leaves rows that already exist
+                if self.Conversation.query.filter_by(user_id=fields['user_id'], timestamp=fields['timestamp']).first():
+                    continue
+                items.append({'key': record.get('key') or uuid.uuid4().hex,
+                              'user_name': record.get('user_name', ''), 'fields': fields})
+        if not items:
+            return 0
+
+        try:
+            self._insert(items)
+            return len(items)
+        except Exception as e:
+            logging.warning(f"Replaying {len(items)} conversations as one batch failed, retrying row by row: {e}")
+        committed, retry = self._insert_each(items)
+        if retry:
+            # Ours now - they go out with this worker's next flush
+            self._requeue(retry)
+            self._ensure_worker()
+        return len(committed)
+
+    @staticmethod
+    def _owner(path: str) -> Optional[int]:
+        name = os.path.basename(path)
+        if '.recovering.' in name:
+            # Claimed by a worker that may itself have died mid-replay
+            name = name.split('.recovering.')[-1]
+            return int(name) if name.isdigit() else None
+        parts = name.split('.')
+        return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def _encode(fields: Dict) -> Dict:
+        return {**fields, 'timestamp': fields['timestamp'].isoformat()}
+
+    @staticmethod
+    def _decode(fields: Dict) -> Dict:
+        return {**fields, 'timestamp': datetime.fromisoformat(fields['timestamp'])}
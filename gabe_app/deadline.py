@@ -0,0 +1,59 @@
+"""
+Request deadlines for GABE
+Each endpoint creates one Deadline and hands it down through memory lookup, provider calls and
+fallbacks; every stage spends only what is left and the caller falls back to a template once
+the budget is gone, so a hung upstream can't pin a worker
+"""
+
+import os
+import time
+from typing import Optional
+
+from metrics import metrics
+
+
+class DeadlineExceeded(Exception):
+    """Raised by Deadline.check once the request budget is spent"""
+
+
+class Deadline:
+    """Absolute point in time a request must answer by"""
+
+    def __init__(self, seconds: float, name: str = 'request'):
+        self.name = name
+        self.budget = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+
+    @classmethod
+    def for_request(cls, name: str, default_seconds: Optional[float] = None) -> 'Deadline':
+        """Deadline for an endpoint - GABE_DEADLINE_<NAME>_SECONDS, else GABE_REQUEST_DEADLINE_SECONDS"""
+        fallback = default_seconds if default_seconds is not None else float(
+            os.environ.get("GABE_REQUEST_DEADLINE_SECONDS", "25")
+        )
+        seconds = float(os.environ.get(f"GABE_DEADLINE_{name.upper()}_SECONDS", fallback))
+        return cls(seconds, name)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """Budget for the next stage: what's left minus `reserve` for later stages, at most `cap`"""
+        left = max(0.0, self.remaining() - reserve)
+        return min(left, cap) if cap is not None else left
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if nothing is left for `stage`"""
+        if self.expired():
+            metrics.increment(f"deadline.{self.name}.exceeded.{stage}")
+            raise DeadlineExceeded(f"{self.name} deadline exceeded before {stage}")
+
+    def __repr__(self):
+        return f"Deadline({self.name}, {self.remaining():.2f}s left of {self.budget:.2f}s)"
@@ -1,15 +1,81 @@
 import os
 import json
+import time
+import base64
+import asyncio
+import hashlib
 import logging
+import threading
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import firebase_admin
 from firebase_admin import credentials, firestore
+from background_loop import background_loop
+from metrics import metrics
+from response_cache import LRUTTLCache
+from write_behind import WriteBehindWriter
+from journal_outbox import JournalOutbox
+
+# Largest page a paginated read will return
+MAX_PAGE_SIZE = 50
+
+
+def encode_page_token(timestamp: datetime, doc_id: str) -> str:
+    """Opaque cursor for the document a page ended on"""
+    payload = json.dumps({'t': timestamp.isoformat(), 'id': doc_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token: str) -> Tuple[datetime, str]:
+    """(timestamp, doc_id) from a page token - raises ValueError for anything we didn't issue"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(payload['t']), str(payload['id'])
+    except Exception:
+        raise ValueError("Invalid page token")
 
 class FirebaseService:
+    """Firestore-backed user memory
+
+    The Firestore client is blocking, so every call is handed to the background loop's I/O
+    pool - the coroutines here never block the event loop they run on.
+    """
+    
     def __init__(self):
         """Initialize Firebase connection"""
         self.db = None
+        # Overall budget for loading a user's memory bundle
+        self.memory_timeout = float(os.environ.get("GABE_MEMORY_TIMEOUT_SECONDS", "1.5"))
+        
+        # Per-worker cache of each user's memory bundle, kept current by the save_* methods
+        self.memory_cache = LRUTTLCache(
+            max_entries=int(os.environ.get("GABE_MEMORY_CACHE_ENTRIES", "5000")),
+            ttl=float(os.environ.get("GABE_MEMORY_CACHE_TTL_SECONDS", "300"))
+        )
+        # Users with a bundle load in flight: [loads running, writes seen since they started] -
+        # a load that saw a write can't cache stale data; entries go when the last load finishes
+        self._memory_loads = {}
+        self._memory_lock = threading.Lock()
+        
+        # Profile activity and moods from chat turns are written behind, in batches
+        self.writer = WriteBehindWriter('firestore', lambda: self.db.batch())
+        # Users whose last_active was queued recently - expiry is the debounce window
+        self._recent_activity = LRUTTLCache(
+            max_entries=int(os.environ.get("GABE_MEMORY_CACHE_ENTRIES", "5000")),
+            ttl=float(os.environ.get("GABE_ACTIVITY_DEBOUNCE_SECONDS", "300"))
+        )
+        # Users whose profile is known to carry created_at, so it isn't checked again
+        self._created_profiles = LRUTTLCache(
+            max_entries=int(os.environ.get("GABE_MEMORY_CACHE_ENTRIES", "5000")),
+            ttl=float(os.environ.get("GABE_PROFILE_CREATED_TTL_SECONDS", "86400"))
+        )
+        
+        # Journal entries land in a local outbox first and are synced to Firestore in the background
+        self.journal_outbox = JournalOutbox(
+            os.environ.get("GABE_JOURNAL_OUTBOX_DB", "gabe_journal_outbox.db"), lambda: self.db
+        )
+        
         self._initialize_firebase()
     
     def _initialize_firebase(self):
@@ -57,6 +123,40 @@ class FirebaseService:
         """Check if Firebase is properly connected"""
         return self.db is not None
     
+    def invalidate_user_memory(self, user_id: str):
+        """Drop a user's cached memory bundle"""
+        with self._memory_lock:
+            self._note_memory_write(user_id)
+            self.memory_cache.delete(user_id)
+        metrics.increment('firebase.memory_cache.invalidations')
+    
+    def _update_cached_memory(self, user_id: str, key: str, update):
+        """Write-through: apply a save to the cached bundle rather than throwing it away"""
+        with self._memory_lock:
+            self._note_memory_write(user_id)
+            memory = self.memory_cache.get(user_id)
+            if memory is not None:
+                memory = dict(memory)
+                memory[key] = update(memory.get(key))
+                self.memory_cache.set(user_id, memory)
+    
+    def _note_memory_write(self, user_id: str):
+        # Caller holds _memory_lock
+        loads = self._memory_loads.get(user_id)
+        if loads is not None:
+            loads[1] += 1
+    
+    def memory_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate of the memory bundle cache in this worker"""
+        hits = metrics.count('firebase.memory_cache.hits')
+        misses = metrics.count('firebase.memory_cache.misses')
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'memory_entries': len(self.memory_cache)
+        }
+    
     def get_user_id(self, user_name: str, session_id: str = None) -> str:
         """Generate a consistent user ID from name and session"""
         # Simple user ID generation - in production, use proper auth
@@ -67,6 +167,75 @@ class FirebaseService:
         else:
             return f"anonymous_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
+    def _profile_data(self, name: str, **kwargs) -> Dict[str, Any]:
+        # Never carries created_at - merged profile writes would reset it; see _stamp_created_at
+        profile_data = {'name': name, 'last_active': datetime.now(timezone.utc), **kwargs}
+        profile_data.pop('created_at', None)
+        return profile_data
+    
+    def _stamp_created_at(self, user_id: str):
+        """Give the profile a created_at if it has none yet - blocking, so run it on the I/O pool
+        
+        Checked inside a transaction rather than by document existence, so it is right whichever
+        of this and a queued profile merge reaches Firestore first.
+        """
+        if self._created_profiles.get(user_id) is not None:
+            return
+        user_ref = self.db.collection('users').document(user_id)
+        
+        @firestore.transactional
+        def stamp(transaction):
+            snapshot = user_ref.get(transaction=transaction)
+            if not (snapshot.exists and (snapshot.to_dict() or {}).get('created_at')):
+                transaction.set(user_ref, {'created_at': datetime.now(timezone.utc)}, merge=True)
+                metrics.increment('firebase.profile.created')
+        
+        stamp(self.db.transaction())
+        self._created_profiles.set(user_id, True)
+    
+    def _mood_data(self, mood: str, context: str = None) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            'mood': mood,
+            'context': context,
+            'timestamp': now,
+            'date': now.strftime('%Y-%m-%d')
+        }
+    
+    def _cache_mood(self, user_id: str, mood_data: Dict[str, Any]):
+        # Today's mood document replaces any earlier one from today at the top of the list
+        today = mood_data['date']
+        self._update_cached_memory(user_id, 'recent_moods', lambda moods: (
+            [{**mood_data, 'id': today}] + [m for m in (moods or []) if m.get('id') != today]
+        )[:3])
+    
+    def record_activity(self, user_id: str, name: str, **kwargs) -> bool:
+        """Queue a profile update from a chat turn; last_active alone is written at most once per debounce window"""
+        if not self.is_connected():
+            return False
+        
+        if not kwargs and self._recent_activity.get(user_id) is not None:
+            metrics.increment('firebase.write_behind.debounced')
+            return False
+        self._recent_activity.set(user_id, True)
+        
+        profile_data = self._profile_data(name, **kwargs)
+        if self._created_profiles.get(user_id) is None:
+            background_loop.submit(background_loop.offload(self._stamp_created_at, user_id))
+        self._update_cached_memory(user_id, 'profile', lambda profile: {**(profile or {}), **profile_data})
+        return self.writer.put(('profile', user_id), self.db.collection('users').document(user_id), profile_data)
+    
+    def record_mood(self, user_id: str, mood: str, context: str = None) -> bool:
+        """Queue today's mood; several moods on the same day coalesce into one write"""
+        if not self.is_connected():
+            return False
+        
+        mood_data = self._mood_data(mood, context)
+        self._cache_mood(user_id, mood_data)
+        mood_ref = (self.db.collection('users').document(user_id)
+                   .collection('moods').document(mood_data['date']))
+        return self.writer.put(('mood', user_id, mood_data['date']), mood_ref, mood_data)
+    
     async def save_user_profile(self, user_id: str, name: str, **kwargs) -> bool:
         """Save or update user profile information"""
         if not self.is_connected():
@@ -74,15 +243,12 @@ class FirebaseService:
             
         try:
             user_ref = self.db.collection('users').document(user_id)
-            profile_data = {
-                'name': name,
-                'created_at': datetime.now(timezone.utc),
-                'last_active': datetime.now(timezone.utc),
-                **kwargs
-            }
+            profile_data = self._profile_data(name, **kwargs)
             
             # Update or create profile
-            user_ref.set(profile_data, merge=True)
+            await background_loop.offload(user_ref.set, profile_data, merge=True)
+            await background_loop.offload(self._stamp_created_at, user_id)
+            self._update_cached_memory(user_id, 'profile', lambda profile: {**(profile or {}), **profile_data})
             logging.info(f"User profile saved for {user_id}")
             return True
             
@@ -96,33 +262,28 @@ class FirebaseService:
             return None
             
         try:
-            user_ref = self.db.collection('users').document(user_id)
-            doc = user_ref.get()
-            
-            if doc.exists:
-                return doc.to_dict()
-            return None
+            return await self._fetch_profile(user_id)
             
         except Exception as e:
             logging.error(f"Failed to get user profile: {e}")
             return None
     
+    async def _fetch_profile(self, user_id: str) -> Optional[Dict]:
+        """The profile document, None if there is none - raises when Firestore fails"""
+        doc = await background_loop.offload(self.db.collection('users').document(user_id).get)
+        return doc.to_dict() if doc.exists else None
+    
+    def record_journal_entry(self, user_id: str, content: str, mood: str = None) -> Dict[str, Any]:
+        """Commit a journal entry to the local outbox - works with or without Firebase"""
+        entry = self.journal_outbox.add(user_id, content, mood)
+        self.invalidate_user_memory(user_id)
+        logging.info(f"Journal entry {entry['id']} queued for {user_id}")
+        return entry
+    
     async def save_journal_entry(self, user_id: str, content: str, mood: str = None) -> bool:
         """Save a journal entry for the user"""
-        if not self.is_connected():
-            return False
-            
         try:
-            journal_ref = self.db.collection('users').document(user_id).collection('journal')
-            entry_data = {
-                'content': content,
-                'mood': mood,
-                'timestamp': datetime.now(timezone.utc),
-                'date': datetime.now(timezone.utc).strftime('%Y-%m-%d')
-            }
-            
-            journal_ref.add(entry_data)
-            logging.info(f"Journal entry saved for {user_id}")
+            self.record_journal_entry(user_id, content, mood)
             return True
             
         except Exception as e:
@@ -131,28 +292,113 @@ class FirebaseService:
     
     async def get_journal_entries(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Retrieve user's journal entries"""
+        entries, _ = await self.get_journal_page(user_id, limit)
+        return entries[:limit]
+    
+    async def get_journal_page(self, user_id: str, limit: int = 10, page_token: Optional[str] = None,
+                               strict: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """One page of journal entries, newest first, and the token for the next page (None at the end)
+        
+        Raises ValueError for a malformed page token. A Firestore failure leaves only the outbox
+        entries on the page, or is raised with `strict`.
+        """
+        cursor = decode_page_token(page_token) if page_token else None
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        
+        # Entries still waiting in the outbox take their place in the timeline like synced ones
+        pending = await background_loop.offload(
+            self.journal_outbox.pending_for, user_id, limit + 1, cursor[0] if cursor else None
+        )
+        if cursor:
+            pending = [entry for entry in pending if self._page_key(entry) < self._page_key_of(cursor)]
+        
+        entries, more = [], False
+        if self.is_connected():
+            try:
+                journal_ref = self.db.collection('users').document(user_id).collection('journal')
+                entries, next_token = await self._page(journal_ref, journal_ref, limit, cursor)
+                more = next_token is not None
+            except Exception as e:
+                if strict:
+                    raise
+                logging.error(f"Failed to get journal entries: {e}")
+        
+        if not pending:
+            return entries, encode_page_token(entries[-1]['timestamp'], entries[-1]['id']) if more else None
+        
+        # An entry synced between the two reads shows up in both
+        pending_ids = {entry['id'] for entry in pending}
+        merged = pending + [entry for entry in entries if entry['id'] not in pending_ids]
+        merged.sort(key=self._page_key, reverse=True)
+        
+        # Pending entries count against the page size; the cursor moves to the last entry shown
+        page = merged[:limit]
+        if not (more or len(merged) > limit):
+            return page, None
+        return page, encode_page_token(page[-1]['timestamp'], page[-1]['id'])
+    
+    @staticmethod
+    def _page_key(entry: Dict) -> Tuple[datetime, str]:
+        """(timestamp, doc id) - the order pages are cut in"""
+        return (entry.get('timestamp') or datetime.min.replace(tzinfo=timezone.utc), entry['id'])
+    
+    @staticmethod
+    def _page_key_of(cursor: Tuple[datetime, str]) -> Tuple[datetime, str]:
+        timestamp, doc_id = cursor
+        return (timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc), doc_id)
+    
+    async def get_mood_page(self, user_id: str, limit: int = 7,
+                            page_token: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of daily moods, newest first, and the token for the next page (None at the end)
+        
+        Raises ValueError for a malformed page token.
+        """
+        cursor = decode_page_token(page_token) if page_token else None
         if not self.is_connected():
-            return []
-            
-        try:
-            journal_ref = (self.db.collection('users').document(user_id)
-                          .collection('journal')
-                          .order_by('timestamp', direction=firestore.Query.DESCENDING)
-                          .limit(limit))
-            
-            docs = journal_ref.stream()
-            entries = []
-            
-            for doc in docs:
-                entry = doc.to_dict()
-                entry['id'] = doc.id
-                entries.append(entry)
-            
-            return entries
-            
-        except Exception as e:
-            logging.error(f"Failed to get journal entries: {e}")
-            return []
+            return [], None
+        mood_ref = self.db.collection('users').document(user_id).collection('moods')
+        return await self._page(mood_ref, mood_ref, limit, cursor)
+    
+    async def get_prayer_page(self, user_id: str, limit: int = 5,
+                              page_token: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of active prayer requests, newest first, and the token for the next page (None at the end)
+        
+        Raises ValueError for a malformed page token.
+        """
+        cursor = decode_page_token(page_token) if page_token else None
+        if not self.is_connected():
+            return [], None
+        prayer_ref = self.db.collection('users').document(user_id).collection('prayers')
+        return await self._page(prayer_ref.where('status', '==', 'active'), prayer_ref, limit, cursor)
+    
+    async def _page(self, query, collection_ref, limit: int,
+                    cursor: Optional[Tuple[datetime, str]]) -> Tuple[List[Dict], Optional[str]]:
+        """Keyset page over `query` ordered by (timestamp, doc id) descending
+        
+        Each page is a start_after on the last entry of the previous one, so every page costs
+        the same no matter how far back it is.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = (query.order_by('timestamp', direction=firestore.Query.DESCENDING)
+                 .order_by('__name__', direction=firestore.Query.DESCENDING))
+        if cursor:
+            timestamp, doc_id = cursor
+            query = query.start_after({'timestamp': timestamp, '__name__': collection_ref.document(doc_id)})
+        # One extra document tells us whether there is another page
+        query = query.limit(limit + 1)
+        
+        docs = await background_loop.offload(lambda: list(query.stream()))
+        entries = []
+        for doc in docs[:limit]:
+            entry = doc.to_dict()
+            entry['id'] = doc.id
+            entries.append(entry)
+        
+        next_token = None
+        if len(docs) > limit and entries[-1].get('timestamp'):
+            next_token = encode_page_token(entries[-1]['timestamp'], entries[-1]['id'])
+        metrics.increment('firebase.pages')
+        return entries, next_token
     
     async def save_mood(self, user_id: str, mood: str, context: str = None) -> bool:
         """Save user's mood for the day"""
@@ -160,18 +406,12 @@ class FirebaseService:
             return False
             
         try:
-            today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+            mood_data = self._mood_data(mood, context)
             mood_ref = (self.db.collection('users').document(user_id)
-                       .collection('moods').document(today))
-            
-            mood_data = {
-                'mood': mood,
-                'context': context,
-                'timestamp': datetime.now(timezone.utc),
-                'date': today
-            }
+                       .collection('moods').document(mood_data['date']))
             
-            mood_ref.set(mood_data, merge=True)
+            await background_loop.offload(mood_ref.set, mood_data, merge=True)
+            self._cache_mood(user_id, mood_data)
             logging.info(f"Mood saved for {user_id}: {mood}")
             return True
             
@@ -181,23 +421,8 @@ class FirebaseService:
     
     async def get_recent_moods(self, user_id: str, days: int = 7) -> List[Dict]:
         """Get user's recent moods"""
-        if not self.is_connected():
-            return []
-            
         try:
-            mood_ref = (self.db.collection('users').document(user_id)
-                       .collection('moods')
-                       .order_by('timestamp', direction=firestore.Query.DESCENDING)
-                       .limit(days))
-            
-            docs = mood_ref.stream()
-            moods = []
-            
-            for doc in docs:
-                mood_data = doc.to_dict()
-                mood_data['id'] = doc.id
-                moods.append(mood_data)
-            
+            moods, _ = await self.get_mood_page(user_id, days)
             return moods
             
         except Exception as e:
@@ -217,7 +442,8 @@ class FirebaseService:
                 'status': 'active'  # active, answered, ongoing
             }
             
-            prayer_ref.add(prayer_data)
+            await background_loop.offload(prayer_ref.add, prayer_data)
+            self.invalidate_user_memory(user_id)
             logging.info(f"Prayer request saved for {user_id}")
             return True
             
@@ -227,24 +453,8 @@ class FirebaseService:
     
     async def get_prayer_requests(self, user_id: str, limit: int = 5) -> List[Dict]:
         """Get user's prayer requests"""
-        if not self.is_connected():
-            return []
-            
         try:
-            prayer_ref = (self.db.collection('users').document(user_id)
-                         .collection('prayers')
-                         .where('status', '==', 'active')
-                         .order_by('timestamp', direction=firestore.Query.DESCENDING)
-                         .limit(limit))
-            
-            docs = prayer_ref.stream()
-            prayers = []
-            
-            for doc in docs:
-                prayer_data = doc.to_dict()
-                prayer_data['id'] = doc.id
-                prayers.append(prayer_data)
-            
+            prayers, _ = await self.get_prayer_page(user_id, limit)
             return prayers
             
         except Exception as e:
@@ -257,7 +467,8 @@ class FirebaseService:
             return False
             
         try:
-            context_ref = self.db.collection('users').document(user_id).collection('contexts')
+            context_ref = (self.db.collection('users').document(user_id)
+                          .collection('contexts').document(self.context_doc_id(topic)))
             context_data = {
                 'topic': topic,
                 'context': context,
@@ -265,17 +476,8 @@ class FirebaseService:
                 'last_mentioned': datetime.now(timezone.utc)
             }
             
-            # Check if topic already exists and update
-            existing = context_ref.where('topic', '==', topic).limit(1).stream()
-            doc_id = None
-            for doc in existing:
-                doc_id = doc.id
-                break
-            
-            if doc_id:
-                context_ref.document(doc_id).set(context_data, merge=True)
-            else:
-                context_ref.add(context_data)
+            # One document per topic, so the upsert is a single write with no lookup first
+            await background_loop.offload(context_ref.set, context_data, merge=True)
             
             logging.info(f"Conversation context saved for {user_id}: {topic}")
             return True
@@ -284,21 +486,141 @@ class FirebaseService:
             logging.error(f"Failed to save conversation context: {e}")
             return False
     
-    async def get_user_memory(self, user_id: str) -> Dict[str, Any]:
-        """Get comprehensive user memory for personalized responses"""
+    @staticmethod
+    def context_doc_id(topic: str) -> str:
+        """Deterministic context document ID - the same for every spelling of a topic up to case and spacing"""
+        normalized = ' '.join(topic.lower().split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+    
+    async def migrate_conversation_contexts(self, dry_run: bool = False) -> Dict[str, int]:
+        """One-time migration of context docs with random IDs to topic-hash IDs
+        
+        Duplicate docs for the same topic are merged (fields from the most recently mentioned
+        win) into the deterministic doc and the old docs are deleted.
+        """
+        stats = {'users': 0, 'topics': 0, 'merged': 0, 'deleted': 0}
+        if not self.is_connected():
+            return stats
+        
+        epoch = datetime.fromtimestamp(0, timezone.utc)
+        users = await background_loop.offload(lambda: list(self.db.collection('users').list_documents()))
+        for user_ref in users:
+            context_ref = user_ref.collection('contexts')
+            docs = await background_loop.offload(lambda: list(context_ref.stream()))
+            stats['users'] += 1
+            
+            groups = {}
+            for doc in docs:
+                data = doc.to_dict() or {}
+                if data.get('topic'):
+                    groups.setdefault(self.context_doc_id(data['topic']), []).append((doc, data))
+            
+            writes = []
+            for doc_id, group in groups.items():
+                stats['topics'] += 1
+                if len(group) == 1 and group[0][0].id == doc_id:
+                    continue
+                
+                group.sort(key=lambda item: item[1].get('last_mentioned') or item[1].get('timestamp') or epoch)
+                merged = {}
+                for _, data in group:
+                    merged.update(data)
+                writes.append(('set', context_ref.document(doc_id), merged))
+                stats['merged'] += len(group)
+                for doc, _ in group:
+                    if doc.id != doc_id:
+                        writes.append(('delete', doc.reference, None))
+                        stats['deleted'] += 1
+            
+            if dry_run:
+                continue
+            # Firestore caps a batch at 500 writes
+            for start in range(0, len(writes), 500):
+                batch = self.db.batch()
+                for op, ref, data in writes[start:start + 500]:
+                    if op == 'set':
+                        batch.set(ref, data)
+                    else:
+                        batch.delete(ref)
+                await background_loop.offload(batch.commit)
+        
+        logging.info(f"Context migration {'(dry run) ' if dry_run else ''}finished: {stats}")
+        return stats
+    
+    @staticmethod
+    async def _first_page(page) -> List[Dict]:
+        entries, _ = await page
+        return entries
+    
+    async def get_user_memory(self, user_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Get comprehensive user memory for personalized responses
+
+        The four lookups run concurrently; whatever hasn't answered within `timeout` is left
+        out so one slow query never holds up the reply. The lookups raise rather than returning
+        an empty result, so a failed one makes the bundle partial and it is not cached.
+        """
         if not self.is_connected():
             return {}
-            
+        
+        cached = self.memory_cache.get(user_id)
+        if cached is not None:
+            metrics.increment('firebase.memory_cache.hits')
+            return cached
+        metrics.increment('firebase.memory_cache.misses')
+        
+        started = time.monotonic()
+        defaults = {'profile': None, 'recent_moods': [], 'recent_journal': [], 'prayer_requests': []}
+        tasks = {
+            'profile': asyncio.ensure_future(self._fetch_profile(user_id)),
+            'recent_moods': asyncio.ensure_future(self._first_page(self.get_mood_page(user_id, 3))),
+            'recent_journal': asyncio.ensure_future(self._first_page(self.get_journal_page(user_id, 3, strict=True))),
+            'prayer_requests': asyncio.ensure_future(self._first_page(self.get_prayer_page(user_id, 3)))
+        }
+        
+        with self._memory_lock:
+            loads = self._memory_loads.setdefault(user_id, [0, 0])
+            loads[0] += 1
+            generation = loads[1]
+        
         try:
-            memory = {
-                'profile': await self.get_user_profile(user_id),
-                'recent_moods': await self.get_recent_moods(user_id, 3),
-                'recent_journal': await self.get_journal_entries(user_id, 3),
-                'prayer_requests': await self.get_prayer_requests(user_id, 3)
-            }
-            
+            done, pending = await asyncio.wait(
+                tasks.values(), timeout=timeout if timeout is not None else self.memory_timeout
+            )
+            for task in pending:
+                task.cancel()
+            
+            memory = {}
+            complete = True
+            for key, task in tasks.items():
+                if task in done and task.exception() is None:
+                    memory[key] = task.result()
+                else:
+                    if task in done:
+                        logging.error(f"Loading {key} for {user_id} failed: {task.exception()}")
+                    memory[key] = defaults[key]
+                    complete = False
+                    metrics.increment(f"firebase.memory.missing.{key}")
+            
+            if pending:
+                metrics.increment('firebase.memory.partial')
+                logging.warning(f"User memory for {user_id} is partial - {len(pending)} lookups timed out")
+            metrics.observe('firebase.memory.latency', time.monotonic() - started)
+            
+            # Only complete bundles are cached, and only if nothing was written meanwhile
+            if complete:
+                with self._memory_lock:
+                    if loads[1] == generation:
+                        self.memory_cache.set(user_id, memory)
             return memory
             
         except Exception as e:
+            for task in tasks.values():
+                task.cancel()
             logging.error(f"Failed to get user memory: {e}")
             return {}
+        
+        finally:
+            with self._memory_lock:
+                loads[0] -= 1
+                if loads[0] == 0:
+                    self._memory_loads.pop(user_id, None)
@@ -1,46 +1,41 @@
 import os
 import json
 import logging
-import asyncio
 from datetime import datetime
-from openai import OpenAI
-from google import genai
-from google.genai import types
 from firebase_service import FirebaseService
 from drop_of_hope import DropOfHope
+from llm_gateway import gateway, chat_messages
+from response_cache import ResponseCache
+from metrics import metrics
+from token_budget import HistoryManager, normalize_turns
+from background_loop import background_loop
 
 class GabeAI:
+    PROMPT_MOODS = ('neutral', 'positive', 'sad', 'anxious', 'angry', 'hopeful')
+    
+    PROVIDER_FAILURE_RESPONSE = "I'm having some technical hiccups right now, but my heart is still with you! 💙 Try asking me again in a moment - I'll be here waiting."
+
     def __init__(self):
-        # Initialize both AI providers
-        self.openai_client = None
-        self.gemini_client = None
+        # Both AI providers are reached through the shared gateway - OpenAI is preferred,
+        # Gemini is hedged in when OpenAI runs slow and takes over while its circuit is open
+        self.gateway = gateway
         
         # Initialize Firebase service and Drop of Hope content
         self.firebase = FirebaseService()
         self.drop_of_hope = DropOfHope()
         
-        # Try to initialize OpenAI
-        openai_key = os.environ.get("OPENAI_API_KEY")
-        if openai_key:
-            try:
-                self.openai_client = OpenAI(api_key=openai_key)
-                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                self.openai_model = "gpt-4o"
-            except Exception as e:
-                logging.warning(f"Failed to initialize OpenAI: {e}")
+        if not self.gateway.available('openai') and not self.gateway.available('gemini'):
+            raise Exception("No AI provider available. Please check your API keys.")
         
-        # Try to initialize Gemini
-        gemini_key = os.environ.get("GEMINI_API_KEY")
-        if gemini_key:
-            try:
-                self.gemini_client = genai.Client(api_key=gemini_key)
-                # Note that the newest Gemini model series is "gemini-2.5-flash" or "gemini-2.5-pro"
-                self.gemini_model = "gemini-2.5-flash"
-            except Exception as e:
-                logging.warning(f"Failed to initialize Gemini: {e}")
+        # Recent turns packed to a token budget rather than a fixed count
+        self.history = HistoryManager('gabe_ai')
         
-        if not self.openai_client and not self.gemini_client:
-            raise Exception("No AI provider available. Please check your API keys.")
+        # Most of a request's deadline is kept for the AI call
+        self.memory_budget = float(os.environ.get("GABE_MEMORY_BUDGET_SECONDS", "2"))
+        
+        # Popular verses and prayer topics repeat a lot - serve them from cache
+        self.prayer_cache = ResponseCache('gabe_ai.prayer')
+        self.scripture_cache = ResponseCache('gabe_ai.scripture')
         
         # Dynamic AI system prompt - naturally conversational and deeply personal
         self.base_system_prompt = """You are GABE — short for "God Always Beside Everyone." You're a warm, faithful, emotionally intelligent spiritual companion who chats like a real friend with a Bible in one hand and coffee in the other. You engage in natural, flowing conversations that feel authentic and personally meaningful.
@@ -99,6 +94,13 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
                 'analogies': "Harvest seasons, pruning for growth, still waters, solid foundations, wisdom passed down, time healing wounds"
             }
         }
+        
+        # Static system prefixes, compiled once so every request for the same age group and mood
+        # sends a byte-identical prefix that the providers can cache
+        self.compiled_prompts = {}
+        for age_group in self.age_personalities:
+            for mood in self.PROMPT_MOODS:
+                self.compiled_prompts[(age_group, mood)] = self._compile_system_prompt(age_group, mood)
 
     def detect_age_group(self, message, user_name="", conversation_history=None):
         """Detect user's likely age group based on language patterns and references"""
@@ -137,7 +139,7 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
         
         # Check conversation history for more context
         if conversation_history:
-            for exchange in conversation_history[-3:]:  # Last 3 exchanges
+            for exchange in normalize_turns(conversation_history)[-3:]:  # Last 3 exchanges
                 user_msg = exchange.get('user', '').lower()
                 gen_z_score += sum(1 for indicator in gen_z_indicators if indicator in user_msg) * 0.5
                 millennial_score += sum(1 for indicator in millennial_indicators if indicator in user_msg) * 0.5
@@ -167,60 +169,131 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
         else:
             return 'millennial'  # Default
 
-    def get_response(self, user_message, user_name="", age_range=None, conversation_history=None, session_id=None):
+    def get_response(self, user_message, user_name="", age_range=None, conversation_history=None, session_id=None, conversation_summary=None, deadline=None):
         """Get GABE's response to user message with memory and fallback between providers"""
+        canned_response, conversation_context = self._prepare_conversation(
+            user_message, user_name, age_range, conversation_history, session_id, conversation_summary, deadline
+        )
+        if canned_response:
+            return canned_response
+        return self.complete_reply(conversation_context, deadline)
+    
+    def stream_response(self, user_message, user_name="", age_range=None, conversation_history=None, session_id=None, conversation_summary=None, deadline=None):
+        """Yield GABE's response in chunks as the AI provider produces it"""
+        canned_response, conversation_context = self._prepare_conversation(
+            user_message, user_name, age_range, conversation_history, session_id, conversation_summary, deadline
+        )
+        if canned_response:
+            yield canned_response
+            return
+        yield from self.stream_reply(conversation_context, deadline)
+    
+    def complete_reply(self, conversation_context, deadline=None):
+        """Model stage: answer a prepared conversation context"""
+        # OpenAI first, with Gemini hedged in if OpenAI is slow or failing
+        response = self.gateway.complete(self._chat_spec(conversation_context, deadline))
+        if response:
+            return response
+            
+        # Both providers failed, or the request ran out of time
+        return self.PROVIDER_FAILURE_RESPONSE
+    
+    def stream_reply(self, conversation_context, deadline=None):
+        """Model stage, streamed: yield the answer to a prepared conversation context in chunks"""
+        # The gateway only falls back to the other provider before any text went out,
+        # a half-streamed answer can't be restarted with another provider
+        produced = False
+        for chunk in self.gateway.stream(self._chat_spec(conversation_context, deadline)):
+            produced = True
+            yield chunk
+        if produced:
+            return
+        
+        # Both providers failed, or the request ran out of time
+        yield self.PROVIDER_FAILURE_RESPONSE
+    
+    def _prepare_conversation(self, user_message, user_name="", age_range=None, conversation_history=None, session_id=None, conversation_summary=None, deadline=None):
+        """Run the interceptors and memory lookup - returns (canned_response, conversation_context)"""
+        # Always detect mood, regardless of Firebase connection
+        mood = self.detect_mood(user_message)
         
-        # PRAYER INTERCEPTOR: Handle prayer requests immediately with short prayers
+        canned_response = self.template_response(user_message, user_name, mood)
+        if not self.is_prayer_request(user_message):
+            self.record_signals(user_name, session_id, mood, user_message)
+        if canned_response:
+            return canned_response, None
+        
+        return None, self.prepare_context(
+            user_message, user_name, age_range, conversation_history, session_id, conversation_summary, deadline, mood
+        )
+    
+    def is_prayer_request(self, user_message):
+        """PRAYER INTERCEPTOR trigger"""
         user_msg_lower = user_message.lower().strip()
-        name = user_name or 'friend'
         
         # Define comprehensive list of prayer trigger keywords
         prayer_keywords = ["pray", "prayer", "jesus", "father", "heavenly", "god help", "bless me", "amen", "lord", "can you pray", "please pray"]
         
         # Check for any keyword match
-        if any(keyword in user_msg_lower for keyword in prayer_keywords):
+        return any(keyword in user_msg_lower for keyword in prayer_keywords)
+    
+    def template_response(self, user_message, user_name="", mood=None):
+        """Deterministic replies that need no history, memory or model - None when the model should answer"""
+        name = user_name or 'friend'
+        
+        # PRAYER INTERCEPTOR: Handle prayer requests immediately with short prayers
+        if self.is_prayer_request(user_message):
             return f"🙏 Lord, give {name} peace, strength, and joy today. Amen."
         
-        # Handle memory and context asynchronously
-        memory_context = {}
+        if mood is None:
+            mood = self.detect_mood(user_message)
         
-        # Always detect mood, regardless of Firebase connection
-        mood = self.detect_mood(user_message)
+        # Check for deep emotional states that need structured responses
+        if mood == 'sad':
+            # Return simple structured sadness response for now
+            return f"That's okay, {name}. Sadness happens. Would it help to talk about it, or would you prefer some quiet time with me? Or would you like to hear a Bible story or verse?"
+        elif mood == 'anxious':
+            return self._create_anxiety_response(name)
+        elif mood == 'angry':
+            return self._create_anger_response(name)
+        return None
+    
+    def record_signals(self, user_name, session_id=None, mood=None, user_message=""):
+        """Queue the user's activity and mood - written behind in batches without holding up the reply"""
+        if not user_name or not self.firebase.is_connected():
+            return
+        
+        try:
+            user_id = self.firebase.get_user_id(user_name, session_id)
+            self.firebase.record_activity(user_id, user_name)
+            if mood and mood != 'neutral':
+                self.firebase.record_mood(user_id, mood, user_message)
+        except Exception as e:
+            logging.warning(f"Memory operation failed: {e}")
+    
+    def prepare_context(self, user_message, user_name="", age_range=None, conversation_history=None, session_id=None, conversation_summary=None, deadline=None, mood=None):
+        """Context stage: user memory plus history, summary and persona folded into the prompt"""
+        memory_context = {}
+        if mood is None:
+            mood = self.detect_mood(user_message)
         
         if user_name and self.firebase.is_connected():
             try:
                 user_id = self.firebase.get_user_id(user_name, session_id)
                 
-                # Get user memory in a thread-safe way
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Save user profile
-                loop.run_until_complete(self.firebase.save_user_profile(user_id, user_name))
-                
-                # Get user memory
-                memory_context = loop.run_until_complete(self.firebase.get_user_memory(user_id))
-                
-                # Save mood if it's not neutral
-                if mood and mood != 'neutral':
-                    loop.run_until_complete(self.firebase.save_mood(user_id, mood, user_message))
-                
-                loop.close()
+                # Memory is nice to have - the read only gets a slice of the request budget
+                budget = deadline.timeout(cap=self.memory_budget) if deadline else self.memory_budget
+                # A little grace on top so partial results from the concurrent lookups still make it back
+                memory_context = background_loop.run(
+                    self.firebase.get_user_memory(user_id, timeout=budget), timeout=budget + 0.25
+                )
                 
+            except TimeoutError:
+                metrics.increment('deadline.memory.exceeded.lookup')
+                logging.warning("Memory lookup ran out of time - answering without it")
             except Exception as e:
                 logging.warning(f"Memory operation failed: {e}")
         
-        # Check for deep emotional states that need structured responses
-        if mood == 'sad':
-            # Return simple structured sadness response for now
-            name = user_name or "friend"
-            return f"That's okay, {name}. Sadness happens. Would it help to talk about it, or would you prefer some quiet time with me? Or would you like to hear a Bible story or verse?"
-        elif mood == 'anxious':
-            return self._create_anxiety_response(user_name or "friend")
-        elif mood == 'angry':
-            return self._create_anger_response(user_name or "friend")
-        
-        # For other emotions, use AI providers
         # Use provided age range or detect from message
         if age_range:
             age_group = self._map_age_range_to_group(age_range)
@@ -228,64 +301,44 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
             age_group = self.detect_age_group(user_message, user_name, conversation_history)
         
         # Build conversation context with memory, spiritual content, and age-based personality
-        conversation_context = self._build_conversation_context(
-            user_message, user_name, conversation_history, memory_context, mood, age_group
+        return self._build_conversation_context(
+            user_message, user_name, conversation_history, memory_context, mood, age_group, conversation_summary
         )
-        
-        # Try OpenAI first, then fallback to Gemini
-        response = self._try_openai_response(conversation_context)
-        if response:
-            return response
-            
-        response = self._try_gemini_response(conversation_context)
-        if response:
-            return response
-            
-        # Both providers failed
-        return "I'm having some technical hiccups right now, but my heart is still with you! 💙 Try asking me again in a moment - I'll be here waiting."
     
     def save_journal_entry(self, user_name, content, session_id=None):
-        """Save a journal entry for the user"""
-        if not user_name or not self.firebase.is_connected():
+        """Save a journal entry for the user - stored locally at once, synced to Firebase in the background"""
+        if not user_name:
             return False
             
         try:
             user_id = self.firebase.get_user_id(user_name, session_id)
             mood = self.detect_mood(content)
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(
-                self.firebase.save_journal_entry(user_id, content, mood)
-            )
-            loop.close()
-            
-            return result
+            self.firebase.record_journal_entry(user_id, content, mood)
+            return True
             
         except Exception as e:
             logging.error(f"Failed to save journal entry: {e}")
             return False
     
-    def get_journal_entries(self, user_name, session_id=None, limit=5):
-        """Get user's journal entries"""
-        if not user_name or not self.firebase.is_connected():
-            return []
+    def get_journal_entries(self, user_name, session_id=None, limit=5, page_token=None):
+        """Get one page of the user's journal entries - returns (entries, next_page_token)
+        
+        Raises ValueError for a malformed page token.
+        """
+        if not user_name:
+            return [], None
             
         try:
             user_id = self.firebase.get_user_id(user_name, session_id)
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            entries = loop.run_until_complete(
-                self.firebase.get_journal_entries(user_id, limit)
-            )
-            loop.close()
-            
-            return entries
+            return background_loop.run(self.firebase.get_journal_page(user_id, limit, page_token))
             
+        except ValueError:
+            raise
         except Exception as e:
             logging.error(f"Failed to get journal entries: {e}")
-            return []
+            return [], None
     
     def detect_mood(self, message):
         """Detect user mood from message content"""
@@ -369,24 +422,46 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
         
         return response
     
-    def _build_conversation_context(self, user_message, user_name="", conversation_history=None, memory_context=None, mood=None, age_group='millennial'):
+    def _compile_system_prompt(self, age_group, mood):
+        """Everything in the system prompt that doesn't depend on the user - base, personality, mood guidance"""
+        prompt = self.base_system_prompt
+        
+        if age_group in self.age_personalities:
+            personality = self.age_personalities[age_group]
+            prompt += f"\n\nPERSONALITY FOR {age_group.upper().replace('_', ' ')}:\n"
+            prompt += f"Tone: {personality['tone']}\n"
+            prompt += f"Use analogies like: {personality['analogies']}\n"
+            prompt += f"\nStay conversational and natural for this age group while providing medium-length messages (3-4 substantial sentences). ALWAYS weave in biblical wisdom naturally - not as formal quotes but as helpful life wisdom. Always offer to pray together, share a relevant Bible verse, or provide a relatable thought. End with a caring invitation to continue talking."
+        
+        if mood and mood != 'neutral':
+            prompt += f"\n\nThe user seems {mood}. Spiritual resources for this {mood} response follow below. For sadness, use the deeper structure with story, prayer, and follow-up. For other emotions, provide 3-4 substantial sentences with biblical depth."
+        
+        metrics.set_gauge(f"prompt.gabe_ai.prefix_chars.{age_group}.{mood or 'neutral'}", len(prompt))
+        return prompt
+    
+    def _system_prefix(self, age_group, mood):
+        """The precompiled static prefix for this age group and mood"""
+        key = (age_group, mood or 'neutral')
+        if key not in self.compiled_prompts:
+            self.compiled_prompts[key] = self._compile_system_prompt(*key)
+        return self.compiled_prompts[key]
+    
+    def _build_conversation_context(self, user_message, user_name="", conversation_history=None, memory_context=None, mood=None, age_group='millennial', conversation_summary=None):
         """Build conversation context for AI providers with memory"""
         # Use original message without adding name context to avoid confusion
         current_message = user_message
         
-        # Enhanced system prompt with age-based personality and memory context
-        enhanced_prompt = self.base_system_prompt
+        # Static prefix first, then only the per-user details - keeps the provider prefix cache warm
+        prefix = self._system_prefix(age_group, mood)
+        dynamic_prompt = ""
         
-        # Add user name context and age-specific personality adjustments
+        # Add user name context
         if user_name:
-            enhanced_prompt += f"\n\nUSER NAME: The person you're talking with is {user_name}. Use their name naturally in conversation."
+            dynamic_prompt += f"\n\nUSER NAME: The person you're talking with is {user_name}. Use their name naturally in conversation."
         
-        if age_group in self.age_personalities:
-            personality = self.age_personalities[age_group]
-            enhanced_prompt += f"\n\nPERSONALITY FOR {age_group.upper().replace('_', ' ')}:\n"
-            enhanced_prompt += f"Tone: {personality['tone']}\n"
-            enhanced_prompt += f"Use analogies like: {personality['analogies']}\n"
-            enhanced_prompt += f"\nStay conversational and natural for this age group while providing medium-length messages (3-4 substantial sentences). ALWAYS weave in biblical wisdom naturally - not as formal quotes but as helpful life wisdom. Always offer to pray together, share a relevant Bible verse, or provide a relatable thought. End with a caring invitation to continue talking."
+        # Rolling summary of everything older than the raw history tail
+        if conversation_summary:
+            dynamic_prompt += f"\n\nEARLIER CONVERSATIONS (your notes from previous chats):\n{conversation_summary}\nLet these notes shape your care naturally - don't recite them."
         
         if memory_context and any(memory_context.values()):
             memory_info = "\n\nUser Memory Context:\n"
@@ -419,7 +494,7 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
                 if prayers:
                     memory_info += f"- Active prayer requests: {'; '.join(prayers)}\n"
             
-            enhanced_prompt += memory_info + "\nUse this context to give personalized, caring responses that reference their journey when appropriate."
+            dynamic_prompt += memory_info + "\nUse this context to give personalized, caring responses that reference their journey when appropriate."
         
         # Add Drop of Hope content based on mood - especially for deep emotions
         if mood and mood != 'neutral':
@@ -451,86 +526,51 @@ Crisis Response: 'You matter deeply to God and to me. Please reach out: 988 Suic
                 spiritual_content += f"Analogy option: {analogy['analogy']}\n"
             
             if spiritual_content:
-                enhanced_prompt += f"\n\nSpiritual Resources for {mood} response:{spiritual_content}\nFor sadness, use the deeper structure with story, prayer, and follow-up. For other emotions, provide 3-4 substantial sentences with biblical depth."
+                dynamic_prompt += f"\n\nSpiritual Resources for {mood} response:\n{spiritual_content}"
+        
+        metrics.observe('prompt.gabe_ai.dynamic_chars', len(dynamic_prompt))
         
         context = {
-            'system_prompt': enhanced_prompt,
+            'system_prompt': prefix + dynamic_prompt,
             'current_message': current_message,
-            'history': []
+            # Recent turns that fit the token budget, crisis turns left out
+            'history': self.history.pack(conversation_history)
         }
         
-        # Add conversation history for context
-        if conversation_history:
-            for exchange in conversation_history[-5:]:  # Last 5 exchanges for context
-                if not exchange.get('is_crisis') and exchange.get('user') and exchange.get('gabe'):  # Ensure keys exist
-                    context['history'].append({
-                        'user': exchange['user'],
-                        'assistant': exchange['gabe']
-                    })
-        
         return context
     
-    def _try_openai_response(self, context):
-        """Try to get response from OpenAI"""
-        if not self.openai_client:
-            return None
-            
-        try:
-            messages = [{"role": "system", "content": context['system_prompt']}]
-            
-            # Add conversation history
-            for exchange in context['history']:
-                if exchange.get('user') and exchange.get('assistant'):
-                    messages.append({"role": "user", "content": exchange['user']})
-                    messages.append({"role": "assistant", "content": exchange['assistant']})
-            
-            # Add current message
-            messages.append({"role": "user", "content": context['current_message']})
-            
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=messages,
-                max_tokens=250,
-                temperature=0.8
-            )
-            
-            logging.info("Response generated using OpenAI")
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logging.warning(f"OpenAI failed: {str(e)}")
-            return None
+    def _chat_spec(self, context, deadline=None):
+        """Gateway prompt spec for a chat turn"""
+        return {
+            'name': 'gabe_ai',
+            'deadline': deadline,
+            'operation': 'chat',
+            'providers': ['openai', 'gemini'],
+            'messages': chat_messages(context['system_prompt'], context['history'], context['current_message']),
+            'max_tokens': 250,
+            'temperature': 0.8,
+            # Gemini has always run with its own defaults here
+            'gemini': {'max_tokens': None, 'temperature': None}
+        }
     
-    def _try_gemini_response(self, context):
-        """Try to get response from Gemini"""
-        if not self.gemini_client:
-            return None
-            
-        try:
-            # Build prompt for Gemini
-            prompt = context['system_prompt'] + "\n\n"
-            
-            # Add conversation history
-            for exchange in context['history']:
-                if exchange.get('user') and exchange.get('assistant'):
-                    prompt += f"User: {exchange['user']}\nGABE: {exchange['assistant']}\n\n"
-            
-            # Add current message
-            prompt += f"User: {context['current_message']}\nGABE:"
-            
-            response = self.gemini_client.models.generate_content(
-                model=self.gemini_model,
-                contents=prompt
-            )
-            
-            logging.info("Response generated using Gemini")
-            return response.text or "I'm here with you, friend. Sometimes I need a moment to find the right words. 💙"
-            
-        except Exception as e:
-            logging.warning(f"Gemini failed: {str(e)}")
-            return None
+    def _single_prompt_spec(self, operation, prompt, max_tokens, temperature, deadline=None):
+        """Gateway prompt spec for a one-shot prompt under GABE's system prompt"""
+        return {
+            'name': 'gabe_ai',
+            'deadline': deadline,
+            'operation': operation,
+            'providers': ['openai', 'gemini'],
+            'messages': [
+                {"role": "system", "content": self.base_system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            'contents': self.base_system_prompt + "\n\n" + prompt,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'gemini': {'max_tokens': None, 'temperature': None}
+        }
 
-    def generate_prayer(self, prayer_request, user_name=""):
+    def generate_prayer(self, prayer_request, user_name="", age_range=None, deadline=None):
         """Generate a custom prayer based on user's request"""
         name_part = f" for {user_name}" if user_name else ""
         
@@ -547,13 +587,12 @@ Make it:
 Remember you're praying as their friend GABE, not as a formal religious leader.
 """
         
-        # Try OpenAI first
-        response = self._try_openai_prayer(prompt)
-        if response:
-            return response
-            
-        # Fallback to Gemini
-        response = self._try_gemini_prayer(prompt)
+        # OpenAI first, with Gemini hedged in if OpenAI is slow or failing
+        response = self.prayer_cache.get_or_generate(
+            prayer_request, self._map_age_range_to_group(age_range), user_name,
+            lambda: self.gateway.complete(self._single_prompt_spec('prayer', prompt, 200, 0.7, deadline)),
+            deadline=deadline
+        )
         if response:
             return response
             
@@ -561,50 +600,7 @@ Remember you're praying as their friend GABE, not as a formal religious leader.
         name_part = f" {user_name}," if user_name else ""
         return f"Father,{name_part} we come to you knowing you hear our hearts even when words are hard to find. Please meet us in this moment and guide our steps. In Jesus' name, Amen. 🙏"
     
-    def _try_openai_prayer(self, prompt):
-        """Try to generate prayer using OpenAI"""
-        if not self.openai_client:
-            return None
-            
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": self.base_system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            logging.info("Prayer generated using OpenAI")
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logging.warning(f"OpenAI prayer generation failed: {str(e)}")
-            return None
-    
-    def _try_gemini_prayer(self, prompt):
-        """Try to generate prayer using Gemini"""
-        if not self.gemini_client:
-            return None
-            
-        try:
-            full_prompt = self.base_system_prompt + "\n\n" + prompt
-            
-            response = self.gemini_client.models.generate_content(
-                model=self.gemini_model,
-                contents=full_prompt
-            )
-            
-            logging.info("Prayer generated using Gemini")
-            return response.text or "Father, we come to you with grateful hearts. Please guide and bless us in this moment. In Jesus' name, Amen. 🙏"
-            
-        except Exception as e:
-            logging.warning(f"Gemini prayer generation failed: {str(e)}")
-            return None
-
-    def explain_scripture(self, scripture, user_name=""):
+    def explain_scripture(self, scripture, user_name="", age_range=None, deadline=None):
         """Explain a Bible verse or passage in GABE's relatable style"""
         name_part = f" {user_name}," if user_name else ""
         
@@ -622,60 +618,14 @@ Make it:
 Break it down like you're explaining to a friend over coffee.
 """
         
-        # Try OpenAI first
-        response = self._try_openai_scripture(prompt)
-        if response:
-            return response
-            
-        # Fallback to Gemini
-        response = self._try_gemini_scripture(prompt)
+        # OpenAI first, with Gemini hedged in if OpenAI is slow or failing
+        response = self.scripture_cache.get_or_generate(
+            scripture, self._map_age_range_to_group(age_range), user_name,
+            lambda: self.gateway.complete(self._single_prompt_spec('scripture', prompt, 400, 0.8, deadline)),
+            deadline=deadline
+        )
         if response:
             return response
             
         # Both failed, return fallback
         return f"Hey{name_part} I'd love to dive into that verse with you, but I'm having some technical difficulties right now. Ask me again in a moment and we'll explore it together! 📖✨"
-    
-    def _try_openai_scripture(self, prompt):
-        """Try to explain scripture using OpenAI"""
-        if not self.openai_client:
-            return None
-            
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": self.base_system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=400,
-                temperature=0.8
-            )
-            
-            logging.info("Scripture explained using OpenAI")
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logging.warning(f"OpenAI scripture explanation failed: {str(e)}")
-            return None
-    
-    def _try_gemini_scripture(self, prompt):
-        """Try to explain scripture using Gemini"""
-        if not self.gemini_client:
-            return None
-            
-        try:
-            full_prompt = self.base_system_prompt + "\n\n" + prompt
-            
-            response = self.gemini_client.models.generate_content(
-                model=self.gemini_model,
-                contents=full_prompt
-            )
-            
-            logging.info("Scripture explained using Gemini")
-            return response.text or "That's a beautiful verse! Let me gather my thoughts and we can explore it together soon. 📖✨"
-            
-        except Exception as e:
-            logging.warning(f"Gemini scripture explanation failed: {str(e)}")
-            return None
-
-
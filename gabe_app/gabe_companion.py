@@ -2,11 +2,9 @@ import os
 import json
 import logging
 from datetime import datetime
-from openai import OpenAI
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+from llm_gateway import gateway, chat_messages
+from response_cache import ResponseCache
+from token_budget import HistoryManager
 
 class GabeCompanion:
     """
@@ -15,41 +13,20 @@ class GabeCompanion:
     """
     
     def __init__(self):
-        # Initialize Gemini as primary
-        self.gemini_client = None
-        self.openai_client = None
-        
-        gemini_key = os.environ.get("GEMINI_API_KEY")
-        if gemini_key and genai and hasattr(genai, 'configure'):
-            try:
-                genai.configure(api_key=gemini_key)
-                if hasattr(genai, 'GenerativeModel'):
-                    self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-                    self.gemini_client = True
-                    logging.info("Gemini client initialized successfully (PRIMARY)")
-                else:
-                    logging.warning("GenerativeModel not available in genai module")
-                    self.gemini_client = None
-            except Exception as e:
-                logging.warning(f"Failed to initialize Gemini: {e}")
-                self.gemini_client = None
-        else:
-            self.gemini_client = None
-        
-        # Initialize OpenAI as fallback
-        openai_key = os.environ.get("OPENAI_API_KEY")
-        if openai_key:
-            try:
-                self.openai_client = OpenAI(api_key=openai_key)
-                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                self.openai_model = "gpt-4o"
-                logging.info("OpenAI client initialized successfully (FALLBACK)")
-            except Exception as e:
-                logging.warning(f"Failed to initialize OpenAI: {e}")
-        
-        if not self.gemini_client and not self.openai_client:
+        # Gemini is primary and OpenAI the fallback, both through the shared gateway -
+        # OpenAI is hedged in when Gemini runs slow and takes over while its circuit is open
+        self.gateway = gateway
+        
+        if not self.gateway.available('gemini') and not self.gateway.available('openai'):
             logging.warning("No AI provider available - conversations will use fallback responses")
         
+        # Recent turns packed to a token budget rather than a fixed count
+        self.history = HistoryManager('gabe_companion')
+        
+        # Popular verses and prayer topics repeat a lot - serve them from cache
+        self.prayer_cache = ResponseCache('gabe_companion.prayer')
+        self.scripture_cache = ResponseCache('gabe_companion.scripture')
+        
         # Dynamic conversation memory
         self.conversation_memory = {}
         self.user_insights = {}
@@ -102,7 +79,7 @@ class GabeCompanion:
         ]
         return any(keyword in user_message.lower() for keyword in story_keywords)
     
-    def get_response(self, user_message, user_name=None, age_range=None, conversation_history=None, session_id=None):
+    def get_response(self, user_message, user_name=None, age_range=None, conversation_history=None, session_id=None, deadline=None):
         """
         Get a naturally conversational response that feels personal and intuitive
         """
@@ -146,28 +123,35 @@ class GabeCompanion:
             # Create naturally flowing conversation prompt
             system_prompt = self._create_natural_system_prompt(user_name, age_range, context)
             
-            # Prepare conversation for OpenAI
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-            
-            # Add recent conversation history for context
-            if conversation_history:
-                # Add last few exchanges for natural flow
-                for exchange in conversation_history[-3:]:
-                    if exchange.get('user'):
-                        messages.insert(-1, {"role": "user", "content": exchange['user']})
-                    if exchange.get('gabe'):
-                        messages.insert(-1, {"role": "assistant", "content": exchange['gabe']})
+            # Recent exchanges for natural flow, packed to the token budget
+            recent_history = self.history.pack(conversation_history)
             
-            # Try Gemini first, then fallback to OpenAI
-            ai_response = self._try_gemini_response(system_prompt, user_message, conversation_history)
-            if not ai_response:
-                ai_response = self._try_openai_response(messages)
+            # Prepare conversation for OpenAI
+            messages = chat_messages(system_prompt, recent_history, user_message)
+            
+            # Gemini first, with OpenAI hedged in if Gemini is slow or failing
+            ai_response = self.gateway.complete({
+                'name': 'gabe_companion',
+                'operation': 'chat',
+                'deadline': deadline,
+                'providers': ['gemini', 'openai'],
+                'models': {'gemini': 'gemini-1.5-flash'},
+                'messages': messages,
+                'temperature': 0.8,
+                'max_tokens': 500,
+                'presence_penalty': 0.1,
+                'frequency_penalty': 0.1,
+                'gemini': {
+                    'contents': self._build_gemini_prompt(system_prompt, user_message, recent_history, user_name),
+                    'max_tokens': 25,  # NUCLEAR short responses
+                    'temperature': 0.5,
+                    'top_p': 0.6,
+                    'postprocess': self._trim_gemini_reply
+                }
+            })
             
             if not ai_response:
-                # Fallback to a graceful spiritual response
+                # Fallback to a graceful spiritual response - also when the request ran out of time
                 ai_response = self._create_fallback_response(user_name, user_message)
             
             # Apply closure system for prayer requests (from JavaScript code)
@@ -341,92 +325,45 @@ COMMUNICATION STYLE: Engage in thoughtful, genuine dialogue. Share wisdom natura
         else:
             return 'neutral'
     
-    def _try_openai_response(self, messages):
-        """Try to get response from OpenAI"""
-        if not self.openai_client:
-            return None
-            
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=messages,
-                temperature=0.8,
-                max_tokens=500,
-                presence_penalty=0.1,
-                frequency_penalty=0.1
-            )
-            if response and response.choices and len(response.choices) > 0:
-                content = response.choices[0].message.content
-                return content.strip() if content else None
-            return None
-        except Exception as e:
-            logging.warning(f"OpenAI request failed: {e}")
-            return None
+    def _build_gemini_prompt(self, system_prompt, user_message, conversation_history, user_name):
+        """Build the single-prompt conversation Gemini gets as primary AI provider"""
+        # Build conversation context with the improved system prompt
+        full_prompt = f"{system_prompt}\n\n"
+        
+        if conversation_history:
+            full_prompt += "Recent conversation:\n"
+            for exchange in conversation_history:
+                full_prompt += f"User: {exchange['user']}\n"
+                full_prompt += f"GABE: {exchange['assistant']}\n"
+        
+        full_prompt += f"\nUser: {user_message}\n\nRespond as GABE in EXACTLY 1 sentence (max 15 words). If user asks for prayer, respond ONLY: 'Father, be with {user_name}. You see their heart. In Jesus name, Amen.'"
+        return full_prompt
     
-    def _try_gemini_response(self, system_prompt, user_message, conversation_history):
-        """Try to get response from Gemini as primary AI provider"""
-        if not self.gemini_client or not hasattr(self, 'gemini_model') or not self.gemini_model:
-            return None
-            
-        try:
-            # Build conversation context with the improved system prompt
-            full_prompt = f"{system_prompt}\n\n"
-            
-            if conversation_history:
-                full_prompt += "Recent conversation:\n"
-                for exchange in conversation_history[-3:]:
-                    if exchange.get('user'):
-                        full_prompt += f"User: {exchange['user']}\n"
-                    if exchange.get('gabe'):
-                        full_prompt += f"GABE: {exchange['gabe']}\n"
-            
-            full_prompt += f"\nUser: {user_message}\n\nRespond as GABE in EXACTLY 1 sentence (max 15 words). If user asks for prayer, respond ONLY: 'Father, be with {user_name}. You see their heart. In Jesus name, Amen.'"
-            
-            generation_config = None
-            if genai and hasattr(genai, 'types'):
-                generation_config = genai.types.GenerationConfig(
-                    max_output_tokens=25,  # NUCLEAR short responses
-                    temperature=0.5,
-                    top_p=0.6,
-                )
-            
-            response = self.gemini_model.generate_content(
-                full_prompt,
-                generation_config=generation_config
-            )
-            
-            if response and hasattr(response, 'text') and response.text:
-                response_text = response.text.strip()
-                
-                # Clean up any unwanted prefixes
-                if response_text.startswith("GABE:"):
-                    response_text = response_text[5:].strip()
-                
-                # ABSOLUTE SCORCHED EARTH: Replace ANY prayer content immediately
-                prayer_keywords = ['father', 'lord', 'jesus', 'heavenly', 'pray', 'lift up', '🙏', 'amen', 'god']
-                has_prayer_content = any(keyword in response_text.lower() for keyword in prayer_keywords)
-                
-                logging.info(f"Response length: {len(response_text)}, has prayer: {has_prayer_content}")
-                logging.info(f"Original response: {response_text[:150]}...")
-                
-                if has_prayer_content:
-                    logging.info("PRAYER DETECTED - REPLACING WITH SHORT VERSION")
-                    response_text = "Father, be with ray. You see their heart. In Jesus name, Amen."
-                elif len(response_text) > 50:
-                    logging.info("LONG RESPONSE DETECTED - CUTTING TO FIRST SENTENCE")
-                    # For non-prayers, cut to first sentence
-                    sentences = response_text.split('. ')
-                    response_text = sentences[0] + '.'
-                
-                logging.info(f"Final response: {response_text}")
-                
-                return response_text
-            else:
-                return None
-                
-        except Exception as e:
-            logging.warning(f"Gemini request failed: {e}")
-            return None
+    def _trim_gemini_reply(self, response_text):
+        """Keep Gemini's replies to one short sentence"""
+        # Clean up any unwanted prefixes
+        if response_text.startswith("GABE:"):
+            response_text = response_text[5:].strip()
+        
+        # ABSOLUTE SCORCHED EARTH: Replace ANY prayer content immediately
+        prayer_keywords = ['father', 'lord', 'jesus', 'heavenly', 'pray', 'lift up', '🙏', 'amen', 'god']
+        has_prayer_content = any(keyword in response_text.lower() for keyword in prayer_keywords)
+        
+        logging.info(f"Response length: {len(response_text)}, has prayer: {has_prayer_content}")
+        logging.info(f"Original response: {response_text[:150]}...")
+        
+        if has_prayer_content:
+            logging.info("PRAYER DETECTED - REPLACING WITH SHORT VERSION")
+            response_text = "Father, be with ray. You see their heart. In Jesus name, Amen."
+        elif len(response_text) > 50:
+            logging.info("LONG RESPONSE DETECTED - CUTTING TO FIRST SENTENCE")
+            # For non-prayers, cut to first sentence
+            sentences = response_text.split('. ')
+            response_text = sentences[0] + '.'
+        
+        logging.info(f"Final response: {response_text}")
+        
+        return response_text
     
     def _create_fallback_response(self, user_name, user_message):
         """Create a meaningful fallback response when APIs are unavailable"""
@@ -734,7 +671,7 @@ COMMUNICATION STYLE: Engage in thoughtful, genuine dialogue. Share wisdom natura
         selected_verse = verses.get(mood, verses['neutral'])
         return f"{selected_verse}\n\nGABE is always by your side — you are never alone."
     
-    def generate_prayer(self, prayer_request, user_name):
+    def generate_prayer(self, prayer_request, user_name, age_range=None, deadline=None):
         """Generate a personalized prayer for the user"""
         name = user_name or 'friend'
         
@@ -749,20 +686,22 @@ COMMUNICATION STYLE: Engage in thoughtful, genuine dialogue. Share wisdom natura
         - Is 3-4 sentences long
         """
         
-        # Try primary AI (Gemini) first
-        prayer = self._try_gemini_prayer(prayer_prompt)
-        if prayer:
-            return prayer
-        
-        # Try fallback AI (OpenAI)  
-        prayer = self._try_openai_prayer(prayer_prompt, name)
+        # Primary AI (Gemini) first, with OpenAI hedged in if Gemini is slow or failing
+        prayer = self.prayer_cache.get_or_generate(
+            prayer_request, age_range, user_name,
+            lambda: self.gateway.complete(self._single_prompt_spec(
+                'prayer', prayer_prompt,
+                "You are GABE, a loving spiritual companion who creates heartfelt prayers.", deadline
+            )),
+            deadline=deadline
+        )
         if prayer:
             return prayer
         
         # Ultimate fallback - biblical prayer
         return f"Heavenly Father, you see {name}'s heart and the burden they carry about {prayer_request}. Please grant them peace, wisdom, and strength. Let them feel your loving presence surrounding them right now. In Jesus' name, Amen."
     
-    def explain_scripture(self, scripture, user_name):
+    def explain_scripture(self, scripture, user_name, age_range=None, deadline=None):
         """Explain a Bible verse or passage"""
         name = user_name or 'friend'
         
@@ -775,13 +714,16 @@ COMMUNICATION STYLE: Engage in thoughtful, genuine dialogue. Share wisdom natura
         - Keep it warm and conversational (2-3 sentences)
         """
         
-        # Try primary AI (Gemini) first
-        explanation = self._try_gemini_scripture(explanation_prompt)
-        if explanation:
-            return explanation
-        
-        # Try fallback AI (OpenAI)
-        explanation = self._try_openai_scripture(explanation_prompt, name)  
+        # Primary AI (Gemini) first, with OpenAI hedged in if Gemini is slow or failing
+        explanation = self.scripture_cache.get_or_generate(
+            scripture, age_range, user_name,
+            lambda: self.gateway.complete(self._single_prompt_spec(
+                'scripture', explanation_prompt,
+                "You are GABE, a wise spiritual companion who explains Bible verses with warmth and practical application.",
+                deadline
+            )),
+            deadline=deadline
+        )
         if explanation:
             return explanation
         
@@ -809,72 +751,21 @@ COMMUNICATION STYLE: Engage in thoughtful, genuine dialogue. Share wisdom natura
             logging.error(f"Error retrieving journal entries: {e}")
             return []
     
-    def _try_gemini_prayer(self, prayer_prompt):
-        """Try to generate prayer using Gemini"""
-        if not self.gemini_client or not hasattr(self, 'gemini_model'):
-            return None
-        
-        try:
-            response = self.gemini_model.generate_content(prayer_prompt)
-            if response and hasattr(response, 'text') and response.text:
-                return response.text.strip()
-        except Exception as e:
-            logging.warning(f"Gemini prayer generation failed: {e}")
-        return None
-    
-    def _try_openai_prayer(self, prayer_prompt, name):
-        """Try to generate prayer using OpenAI"""
-        if not self.openai_client:
-            return None
-        
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": "You are GABE, a loving spiritual companion who creates heartfelt prayers."},
-                    {"role": "user", "content": prayer_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
-            if response and response.choices and len(response.choices) > 0:
-                content = response.choices[0].message.content
-                return content.strip() if content else None
-        except Exception as e:
-            logging.warning(f"OpenAI prayer generation failed: {e}")
-        return None
-    
-    def _try_gemini_scripture(self, explanation_prompt):
-        """Try to explain scripture using Gemini"""
-        if not self.gemini_client or not hasattr(self, 'gemini_model'):
-            return None
-        
-        try:
-            response = self.gemini_model.generate_content(explanation_prompt)
-            if response and hasattr(response, 'text') and response.text:
-                return response.text.strip()
-        except Exception as e:
-            logging.warning(f"Gemini scripture explanation failed: {e}")
-        return None
-    
-    def _try_openai_scripture(self, explanation_prompt, name):
-        """Try to explain scripture using OpenAI"""
-        if not self.openai_client:
-            return None
-        
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": "You are GABE, a wise spiritual companion who explains Bible verses with warmth and practical application."},
-                    {"role": "user", "content": explanation_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
-            if response and response.choices and len(response.choices) > 0:
-                content = response.choices[0].message.content
-                return content.strip() if content else None
-        except Exception as e:
-            logging.warning(f"OpenAI scripture explanation failed: {e}")
-        return None
+    def _single_prompt_spec(self, operation, prompt, openai_system_prompt, deadline=None):
+        """Gateway prompt spec for a one-shot prayer or scripture prompt"""
+        return {
+            'name': 'gabe_companion',
+            'deadline': deadline,
+            'operation': operation,
+            'providers': ['gemini', 'openai'],
+            'models': {'gemini': 'gemini-1.5-flash'},
+            'messages': [
+                {"role": "system", "content": openai_system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            'contents': prompt,
+            'temperature': 0.7,
+            'max_tokens': 200,
+            # Gemini has always run with its own defaults here
+            'gemini': {'max_tokens': None, 'temperature': None}
+        }
@@ -0,0 +1,141 @@
+"""
+Hedged provider calls for GABE
+Starts the fastest healthy AI provider, fires the other one once the first is slower than its
+usual p95, and returns whichever answer arrives first
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+from typing import Callable, Optional, Tuple
+
+from metrics import metrics
+from provider_health import CircuitOpenError, provider_health
+
+# Shared pool for provider calls - abandoned hedges keep a thread until the provider returns
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("GABE_HEDGE_MAX_WORKERS", "16")),
+    thread_name_prefix="gabe-hedge"
+)
+
+
+class HedgedDispatcher:
+    """Race a primary and a secondary provider call, hedging after a p95-based delay"""
+
+    def __init__(self, name: str, primary: Tuple[str, str], secondary: Tuple[str, str]):
+        self.name = name
+        # (provider, model) pairs - the primary is only a preference, health ranking decides
+        self.primary = primary
+        self.secondary = secondary
+
+        # A fixed delay overrides the adaptive one when set
+        fixed_delay_ms = os.environ.get("GABE_HEDGE_DELAY_MS")
+        self.fixed_delay = float(fixed_delay_ms) / 1000 if fixed_delay_ms else None
+        self.percentile = float(os.environ.get("GABE_HEDGE_PERCENTILE", "95"))
+        self.default_delay = float(os.environ.get("GABE_HEDGE_DEFAULT_DELAY_MS", "2000")) / 1000
+        self.min_delay = float(os.environ.get("GABE_HEDGE_MIN_DELAY_MS", "250")) / 1000
+        self.max_delay = float(os.environ.get("GABE_HEDGE_MAX_DELAY_MS", "8000")) / 1000
+        self.min_samples = int(os.environ.get("GABE_HEDGE_MIN_SAMPLES", "20"))
+
+    def _metric(self, operation: str, suffix: str) -> str:
+        return f"hedge.{self.name}.{operation}.{suffix}"
+
+    def hedge_delay(self, provider: str, operation: str = 'default') -> float:
+        """How long to give the first provider before firing the second"""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+
+        latency_key = self._metric(operation, f"{provider}_latency")
+        if metrics.sample_count(latency_key) < self.min_samples:
+            return self.default_delay
+
+        delay = metrics.percentile(latency_key, self.percentile)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def call(self, primary: Callable[[], Optional[str]], secondary: Callable[[], Optional[str]],
+             operation: str = 'default', deadline=None) -> Optional[str]:
+        """Return the first non-empty answer, or None when both providers fail or the deadline passes"""
+        calls = {self.primary: primary, self.secondary: secondary}
+        first, second = provider_health.rank([self.primary, self.secondary])
+        if first != self.primary:
+            metrics.increment(self._metric(operation, 'rerouted'))
+        primary = self._tracked(first, calls[first])
+        secondary = self._tracked(second, calls[second])
+
+        started = time.monotonic()
+        delay = self.hedge_delay(first[0], operation)
+        primary_future = _executor.submit(primary)
+        primary_future.add_done_callback(
+            lambda future: self._record_primary_latency(future, first[0], operation, started)
+        )
+
+        done, _ = wait([primary_future], timeout=deadline.timeout(cap=delay) if deadline else delay)
+        if done:
+            result = self._result(primary_future)
+            if result:
+                metrics.increment(self._metric(operation, 'primary_wins'))
+                return result
+
+            # Primary failed fast - plain fallback, no race needed
+            metrics.increment(self._metric(operation, 'fallbacks'))
+            result = self._result(_executor.submit(secondary), deadline)
+            if result:
+                metrics.increment(self._metric(operation, 'secondary_wins'))
+                return result
+            metrics.increment(self._metric(operation, 'both_failed'))
+            return None
+
+        if deadline and deadline.expired():
+            metrics.increment(self._metric(operation, 'deadline_exceeded'))
+            return None
+
+        # Primary is slower than usual - race it against the secondary
+        metrics.increment(self._metric(operation, 'hedges_fired'))
+        secondary_future = _executor.submit(secondary)
+        pending = {primary_future, secondary_future}
+
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining() if deadline else None,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                # Out of time - both calls finish in the background, bounded by their own timeouts
+                metrics.increment(self._metric(operation, 'deadline_exceeded'))
+                return None
+            for future in done:
+                result = self._result(future)
+                if not result:
+                    continue
+
+                if future is primary_future:
+                    metrics.increment(self._metric(operation, 'primary_wins'))
+                else:
+                    metrics.increment(self._metric(operation, 'hedge_wins'))
+
+                # Cancel the loser - a call already in flight just finishes in the background
+                for loser in pending:
+                    loser.cancel()
+                return result
+
+        metrics.increment(self._metric(operation, 'both_failed'))
+        return None
+
+    def _tracked(self, provider_key: Tuple[str, str], fn: Callable[[], Optional[str]]) -> Callable[[], Optional[str]]:
+        """Route a provider call through its circuit breaker"""
+        provider, model = provider_key
+        return lambda: provider_health.call(provider, model, fn)
+
+    def _record_primary_latency(self, future, provider: str, operation: str, started: float):
+        """Feed successful first-call latencies - including ones that lost a race - into the p95"""
+        if not future.cancelled() and future.exception() is None and future.result():
+            metrics.observe(self._metric(operation, f"{provider}_latency"), time.monotonic() - started)
+
+    def _result(self, future, deadline=None) -> Optional[str]:
+        """Unwrap a provider future; provider helpers already swallow their own errors"""
+        try:
+            return future.result(timeout=deadline.remaining() if deadline else None)
+        except (CircuitOpenError, FutureTimeoutError):
+            return None
+        except Exception as e:
+            logging.warning(f"Hedged call failed in {self.name}: {e}")
+            return None
@@ -0,0 +1,225 @@
+"""
+Chunked history deletion for GABE
+Clearing a conversation or deleting an account hides the history in one short transaction and
+queues a purge job; a background worker then deletes the rows in small primary-key ranges with
+a pause between chunks, so no single statement holds long locks or starves SQLite writers
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from metrics import metrics
+
+
+class HistoryPurger:
+    """Runs HistoryPurge jobs - hide now, delete in bounded batches later"""
+
+    def __init__(self, app, db, user_model, conversation_model, archive_model, summary_model, purge_model):
+        self.app = app
+        self.db = db
+        self.User = user_model
+        self.Conversation = conversation_model
+        self.ConversationArchive = archive_model
+        self.ConversationSummary = summary_model
+        self.HistoryPurge = purge_model
+
+        self.chunk_rows = int(os.environ.get("GABE_PURGE_CHUNK_ROWS", "500"))
+        # Gap between chunks in which other writers get the database lock
+        self.pause = float(os.environ.get("GABE_PURGE_PAUSE_MS", "50")) / 1000
+        self.poll_interval = float(os.environ.get("GABE_PURGE_POLL_SECONDS", "30"))
+        # A running job without progress for this long belongs to a dead worker and is taken over
+        self.stale_after = float(os.environ.get("GABE_PURGE_STALE_SECONDS", "300"))
+
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    # ------------------------------------------------------------------
+    # Request path - one short transaction, then return
+    # ------------------------------------------------------------------
+
+    def clear_history(self, user_id: int) -> Dict:
+        """Hide every turn the user has so far and queue their deletion; returns the job"""
+        through_id = self._newest_id(user_id)
+
+        # The summary restarts after the hidden turns, so chat history loads skip them straight away
+        record = self.ConversationSummary.query.filter_by(user_id=user_id).first()
+        if record is None:
+            record = self.ConversationSummary(user_id=user_id)
+            self.db.session.add(record)
+        record.summary = ''
+        record.summarized_through_id = max(record.summarized_through_id or 0, through_id)
+        record.message_count = 0
+
+        return self._queue(user_id, through_id, delete_user=False)
+
+    def delete_account(self, user_id: int, password: str) -> Optional[Dict]:
+        """Lock the account out now and queue deletion of everything it owns; returns the job
+
+        The current password must be given again - None, with nothing changed, when it doesn't match.
+        """
+        user = self.User.query.get(user_id)
+        if user is None or not password or not user.check_password(password):
+            metrics.increment('history_purge.delete_rejected')
+            return None
+        # Frees the username for a new registration; '!' is not a valid hash, so no password matches
+        user.username = f"deleted-{user_id}"
+        user.password_hash = '!'
+        user.name = ''
+        return self._queue(user_id, self._newest_id(user_id), delete_user=True)
+
+    def _newest_id(self, user_id: int) -> int:
+        Conversation = self.Conversation
+        return Conversation.query.with_entities(self.db.func.max(Conversation.id)).filter(
+            Conversation.user_id == user_id
+        ).scalar() or 0
+
+    def _queue(self, user_id: int, through_id: int, delete_user: bool) -> Dict:
+        try:
+            purge = self.HistoryPurge(user_id=user_id, through_id=through_id, delete_user=delete_user)
+            self.db.session.add(purge)
+            # Read the job before commit expires it - afterwards it would be reloaded
+            self.db.session.flush()
+            job = purge.to_dict()
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+        metrics.increment('history_purge.queued')
+        self._ensure_worker()
+        self._wake.set()
+        return job
+
+    def status(self, purge_id: int, user_id: int) -> Optional[Dict]:
+        """Progress of one of the user's jobs, or None"""
+        purge = self.HistoryPurge.query.filter_by(id=purge_id, user_id=user_id).first()
+        return purge.to_dict() if purge else None
+
+    def hidden_through(self, user_id: int) -> int:
+        """Highest Conversation.id still waiting to be purged - reads must skip ids up to it"""
+        HistoryPurge = self.HistoryPurge
+        return HistoryPurge.query.with_entities(self.db.func.max(HistoryPurge.through_id)).filter(
+            HistoryPurge.user_id == user_id,
+            HistoryPurge.status != 'done'
+        ).scalar() or 0
+
+    def resume(self):
+        """Start the worker if an earlier process left jobs unfinished"""
+        if self.HistoryPurge.query.filter(self.HistoryPurge.status != 'done').first():
+            self._ensure_worker()
+
+    # ------------------------------------------------------------------
+    # Background worker
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gabe-history-purge", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    while self.run_once():
+                        pass
+            except Exception as e:
+                logging.error(f"History purge worker error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def run_once(self) -> bool:
+        """Claim and finish one job; False when nothing was claimable"""
+        HistoryPurge = self.HistoryPurge
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        candidates = HistoryPurge.query.with_entities(HistoryPurge.id).filter(
+            HistoryPurge.status != 'done'
+        ).order_by(HistoryPurge.id.asc()).all()
+
+        for (purge_id,) in candidates:
+            # Conditional update, so only one worker process runs each job
+            claimed = HistoryPurge.query.filter(
+                HistoryPurge.id == purge_id,
+                (HistoryPurge.status == 'pending') | (HistoryPurge.updated_at < stale)
+            ).update({'status': 'running', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            self.db.session.commit()
+            if claimed:
+                self._purge(purge_id)
+                return True
+        return False
+
+    def _purge(self, purge_id: int):
+        HistoryPurge = self.HistoryPurge
+        purge = HistoryPurge.query.get(purge_id)
+        user_id, through_id, delete_user = purge.user_id, purge.through_id, purge.delete_user
+        started = time.monotonic()
+
+        Conversation, ConversationArchive = self.Conversation, self.ConversationArchive
+        # Turns saved after a clear stay; an account deletion takes everything
+        steps = [
+            (Conversation, [] if delete_user else [Conversation.id <= through_id]),
+            (ConversationArchive, [] if delete_user else [ConversationArchive.last_id <= through_id])
+        ]
+        try:
+            if purge.total is None:
+                purge.total = sum(
+                    model.query.filter(model.user_id == user_id, *conditions).count() for model, conditions in steps
+                )
+                self.db.session.commit()
+
+            for model, conditions in steps:
+                while self._delete_chunk(purge_id, model, user_id, conditions):
+                    time.sleep(self.pause)
+
+            if delete_user:
+                self.ConversationSummary.query.filter_by(user_id=user_id).delete()
+                self.User.query.filter_by(id=user_id).delete()
+            HistoryPurge.query.filter_by(id=purge_id).update(
+                {'status': 'done', 'updated_at': datetime.utcnow(), 'finished_at': datetime.utcnow()},
+                synchronize_session=False
+            )
+            self.db.session.commit()
+        except Exception as e:
+            # Left running with a stale heartbeat - another pass picks it up after stale_after
+            self.db.session.rollback()
+            HistoryPurge.query.filter_by(id=purge_id).update({'last_error': str(e)}, synchronize_session=False)
+            self.db.session.commit()
+            logging.error(f"History purge {purge_id} for user {user_id} failed, will retry: {e}")
+            metrics.increment('history_purge.failures')
+            return
+
+        metrics.increment('history_purge.completed')
+        metrics.observe('history_purge.seconds', time.monotonic() - started)
+        logging.info(f"History purge {purge_id} for user {user_id} finished")
+
+    def _delete_chunk(self, purge_id: int, model, user_id: int, conditions) -> int:
+        """Delete the next primary-key range of up to chunk_rows rows in its own transaction"""
+        ids = model.query.with_entities(model.id).filter(
+            model.user_id == user_id, *conditions
+        ).order_by(model.id.asc()).limit(self.chunk_rows).all()
+        if not ids:
+            return 0
+
+        deleted = model.query.filter(
+            model.user_id == user_id,
+            model.id >= ids[0][0],
+            model.id <= ids[-1][0],
+            *conditions
+        ).delete(synchronize_session=False)
+        # Progress and the heartbeat commit with the chunk
+        self.HistoryPurge.query.filter_by(id=purge_id).update(
+            {'deleted': self.HistoryPurge.deleted + deleted, 'updated_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        self.db.session.commit()
+        metrics.increment('history_purge.rows', deleted)
+        return deleted
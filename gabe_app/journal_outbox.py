@@ -0,0 +1,224 @@
+"""
+Durable journal outbox for GABE
+Journal entries are committed to a local SQLite file on the request path and a background syncer
+drains them to Firestore in batches, retrying with exponential backoff - a save never waits on
+the network and is never lost when Firebase is down
+"""
+
+import os
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from metrics import metrics
+
+
+class JournalOutbox:
+    """SQLite queue of journal entries that haven't reached Firestore yet
+
+    Every entry carries its own ID, used as the Firestore document ID, so a retried batch
+    overwrites rather than duplicates. Workers sharing the file claim rows before sending them.
+    """
+
+    def __init__(self, path: str, client: Callable[[], Optional[object]]):
+        self.path = path
+        self.client = client
+        self.batch_size = min(500, int(os.environ.get("GABE_JOURNAL_SYNC_BATCH_SIZE", "100")))
+        self.sync_interval = float(os.environ.get("GABE_JOURNAL_SYNC_INTERVAL_SECONDS", "1"))
+        self.backoff_base = float(os.environ.get("GABE_JOURNAL_SYNC_BACKOFF_SECONDS", "2"))
+        self.backoff_max = float(os.environ.get("GABE_JOURNAL_SYNC_BACKOFF_MAX_SECONDS", "300"))
+        # How long a worker may hold claimed rows before another worker retries them
+        self.claim_seconds = float(os.environ.get("GABE_JOURNAL_SYNC_CLAIM_SECONDS", "60"))
+        # Synced rows are kept a while for debugging, then pruned
+        self.retention = float(os.environ.get("GABE_JOURNAL_OUTBOX_RETENTION_SECONDS", "86400"))
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = None
+        self._worker = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                # Another worker is switching the file to WAL at the same moment
+                pass
+            # Durable across a process crash; WAL keeps commits cheap
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal_outbox ("
+                " entry_id TEXT PRIMARY KEY,"
+                " user_id TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " mood TEXT,"
+                " created_at REAL NOT NULL,"
+                " synced_at REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL DEFAULT 0,"
+                " last_error TEXT)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS journal_outbox_user ON journal_outbox (user_id, synced_at, created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS journal_outbox_due ON journal_outbox (synced_at, next_attempt_at)"
+            )
+            conn.execute("COMMIT")
+            self._conn = conn
+        return self._conn
+
+    # ------------------------------------------------------------------
+    # Request path
+    # ------------------------------------------------------------------
+
+    def add(self, user_id: str, content: str, mood: Optional[str] = None) -> Dict:
+        """Commit an entry locally and wake the syncer; returns the entry as reads will show it"""
+        entry_id = uuid.uuid4().hex
+        created_at = time.time()
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO journal_outbox (entry_id, user_id, content, mood, created_at) VALUES (?, ?, ?, ?, ?)",
+                (entry_id, user_id, content, mood, created_at)
+            )
+        metrics.increment('journal_outbox.added')
+
+        self._ensure_worker()
+        self._wake.set()
+        return self._entry(entry_id, content, mood, created_at)
+
+    def pending_for(self, user_id: str, limit: int, before: Optional[datetime] = None) -> List[Dict]:
+        """The user's entries that haven't been synced yet, newest first - only those no later than `before` if given"""
+        # Entry timestamps are rounded to the microsecond, the stored floats are not
+        upper = before.timestamp() + 1e-6 if before else float('inf')
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT entry_id, content, mood, created_at FROM journal_outbox"
+                " WHERE user_id = ? AND synced_at IS NULL AND created_at < ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, upper, limit)
+            ).fetchall()
+        if rows:
+            # Left over from an earlier process - make sure someone is sending them
+            self._ensure_worker()
+        return [self._entry(*row) for row in rows]
+
+    def backlog(self) -> int:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM journal_outbox WHERE synced_at IS NULL"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _entry(entry_id: str, content: str, mood: Optional[str], created_at: float) -> Dict:
+        timestamp = datetime.fromtimestamp(created_at, timezone.utc)
+        return {
+            'id': entry_id,
+            'content': content,
+            'mood': mood,
+            'timestamp': timestamp,
+            'date': timestamp.strftime('%Y-%m-%d')
+        }
+
+    # ------------------------------------------------------------------
+    # Background syncer
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gabe-journal-sync", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            try:
+                # Keep draining while full batches are going through
+                while self.sync_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                logging.error(f"Journal outbox sync error: {e}")
+
+    def sync_once(self) -> int:
+        """Send one batch of due entries to Firestore; returns how many were synced"""
+        db = self.client()
+        if db is None:
+            return 0
+
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        try:
+            batch = db.batch()
+            for entry_id, user_id, content, mood, created_at, _ in rows:
+                data = self._entry(entry_id, content, mood, created_at)
+                del data['id']
+                ref = db.collection('users').document(user_id).collection('journal').document(entry_id)
+                batch.set(ref, data)
+            batch.commit()
+        except Exception as e:
+            self._retry_later(rows, str(e))
+            logging.warning(f"Journal sync of {len(rows)} entries failed, will retry: {e}")
+            metrics.increment('journal_outbox.failures')
+            return 0
+
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE journal_outbox SET synced_at = ?, last_error = NULL WHERE entry_id = ?",
+                [(now, row[0]) for row in rows]
+            )
+            conn.execute("DELETE FROM journal_outbox WHERE synced_at < ?", (now - self.retention,))
+
+        metrics.increment('journal_outbox.synced', len(rows))
+        metrics.observe('journal_outbox.sync_lag', now - min(row[4] for row in rows))
+        return len(rows)
+
+    def _claim(self) -> List[tuple]:
+        """Due rows, pushed out by the claim window so other workers leave them alone"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT entry_id, user_id, content, mood, created_at, attempts FROM journal_outbox"
+                    " WHERE synced_at IS NULL AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                    (now, self.batch_size)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE journal_outbox SET next_attempt_at = ? WHERE entry_id = ?",
+                    [(now + self.claim_seconds, row[0]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _retry_later(self, rows: List[tuple], error: str):
+        now = time.time()
+        updates = []
+        for row in rows:
+            attempts = row[5] + 1
+            # Exponential backoff with jitter so workers don't retry in lockstep
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            updates.append((attempts, now + delay, error[:500], row[0]))
+        with self._lock:
+            self._connection().executemany(
+                "UPDATE journal_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE entry_id = ?",
+                updates
+            )
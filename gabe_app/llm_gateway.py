@@ -0,0 +1,377 @@
+"""
+LLM Gateway - the single way GABE talks to OpenAI and Gemini
+Owns one pooled, keep-alive client per provider per worker process and turns a prompt spec
+into a completion with timeouts, retries, model selection, hedging and circuit breaking
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+from openai import OpenAI
+from google import genai
+from google.genai import types
+
+from hedging import HedgedDispatcher
+from metrics import metrics
+from provider_health import CircuitOpenError, provider_health
+from single_flight import SingleFlight
+from stub_llm import create_stub_client, stub_enabled
+from token_budget import count_message_tokens, count_tokens
+
+# the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+# Note that the newest Gemini model series is "gemini-2.5-flash" or "gemini-2.5-pro"
+DEFAULT_MODELS = {
+    'openai': os.environ.get("GABE_OPENAI_MODEL", "gpt-4o"),
+    'gemini': os.environ.get("GABE_GEMINI_MODEL", "gemini-2.5-flash")
+}
+
+API_KEY_VARS = {
+    'openai': "OPENAI_API_KEY",
+    'gemini': "GEMINI_API_KEY"
+}
+
+
+class LLMGateway:
+    """Shared provider clients plus the complete()/stream() entry points
+
+    A prompt spec is a plain dict:
+        messages     - OpenAI-style chat messages (system/user/assistant)
+        contents     - optional Gemini prompt; rendered from messages when missing
+        providers    - provider preference order, e.g. ['openai', 'gemini']
+        models       - optional {provider: model} overrides
+        max_tokens, temperature, top_p, presence_penalty, frequency_penalty
+        json         - ask for a JSON response
+        timeout      - seconds per attempt
+        deadline     - optional request Deadline; attempts never outlive it
+        retries      - extra attempts per provider after an error
+        name, operation - labels for hedging metrics
+        postprocess  - optional callable applied to the returned text
+        openai / gemini - optional dicts overriding any of the above for that provider only
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._client_pid = None
+        self._dispatchers = {}
+        # Identical prompts already in flight share one upstream call
+        self.flights = SingleFlight('gateway')
+
+        self.default_timeout = float(os.environ.get("GABE_LLM_TIMEOUT_SECONDS", "20"))
+        self.default_retries = int(os.environ.get("GABE_LLM_RETRIES", "1"))
+        self.pool_size = int(os.environ.get("GABE_LLM_POOL_SIZE", "20"))
+
+    # ------------------------------------------------------------------
+    # Clients
+    # ------------------------------------------------------------------
+
+    def available(self, provider: str) -> bool:
+        """Whether this provider is configured at all"""
+        return self._client(provider) is not None
+
+    def _client(self, provider: str):
+        """The worker's shared client for a provider, created on first use"""
+        with self._lock:
+            # Clients (and their sockets) must not be shared across forked workers
+            if self._client_pid != os.getpid():
+                self._clients = {}
+                self._client_pid = os.getpid()
+
+            if provider not in self._clients:
+                self._clients[provider] = self._create_client(provider)
+            return self._clients[provider]
+
+    def _create_client(self, provider: str):
+        # Offline runs and load tests talk to a local stub instead - no keys, no quota
+        if stub_enabled():
+            logging.info(f"LLM gateway using local stub {provider} client")
+            return create_stub_client(provider)
+
+        api_key = os.environ.get(API_KEY_VARS.get(provider, ''))
+        if not api_key:
+            return None
+
+        try:
+            if provider == 'openai':
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                        keepalive_expiry=60
+                    ),
+                    timeout=self.default_timeout
+                )
+                # Retries are handled here so both providers behave the same way
+                client = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+            elif provider == 'gemini':
+                client = genai.Client(
+                    api_key=api_key,
+                    http_options=types.HttpOptions(timeout=max(1, int(self.default_timeout * 1000)))
+                )
+            else:
+                return None
+
+            logging.info(f"LLM gateway created pooled {provider} client")
+            return client
+
+        except Exception as e:
+            logging.warning(f"Failed to initialize {provider}: {e}")
+            return None
+
+    def model_for(self, provider: str, prompt_spec: Dict) -> str:
+        return (prompt_spec.get('models') or {}).get(provider) or DEFAULT_MODELS[provider]
+
+    # ------------------------------------------------------------------
+    # Completions
+    # ------------------------------------------------------------------
+
+    def complete(self, prompt_spec: Dict) -> Optional[str]:
+        """Complete a prompt with the best available provider; None when every provider fails or time runs out"""
+        deadline = prompt_spec.get('deadline')
+        if self._out_of_time(prompt_spec, 'complete'):
+            return None
+        self._record_prompt_tokens(prompt_spec)
+        return self.flights.do(
+            self.spec_key(prompt_spec), lambda: self._complete(prompt_spec),
+            timeout=deadline.remaining() if deadline else None
+        )
+
+    def spec_key(self, prompt_spec: Dict) -> str:
+        """Stable hash of everything that shapes the answer - the same in every worker"""
+        raw = json.dumps(
+            prompt_spec, sort_keys=True,
+            default=lambda value: getattr(value, '__qualname__', type(value).__name__)
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _complete(self, prompt_spec: Dict) -> Optional[str]:
+        providers = [p for p in prompt_spec.get('providers', ['openai', 'gemini']) if self.available(p)]
+        if not providers:
+            return None
+
+        if len(providers) == 1:
+            provider = providers[0]
+            try:
+                return provider_health.call(
+                    provider, self.model_for(provider, prompt_spec),
+                    lambda: self.complete_with(provider, prompt_spec)
+                )
+            except CircuitOpenError:
+                return None
+
+        primary, secondary = providers[:2]
+        dispatcher = self._dispatcher(prompt_spec, primary, secondary)
+        return dispatcher.call(
+            lambda: self.complete_with(primary, prompt_spec),
+            lambda: self.complete_with(secondary, prompt_spec),
+            operation=prompt_spec.get('operation', 'default'),
+            deadline=prompt_spec.get('deadline')
+        )
+
+    def complete_with(self, provider: str, prompt_spec: Dict) -> Optional[str]:
+        """Complete a prompt with one specific provider, retrying errors; None on failure"""
+        client = self._client(provider)
+        if not client:
+            return None
+
+        options = self._options(provider, prompt_spec)
+        retries = options.get('retries', self.default_retries)
+        for attempt in range(retries + 1):
+            if self._out_of_time(options, provider):
+                return None
+            options['timeout'] = self._attempt_timeout(options)
+            try:
+                if provider == 'openai':
+                    text = self._openai_complete(client, options)
+                else:
+                    text = self._gemini_complete(client, options)
+
+                if text and options.get('postprocess'):
+                    text = options['postprocess'](text)
+                return text
+
+            except Exception as e:
+                logging.warning(f"{provider} request failed (attempt {attempt + 1}/{retries + 1}): {e}")
+                backoff = 0.2 * (2 ** attempt)
+                deadline = options.get('deadline')
+                if attempt < retries and (deadline is None or deadline.remaining() > backoff):
+                    time.sleep(backoff)
+        return None
+
+    def stream(self, prompt_spec: Dict) -> Iterator[str]:
+        """Yield text chunks from the healthiest provider, falling back only before anything was sent"""
+        self._record_prompt_tokens(prompt_spec)
+        providers = [p for p in prompt_spec.get('providers', ['openai', 'gemini']) if self.available(p)]
+        candidates = [(p, self.model_for(p, prompt_spec)) for p in providers]
+
+        for provider, model in provider_health.rank(candidates):
+            if self._out_of_time(prompt_spec, 'stream'):
+                return
+            if not provider_health.allow(provider, model):
+                continue
+
+            started = time.monotonic()
+            produced = False
+            try:
+                client = self._client(provider)
+                options = self._options(provider, prompt_spec)
+                options['timeout'] = self._attempt_timeout(options)
+                if provider == 'openai':
+                    chunks = self._openai_stream(client, options)
+                else:
+                    chunks = self._gemini_stream(client, options)
+
+                for chunk in chunks:
+                    if not produced:
+                        # Time to first token is what the user feels
+                        provider_health.record(provider, model, True, time.monotonic() - started)
+                        produced = True
+                    yield chunk
+
+            except Exception as e:
+                logging.warning(f"{provider} streaming failed: {e}")
+
+            if produced:
+                logging.info(f"Response streamed using {provider}")
+                return
+            provider_health.record(provider, model, False, time.monotonic() - started)
+
+    def _attempt_timeout(self, options: Dict) -> float:
+        """Per-attempt timeout, trimmed to whatever the request deadline has left"""
+        timeout = options.get('timeout') or self.default_timeout
+        deadline = options.get('deadline')
+        return deadline.timeout(cap=timeout) if deadline else timeout
+
+    def _out_of_time(self, prompt_spec: Dict, stage: str) -> bool:
+        deadline = prompt_spec.get('deadline')
+        if deadline is None or not deadline.expired():
+            return False
+        metrics.increment(f"deadline.{deadline.name}.exceeded.{stage}")
+        return True
+
+    def _record_prompt_tokens(self, prompt_spec: Dict):
+        """Prompt size per request, counted locally on the chat messages (or the Gemini prompt)"""
+        if prompt_spec.get('messages'):
+            tokens = count_message_tokens(prompt_spec['messages'])
+        else:
+            tokens = count_tokens(prompt_spec.get('contents'))
+        metrics.observe(
+            f"prompt.{prompt_spec.get('name', 'gateway')}.{prompt_spec.get('operation', 'default')}.tokens", tokens
+        )
+
+    def _options(self, provider: str, prompt_spec: Dict) -> Dict:
+        """The prompt spec with this provider's overrides applied"""
+        options = dict(prompt_spec)
+        options.update(prompt_spec.get(provider) or {})
+        return options
+
+    def _dispatcher(self, prompt_spec: Dict, primary: str, secondary: str) -> HedgedDispatcher:
+        key = (
+            prompt_spec.get('name', 'gateway'),
+            primary, self.model_for(primary, prompt_spec),
+            secondary, self.model_for(secondary, prompt_spec)
+        )
+        with self._lock:
+            if key not in self._dispatchers:
+                self._dispatchers[key] = HedgedDispatcher(key[0], (key[1], key[2]), (key[3], key[4]))
+            return self._dispatchers[key]
+
+    # ------------------------------------------------------------------
+    # Provider specifics
+    # ------------------------------------------------------------------
+
+    def _openai_kwargs(self, prompt_spec: Dict) -> Dict:
+        kwargs = {
+            'model': self.model_for('openai', prompt_spec),
+            'messages': prompt_spec['messages'],
+            'timeout': prompt_spec.get('timeout', self.default_timeout)
+        }
+        for option in ('max_tokens', 'temperature', 'top_p', 'presence_penalty', 'frequency_penalty'):
+            if prompt_spec.get(option) is not None:
+                kwargs[option] = prompt_spec[option]
+        if prompt_spec.get('json'):
+            kwargs['response_format'] = {'type': 'json_object'}
+        return kwargs
+
+    def _openai_complete(self, client, prompt_spec: Dict) -> Optional[str]:
+        response = client.chat.completions.create(**self._openai_kwargs(prompt_spec))
+        if response and response.choices:
+            content = response.choices[0].message.content
+            return content.strip() if content else None
+        return None
+
+    def _openai_stream(self, client, prompt_spec: Dict) -> Iterator[str]:
+        stream = client.chat.completions.create(stream=True, **self._openai_kwargs(prompt_spec))
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _gemini_contents(self, prompt_spec: Dict) -> str:
+        """Gemini takes one prompt - render the chat messages as a transcript unless given one"""
+        if prompt_spec.get('contents'):
+            return prompt_spec['contents']
+
+        prompt = ""
+        for message in prompt_spec.get('messages', []):
+            if message['role'] == 'system':
+                prompt += message['content'] + "\n\n"
+            elif message['role'] == 'user':
+                prompt += f"User: {message['content']}\n"
+            else:
+                prompt += f"GABE: {message['content']}\n\n"
+        return prompt + "GABE:"
+
+    def _gemini_config(self, prompt_spec: Dict):
+        # google-genai reads a 0 ms timeout as no timeout at all, so a deadline with under a
+        # millisecond left still gets the shortest real one
+        timeout_ms = max(1, int(prompt_spec.get('timeout', self.default_timeout) * 1000))
+        options = {
+            'http_options': types.HttpOptions(timeout=timeout_ms)
+        }
+        if prompt_spec.get('max_tokens') is not None:
+            options['max_output_tokens'] = prompt_spec['max_tokens']
+        for option in ('temperature', 'top_p'):
+            if prompt_spec.get(option) is not None:
+                options[option] = prompt_spec[option]
+        if prompt_spec.get('json'):
+            options['response_mime_type'] = "application/json"
+        return types.GenerateContentConfig(**options)
+
+    def _gemini_complete(self, client, prompt_spec: Dict) -> Optional[str]:
+        response = client.models.generate_content(
+            model=self.model_for('gemini', prompt_spec),
+            contents=self._gemini_contents(prompt_spec),
+            config=self._gemini_config(prompt_spec)
+        )
+        return response.text.strip() if response and response.text else None
+
+    def _gemini_stream(self, client, prompt_spec: Dict) -> Iterator[str]:
+        stream = client.models.generate_content_stream(
+            model=self.model_for('gemini', prompt_spec),
+            contents=self._gemini_contents(prompt_spec),
+            config=self._gemini_config(prompt_spec)
+        )
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+def chat_messages(system_prompt: str, history: List[Dict], message: str) -> List[Dict]:
+    """Build OpenAI-style messages from a system prompt, user/assistant history pairs and the new message"""
+    messages = [{"role": "system", "content": system_prompt}]
+    for exchange in history:
+        if exchange.get('user') and exchange.get('assistant'):
+            messages.append({"role": "user", "content": exchange['user']})
+            messages.append({"role": "assistant", "content": exchange['assistant']})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+# One gateway - and therefore one connection pool per provider - per worker
+gateway = LLMGateway()
@@ -0,0 +1,76 @@
+"""
+Lightweight in-process metrics for GABE
+Counters, gauges and latency samples kept per worker and exposed through /api/metrics
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+
+class Metrics:
+    """Thread-safe counters, gauges and bounded latency samples"""
+
+    def __init__(self, max_samples: int = 1000):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def increment(self, name: str, value: int = 1):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value):
+        """Record the current value of something that goes up and down"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record a sample (usually a latency in seconds)"""
+        with self._lock:
+            self._samples[name].append(value)
+
+    def count(self, name: str) -> int:
+        """Current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def sample_count(self, name: str) -> int:
+        """How many samples are currently held for a series"""
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        """Percentile over the retained samples, None when there are none"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict:
+        """Everything recorded so far, ready for jsonify"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            series = {name: sorted(samples) for name, samples in self._samples.items()}
+
+        timings = {}
+        for name, samples in series.items():
+            if not samples:
+                continue
+            timings[name] = {
+                'count': len(samples),
+                'p50': samples[int(0.50 * (len(samples) - 1))],
+                'p95': samples[int(0.95 * (len(samples) - 1))],
+                'p99': samples[int(0.99 * (len(samples) - 1))]
+            }
+
+        return {'counters': counters, 'gauges': gauges, 'timings': timings}
+
+
+# Global metrics registry for this worker
+metrics = Metrics()
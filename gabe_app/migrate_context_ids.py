@@ -0,0 +1,20 @@
+"""
+One-time migration: conversation contexts keyed by topic hash
+Merges duplicate Firestore context docs for the same topic into one doc per normalized topic
+Run from gabe_app/: python migrate_context_ids.py [--dry-run]
+"""
+
+import sys
+
+from background_loop import background_loop
+from firebase_service import FirebaseService
+
+if __name__ == '__main__':
+    firebase = FirebaseService()
+    if not firebase.is_connected():
+        print("❌ Firebase is not configured.")
+        sys.exit(1)
+
+    dry_run = '--dry-run' in sys.argv
+    stats = background_loop.run(firebase.migrate_conversation_contexts(dry_run=dry_run))
+    print(f"✅ Contexts migrated{' (dry run)' if dry_run else ''}: {stats}")
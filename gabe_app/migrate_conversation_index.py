@@ -0,0 +1,40 @@
+"""
+Migration: composite (user_id, timestamp) index on conversations
+db.create_all() only adds the index to new databases; this adds it to existing ones
+Run from gabe_app/ with the same DATABASE_URL as the app: python migrate_conversation_index.py
+"""
+
+import os
+
+from sqlalchemy import create_engine, text
+
+INDEX_NAME = 'ix_conversations_user_id_timestamp'
+INDEX_COLUMNS = '(user_id, timestamp)'
+
+
+def database_url() -> str:
+    """Same resolution as app.py"""
+    url = os.environ.get("DATABASE_URL")
+    if not url or "neon.tech" in url:
+        url = "sqlite:///gabe_test.db"
+    return url
+
+
+def upgrade(engine):
+    if engine.dialect.name == 'postgresql':
+        # Build without blocking chat writes; CONCURRENTLY can't run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON conversations {INDEX_COLUMNS}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON conversations {INDEX_COLUMNS}"))
+
+
+def downgrade(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+
+
+if __name__ == '__main__':
+    upgrade(create_engine(database_url()))
+    print(f"✅ Index {INDEX_NAME} is in place.")
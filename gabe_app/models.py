@@ -15,6 +15,8 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
+    conversation_summary = db.relationship('ConversationSummary', backref='user', uselist=False, cascade='all, delete-orphan')
+    conversation_archives = db.relationship('ConversationArchive', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -28,6 +30,8 @@ class User(UserMixin, db.Model):
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    # Every chat turn reads a user's newest rows - see migrate_conversation_index.py for existing databases
+    __table_args__ = (db.Index('ix_conversations_user_id_timestamp', 'user_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     user_message = db.Column(db.Text, nullable=False)
@@ -47,3 +51,78 @@ class Conversation(db.Model):
             'is_prayer': self.is_prayer,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
+
+    @classmethod
+    def recent_turns(cls, user_id, after_id=0, limit=10):
+        """A user's newest turns after `after_id`, oldest first, as plain dicts
+
+        Only the columns the prompt uses are loaded, straight into row tuples - no ORM objects.
+        """
+        rows = cls.query.with_entities(
+            cls.id, cls.user_message, cls.gabe_response, cls.is_crisis
+        ).filter(
+            cls.user_id == user_id,
+            cls.id > after_id
+        ).order_by(cls.timestamp.desc()).limit(limit).all()
+        return [row._asdict() for row in reversed(rows)]
+
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True, index=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    # Highest Conversation.id already folded into the summary
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'summary': self.summary,
+            'summarized_through_id': self.summarized_through_id,
+            'message_count': self.message_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Old conversation turns, one compressed block per user per day - see conversation_archive.py
+class ConversationArchive(db.Model):
+    __tablename__ = 'conversation_archives'
+    __table_args__ = (db.Index('ix_conversation_archives_user_id_day', 'user_id', 'day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    # Range of Conversation.id values the block holds
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    turn_count = db.Column(db.Integer, nullable=False)
+    codec = db.Column(db.String(8), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Background deletion of a user's history (or whole account) in small chunks - see history_purge.py
+class HistoryPurge(db.Model):
+    __tablename__ = 'history_purges'
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key - the job outlives the user row when the account itself is deleted
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    # Highest Conversation.id hidden by the request; later turns are kept
+    through_id = db.Column(db.Integer, nullable=False, default=0)
+    delete_user = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    total = db.Column(db.Integer)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': round(self.deleted / self.total, 4) if self.total else (1.0 if self.status == 'done' else 0.0),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,43 @@
+"""
+Stage timing for GABE request pipelines
+Each request records how long every stage took and which stage answered it, so per-path latency
+(crisis, prayer, template, model) shows up in /api/metrics and in the Server-Timing header
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict
+
+from metrics import metrics
+
+
+class StageTimer:
+    """Wall-clock time per named stage of one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+            metrics.observe(f"pipeline.{self.name}.stage.{stage}", elapsed)
+
+    def finish(self, path: str) -> float:
+        """Record which path answered the request and its total time"""
+        total = time.monotonic() - self.started
+        metrics.increment(f"pipeline.{self.name}.path.{path}")
+        metrics.observe(f"pipeline.{self.name}.total.{path}", total)
+        logging.debug(f"{self.name} answered by {path} in {total * 1000:.1f}ms: {self.server_timing()}")
+        return total
+
+    def server_timing(self) -> str:
+        """Stage durations as a Server-Timing header value"""
+        return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in self.stages.items())
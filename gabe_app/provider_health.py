@@ -0,0 +1,177 @@
+"""
+Provider health tracking for GABE
+Keeps an EWMA of latency and error rate per AI provider/model, trips a circuit breaker after
+consecutive failures, and ranks providers so new calls go to the fastest healthy one
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class ProviderHealth:
+    """Health and circuit state for a single provider/model pair"""
+
+    def __init__(self, provider: str, model: str, alpha: float, failure_threshold: int, cooldown: float):
+        self.provider = provider
+        self.model = model
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.state = CLOSED
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.calls = 0
+
+    def allow_request(self) -> bool:
+        """Closed circuits always allow; open ones allow a single probe once the cooldown passed"""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+
+        return False
+
+    def probe_ready(self) -> bool:
+        """An open circuit whose cooldown has passed may send a half-open probe"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return self.state == HALF_OPEN and not self.probe_in_flight
+
+    def record(self, success: bool, latency: float):
+        """Fold one call outcome into the averages and update the circuit"""
+        self.calls += 1
+        self.ewma_error_rate = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * self.ewma_error_rate
+        if success:
+            # Failure latency is mostly timeouts, it says nothing about how fast answers come back
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+
+            if self.state != CLOSED:
+                logging.info(f"Circuit closed for {self.provider}/{self.model}")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            return
+
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logging.warning(f"Circuit opened for {self.provider}/{self.model} after {self.consecutive_failures} failures")
+                metrics.increment(f"provider.{self.provider}.{self.model}.circuit_opened")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def score(self) -> Optional[float]:
+        """Expected cost of a call - lower is better, None until we have a latency sample"""
+        if self.ewma_latency is None:
+            return None
+        return self.ewma_latency * (1 + 2 * self.ewma_error_rate)
+
+    def to_dict(self) -> Dict:
+        return {
+            'state': self.state,
+            'ewma_latency': self.ewma_latency,
+            'ewma_error_rate': round(self.ewma_error_rate, 4),
+            'consecutive_failures': self.consecutive_failures,
+            'calls': self.calls
+        }
+
+
+class ProviderHealthRegistry:
+    """Shared health view over every provider/model the app talks to"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers = {}
+        self.alpha = float(os.environ.get("GABE_HEALTH_EWMA_ALPHA", "0.2"))
+        self.failure_threshold = int(os.environ.get("GABE_BREAKER_FAILURE_THRESHOLD", "5"))
+        self.cooldown = float(os.environ.get("GABE_BREAKER_COOLDOWN_SECONDS", "30"))
+        # Only reroute away from the preferred provider when another is clearly faster
+        self.switch_ratio = float(os.environ.get("GABE_HEALTH_SWITCH_RATIO", "0.8"))
+
+    def _get(self, provider: str, model: str) -> ProviderHealth:
+        key = (provider, model)
+        if key not in self._providers:
+            self._providers[key] = ProviderHealth(
+                provider, model, self.alpha, self.failure_threshold, self.cooldown
+            )
+        return self._providers[key]
+
+    def allow(self, provider: str, model: str) -> bool:
+        """Whether a call to this provider may go out right now"""
+        with self._lock:
+            return self._get(provider, model).allow_request()
+
+    def record(self, provider: str, model: str, success: bool, latency: float):
+        """Record the outcome of a provider call"""
+        with self._lock:
+            self._get(provider, model).record(success, latency)
+
+    def call(self, provider: str, model: str, fn: Callable):
+        """Run a provider call through the breaker; an empty result counts as a failure"""
+        if not self.allow(provider, model):
+            metrics.increment(f"provider.{provider}.{model}.short_circuited")
+            raise CircuitOpenError(f"{provider}/{model} circuit is open")
+
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self.record(provider, model, False, time.monotonic() - started)
+            raise
+
+        self.record(provider, model, bool(result), time.monotonic() - started)
+        return result
+
+    def rank(self, candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Order candidates fastest-healthy-first, keeping the given preference unless another is clearly faster"""
+        with self._lock:
+            # Providers due a half-open probe keep their place so they get a chance to recover
+            usable = [c for c in candidates if self._get(*c).state == CLOSED or self._get(*c).probe_ready()]
+            blocked = [c for c in candidates if c not in usable]
+            scores = {c: self._get(*c).score() for c in usable}
+
+        scored = [c for c in usable if scores[c] is not None]
+        if len(usable) >= 2 and scored:
+            preferred = usable[0]
+            best = min(scored, key=lambda c: scores[c])
+            if best != preferred and scores[preferred] is not None \
+                    and scores[best] < scores[preferred] * self.switch_ratio:
+                usable.remove(best)
+                usable.insert(0, best)
+        return usable + blocked
+
+    def snapshot(self) -> Dict:
+        """Health of every known provider, keyed provider/model"""
+        with self._lock:
+            return {f"{p}/{m}": health.to_dict() for (p, m), health in self._providers.items()}
+
+
+# Shared across every AI helper in this worker
+provider_health = ProviderHealthRegistry()
@@ -0,0 +1,241 @@
+"""
+Response cache for generated prayers and scripture explanations
+An in-process LRU+TTL tier in front of an on-disk SQLite tier, keyed on the normalized request
+text plus age group, holding a small pool of variants per key so repeat answers stay fresh
+"""
+
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from metrics import metrics
+from single_flight import SingleFlight
+
+NAME_PLACEHOLDER = "{{name}}"
+
+
+class LRUTTLCache:
+    """Bounded, thread-safe LRU map whose entries also expire after a TTL"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class DiskResponseStore:
+    """SQLite tier shared by every worker on the machine"""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cached_responses ("
+                " cache_key TEXT NOT NULL,"
+                " variant INTEGER NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (cache_key, variant))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load(self, cache_key: str) -> List[str]:
+        """Unexpired variants for a key"""
+        try:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT response FROM cached_responses WHERE cache_key = ? AND created_at > ? ORDER BY variant",
+                    (cache_key, time.time() - self.ttl)
+                ).fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache read failed: {e}")
+            return []
+
+    def save(self, cache_key: str, variant: int, response: str):
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO cached_responses (cache_key, variant, response, created_at) VALUES (?, ?, ?, ?)",
+                    (cache_key, variant, response, time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache write failed: {e}")
+
+
+_disk_stores = {}
+_disk_stores_lock = threading.Lock()
+
+
+def _disk_store(path: str, ttl: float) -> DiskResponseStore:
+    """One SQLite connection per cache file per worker"""
+    with _disk_stores_lock:
+        if path not in _disk_stores:
+            _disk_stores[path] = DiskResponseStore(path, ttl)
+        return _disk_stores[path]
+
+
+class ResponseCache:
+    """Two-tier cache of generated text with a small variant pool per key"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.flights = SingleFlight(f"cache.{namespace}")
+        self.variants = int(os.environ.get("GABE_CACHE_VARIANTS", "3"))
+        self.memory = LRUTTLCache(
+            max_entries=int(os.environ.get("GABE_CACHE_MEMORY_ENTRIES", "1000")),
+            ttl=float(os.environ.get("GABE_CACHE_MEMORY_TTL_SECONDS", "3600"))
+        )
+        self.disk = _disk_store(
+            os.environ.get("GABE_CACHE_DB", "gabe_cache.db"),
+            float(os.environ.get("GABE_CACHE_DISK_TTL_SECONDS", str(7 * 24 * 3600)))
+        )
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """'  John 3:16!! ' and 'john 3:16' should share a key"""
+        text = re.sub(r'\s+', ' ', (text or '').lower()).strip()
+        return text.strip('.!?,;"\' ')
+
+    def cache_key(self, text: str, age_group: Optional[str]) -> str:
+        raw = f"{self.namespace}|{age_group or 'any'}|{self.normalize(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_or_generate(self, text: str, age_group: Optional[str], user_name: str,
+                        generate: Callable[[], Optional[str]], deadline=None) -> Optional[str]:
+        """Serve a cached variant once the pool is full, otherwise generate and grow the pool
+
+        Responses are stored with the user's name swapped for a placeholder so a cached
+        prayer never greets someone by another person's name; a response that uses the name in
+        any other way is returned but not cached, and concurrent callers with another name
+        generate their own.
+        """
+        key = self.cache_key(text, age_group)
+
+        pool = self.memory.get(key)
+        if pool is not None and len(pool) >= self.variants:
+            metrics.increment(f"cache.{self.namespace}.memory_hits")
+            return self._personalize(random.choice(pool), user_name)
+
+        if pool is None:
+            pool = self.disk.load(key)
+            if pool:
+                self.memory.set(key, pool)
+            if len(pool) >= self.variants:
+                metrics.increment(f"cache.{self.namespace}.disk_hits")
+                return self._personalize(random.choice(pool), user_name)
+
+        metrics.increment(f"cache.{self.namespace}.misses")
+
+        def fill() -> Optional[str]:
+            response = generate()
+            if not response:
+                return None
+            template = self._depersonalize(response, user_name)
+            if template is not None:
+                # Copy-on-write so readers holding the old list never see it change
+                grown = list(self.memory.get(key) or pool) + [template]
+                self.memory.set(key, grown)
+                self.disk.save(key, len(grown) - 1, grown[-1])
+            else:
+                metrics.increment(f"cache.{self.namespace}.uncacheable")
+            # A string, so waiters in other workers get it through the lease store too
+            return json.dumps({'response': response, 'template': template, 'name': user_name})
+
+        # Everyone missing on the same key at once waits for a single generation
+        flight = self.flights.do(key, fill, timeout=deadline.remaining() if deadline else None)
+        if not flight:
+            return None
+        result = json.loads(flight)
+        if result['template'] is not None:
+            return self._personalize(result['template'], user_name)
+        if (result['name'] or '').strip().lower() == (user_name or '').strip().lower():
+            return result['response']
+        # Written around someone else's name - this caller needs its own answer
+        metrics.increment(f"cache.{self.namespace}.uncacheable_regenerated")
+        return generate()
+
+    def stats(self) -> dict:
+        hits = metrics.count(f"cache.{self.namespace}.memory_hits") + metrics.count(f"cache.{self.namespace}.disk_hits")
+        misses = metrics.count(f"cache.{self.namespace}.misses")
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'memory_entries': len(self.memory)
+        }
+
+    @staticmethod
+    def _depersonalize(response: str, user_name: str) -> Optional[str]:
+        """The response with the name templated out where it addresses the user, or None if the name is used otherwise
+
+        Only greetings ("Dear Ray", "Hi Ray") and a trailing address (", Ray.") are templated.
+        Names like Grace, Hope or Joy are also words in prayers and verses, so any other
+        occurrence makes the response uncacheable rather than risk "Amazing Ray".
+        """
+        name = re.escape((user_name or '').strip())
+        if not name:
+            return response
+        templated = re.sub(
+            rf"\b((?:dear|hi|hello|hey)\s+){name}\b|(,\s*){name}(?=\s*[.!?]|\s*$)",
+            lambda match: (match.group(1) or match.group(2)) + NAME_PLACEHOLDER,
+            response, flags=re.IGNORECASE
+        )
+        if re.search(rf"\b{name}\b", templated, flags=re.IGNORECASE):
+            return None
+        return templated
+
+    @staticmethod
+    def _personalize(response: str, user_name: str) -> str:
+        return response.replace(NAME_PLACEHOLDER, user_name or 'friend')
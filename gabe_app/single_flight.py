@@ -0,0 +1,222 @@
+"""
+Single-flight request coalescing for GABE
+Concurrent callers asking for the same thing share one upstream call: within a worker through
+an in-process flight table, and optionally across workers through a SQLite lease
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Callable, Optional
+
+from metrics import metrics
+
+
+class _Flight:
+    """One in-progress call and the waiters hanging off it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LeaseStore:
+    """SQLite leases so only one worker on the machine runs a given call at a time
+
+    The worker holding the lease publishes its result; workers that lost the race poll for it
+    and take over the lease if the holder dies without answering.
+    """
+
+    def __init__(self, path: str, lease_seconds: float, poll_interval: float):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._reset()
+        # Neither the connection nor a lock held mid-call may be carried across a fork
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                # Another worker is switching the file to WAL at the same moment
+                pass
+            # Inside a write transaction so concurrent first connections wait on the busy timeout
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flight_leases ("
+                " flight_key TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flight_results ("
+                " flight_key TEXT PRIMARY KEY,"
+                " result TEXT,"
+                " completed_at REAL NOT NULL)"
+            )
+            conn.execute("COMMIT")
+            self._conn = conn
+        return self._conn
+
+    def _acquire(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM flight_leases WHERE flight_key = ? AND expires_at < ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO flight_leases (flight_key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self.owner, now + self.lease_seconds)
+                )
+                conn.execute("COMMIT")
+                return cursor.rowcount == 1
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _publish(self, key: str, result: Optional[str]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO flight_results (flight_key, result, completed_at) VALUES (?, ?, ?)",
+                    (key, result, time.time())
+                )
+                # Results only need to outlive the waiters, not act as a cache
+                conn.execute("DELETE FROM flight_results WHERE completed_at < ?", (time.time() - self.lease_seconds,))
+                conn.execute("DELETE FROM flight_leases WHERE flight_key = ? AND owner = ?", (key, self.owner))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _poll(self, key: str, since: float):
+        """(finished, result) for a flight another worker is running"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT result FROM flight_results WHERE flight_key = ? AND completed_at >= ?", (key, since)
+            ).fetchone()
+            if row:
+                return True, row[0]
+            lease = conn.execute(
+                "SELECT expires_at FROM flight_leases WHERE flight_key = ?", (key,)
+            ).fetchone()
+        # No result and no live lease - the holder gave up or died
+        if lease is None or lease[0] < time.time():
+            return True, None
+        return False, None
+
+    def run(self, key: str, fn: Callable[[], Optional[str]], name: str,
+            timeout: Optional[float] = None) -> Optional[str]:
+        """Run fn under the lease, or wait up to `timeout` for the worker that already holds it (None on timeout)"""
+        try:
+            waiting_since = time.time()
+            give_up_at = time.monotonic() + timeout if timeout is not None else None
+            while not self._acquire(key):
+                finished, result = self._poll(key, waiting_since)
+                while not finished:
+                    if give_up_at is not None and time.monotonic() >= give_up_at:
+                        metrics.increment(f"single_flight.{name}.wait_timeouts")
+                        return None
+                    time.sleep(self.poll_interval)
+                    finished, result = self._poll(key, waiting_since)
+                if result is not None:
+                    metrics.increment(f"single_flight.{name}.cross_worker_coalesced")
+                    return result
+        except sqlite3.Error as e:
+            # The lease is an optimization - never let it block the actual call
+            logging.warning(f"Single-flight lease unavailable: {e}")
+            return fn()
+
+        result = None
+        try:
+            result = fn()
+            return result
+        finally:
+            try:
+                self._publish(key, result)
+            except sqlite3.Error as e:
+                logging.warning(f"Single-flight result publish failed: {e}")
+
+
+_lease_store = None
+_lease_store_lock = threading.Lock()
+
+
+def _shared_lease_store() -> Optional[LeaseStore]:
+    """The cross-worker lease store, when GABE_SINGLE_FLIGHT_DB is set"""
+    global _lease_store
+    path = os.environ.get("GABE_SINGLE_FLIGHT_DB")
+    if not path:
+        return None
+    with _lease_store_lock:
+        if _lease_store is None:
+            _lease_store = LeaseStore(
+                path,
+                lease_seconds=float(os.environ.get("GABE_SINGLE_FLIGHT_LEASE_SECONDS", "30")),
+                poll_interval=float(os.environ.get("GABE_SINGLE_FLIGHT_POLL_MS", "50")) / 1000
+            )
+        return _lease_store
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one; every caller gets its result"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._reset()
+        self.leases = _shared_lease_store()
+        # Flights started in the parent never finish in a forked child
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key: str, fn: Callable[[], Optional[str]], timeout: Optional[float] = None) -> Optional[str]:
+        """Run fn, or wait up to `timeout` for the identical call already in flight (None on timeout)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            metrics.increment(f"single_flight.{self.name}.coalesced")
+            if not flight.done.wait(timeout):
+                metrics.increment(f"single_flight.{self.name}.wait_timeouts")
+                return None
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        metrics.increment(f"single_flight.{self.name}.leaders")
+        try:
+            if self.leases:
+                flight.result = self.leases.run(key, fn, self.name, timeout)
+            else:
+                flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # Late arrivals start a fresh call rather than reusing this result
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,258 @@
+"""
+Local stub LLM provider for GABE
+Mimics the parts of the OpenAI and google-genai clients the gateway uses and returns deterministic
+canned completions, with configurable latency, error rate, timeouts and streaming - so the whole
+app can run offline and be load-tested without spending API quota
+
+Enable with GABE_LLM_BACKEND=stub. Every setting can be given globally (GABE_STUB_<NAME>) or per
+provider (GABE_STUB_OPENAI_<NAME>, GABE_STUB_GEMINI_<NAME>):
+    LATENCY        - fixed:<ms> | uniform:<min_ms>:<max_ms> | normal:<mean_ms>:<std_ms> |
+                     lognormal:<median_ms>:<sigma>   (default lognormal:600:0.4)
+    ERROR_RATE     - fraction of calls that fail with a server error (default 0)
+    TIMEOUT_RATE   - fraction of calls that hang until the request timeout (default 0)
+    CHUNK_WORDS    - words per streamed chunk (default 3)
+    CHUNK_DELAY_MS - pause between streamed chunks (default 30)
+    SEED           - seed for latency and fault sampling (default 42)
+"""
+
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+from token_budget import count_tokens, truncate_to_tokens
+
+CANNED_REPLIES = [
+    "I hear you, friend. God hasn't lost track of you in any of this - He's closer than your next breath. "
+    "Want to tell me a little more about what's on your heart today? 💙",
+    "That sounds like a lot to carry. Remember Matthew 11:28 - Jesus invites the weary to come and rest. "
+    "Would it help if we prayed about it together?",
+    "Thank you for sharing that with me. Like a seed growing in the dark, God is often working where we "
+    "can't see yet. What's one small thing that gave you hope this week?",
+    "I'm really glad you're here. Psalm 46:10 says 'Be still, and know that I am God.' "
+    "Maybe we can take a quiet moment together - what would you like to bring to Him?"
+]
+
+CANNED_PRAYERS = [
+    "Father God, hold this dear one close today. Quiet their worries, strengthen their heart, and remind them "
+    "that they are never alone. Fill them with Your peace that passes understanding. In Jesus' name, Amen.",
+    "Lord, You see every need before we speak it. Meet my friend right where they are, give them courage for "
+    "today and rest for tonight, and let Your love be louder than every fear. Amen."
+]
+
+CANNED_EXPLANATIONS = [
+    "This verse is a reminder that God's love isn't earned - it's given. In everyday life it means you can stop "
+    "performing and start receiving. Try reading it slowly three times today and notice which word stays with you.",
+    "At its heart, this passage is about trust. The writer had real troubles, yet chose to lean on God's "
+    "faithfulness instead of his own understanding. Today, name one worry and hand it over in a short prayer."
+]
+
+CANNED_JSON = {
+    "spiritual_need": "spiritual_growth",
+    "emotional_state": "seeking guidance",
+    "maturity_level": "intermediate",
+    "recommended_master": "st_francis_de_sales",
+    "biblical_theme": "trust",
+    "urgency": "medium",
+    "session_focus": "general spiritual encouragement",
+    "spiritual_guidance": "Be gentle with yourself, dear friend. God is patient with your growth, and so should you be.",
+    "scripture_verse": "Trust in the Lord with all your heart and lean not on your own understanding.",
+    "scripture_reference": "Proverbs 3:5",
+    "spiritual_practice": "Spend five quiet minutes today simply resting in God's presence.",
+    "closing_prayer": "I pray that you will know how deeply you are loved, today and always.",
+    "master_quote": "Have patience with all things, but first of all with yourself."
+}
+
+
+class StubProviderError(Exception):
+    """Injected provider failure, shaped like the SDKs' API errors"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StubTimeoutError(StubProviderError):
+    """Injected timeout - raised once the caller's timeout has actually elapsed"""
+
+    def __init__(self, message: str):
+        super().__init__(message, status_code=408)
+
+
+class StubBehaviour:
+    """Latency, fault and streaming settings for one stub provider"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.latency = self._setting('LATENCY', 'lognormal:600:0.4')
+        self.error_rate = float(self._setting('ERROR_RATE', '0'))
+        self.timeout_rate = float(self._setting('TIMEOUT_RATE', '0'))
+        self.chunk_words = max(1, int(self._setting('CHUNK_WORDS', '3')))
+        self.chunk_delay = float(self._setting('CHUNK_DELAY_MS', '30')) / 1000
+        self._rng = random.Random(f"{self._setting('SEED', '42')}:{provider}")
+        self._lock = threading.Lock()
+
+    def _setting(self, name: str, default: str) -> str:
+        return os.environ.get(f"GABE_STUB_{self.provider.upper()}_{name}",
+                              os.environ.get(f"GABE_STUB_{name}", default))
+
+    def sample_latency(self) -> float:
+        """Seconds until the (first byte of the) response"""
+        kind, _, params = self.latency.partition(':')
+        values = [float(v) for v in params.split(':') if v]
+        with self._lock:
+            if kind == 'fixed':
+                ms = values[0]
+            elif kind == 'uniform':
+                ms = self._rng.uniform(values[0], values[1])
+            elif kind == 'normal':
+                ms = self._rng.gauss(values[0], values[1])
+            else:
+                ms = values[0] * math.exp(self._rng.gauss(0, values[1] if len(values) > 1 else 0.4))
+        return max(0.0, ms) / 1000
+
+    def sample_fault(self) -> Optional[str]:
+        """'error', 'timeout' or None for this call"""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.error_rate:
+            return 'error'
+        if roll < self.error_rate + self.timeout_rate:
+            return 'timeout'
+        return None
+
+    def wait(self, timeout: Optional[float]):
+        """Sleep like a provider would, failing the way the configured faults say"""
+        fault = self.sample_fault()
+        latency = self.sample_latency()
+
+        if fault == 'error':
+            time.sleep(min(latency, 0.05))
+            raise StubProviderError(f"stub {self.provider}: injected server error")
+        if fault == 'timeout' or (timeout is not None and latency > timeout):
+            time.sleep(timeout if timeout is not None else latency)
+            raise StubTimeoutError(f"stub {self.provider}: request timed out")
+        time.sleep(latency)
+
+    def chunks(self, text: str) -> Iterator[str]:
+        words = text.split(' ')
+        for start in range(0, len(words), self.chunk_words):
+            if start:
+                time.sleep(self.chunk_delay)
+            piece = ' '.join(words[start:start + self.chunk_words])
+            yield piece if start + self.chunk_words >= len(words) else piece + ' '
+
+
+def canned_completion(prompt: str, model: str, json_mode: bool = False, max_tokens: Optional[int] = None) -> str:
+    """The same prompt and model always get the same answer"""
+    if json_mode:
+        return json.dumps(CANNED_JSON)
+
+    digest = int(hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest(), 16)
+    lowered = prompt.lower()
+    if 'explain' in lowered and ('scripture' in lowered or 'verse' in lowered):
+        text = CANNED_EXPLANATIONS[digest % len(CANNED_EXPLANATIONS)]
+    elif 'prayer' in lowered.split('user:')[-1] or 'generate a heartfelt' in lowered:
+        text = CANNED_PRAYERS[digest % len(CANNED_PRAYERS)]
+    else:
+        text = CANNED_REPLIES[digest % len(CANNED_REPLIES)]
+
+    if max_tokens:
+        text = truncate_to_tokens(text, max_tokens)
+    return text
+
+
+# ----------------------------------------------------------------------
+# OpenAI surface: client.chat.completions.create(...)
+# ----------------------------------------------------------------------
+
+class _StubCompletions:
+
+    def __init__(self, behaviour: StubBehaviour):
+        self.behaviour = behaviour
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False, timeout: Optional[float] = None,
+               max_tokens: Optional[int] = None, response_format: Optional[Dict] = None, **kwargs):
+        prompt = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        json_mode = bool(response_format and response_format.get('type') == 'json_object')
+        text = canned_completion(prompt, model, json_mode, max_tokens)
+
+        self.behaviour.wait(timeout)
+        if stream:
+            return self._stream(model, text)
+
+        message = SimpleNamespace(role='assistant', content=text)
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(text)
+        return SimpleNamespace(
+            id=f"stub-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens)
+        )
+
+    def _stream(self, model: str, text: str) -> Iterator:
+        for piece in self.behaviour.chunks(text):
+            delta = SimpleNamespace(role='assistant', content=piece)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+
+class StubOpenAI:
+    """Drop-in for openai.OpenAI as far as the gateway is concerned"""
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=_StubCompletions(StubBehaviour('openai')))
+
+
+# ----------------------------------------------------------------------
+# Gemini surface: client.models.generate_content(...) / generate_content_stream(...)
+# ----------------------------------------------------------------------
+
+class _StubModels:
+
+    def __init__(self, behaviour: StubBehaviour):
+        self.behaviour = behaviour
+
+    def _request(self, model: str, contents, config):
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        json_mode = getattr(config, 'response_mime_type', None) == "application/json"
+        http_options = getattr(config, 'http_options', None)
+        timeout_ms = getattr(http_options, 'timeout', None)
+        text = canned_completion(prompt, model, json_mode, getattr(config, 'max_output_tokens', None))
+        return text, (timeout_ms / 1000 if timeout_ms else None)
+
+    def generate_content(self, model: str, contents, config=None):
+        text, timeout = self._request(model, contents, config)
+        self.behaviour.wait(timeout)
+        return SimpleNamespace(text=text, candidates=[SimpleNamespace(content=text, finish_reason='STOP')])
+
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator:
+        text, timeout = self._request(model, contents, config)
+        self.behaviour.wait(timeout)
+        for piece in self.behaviour.chunks(text):
+            yield SimpleNamespace(text=piece)
+
+
+class StubGenAIClient:
+    """Drop-in for google.genai.Client as far as the gateway is concerned"""
+
+    def __init__(self, **kwargs):
+        self.models = _StubModels(StubBehaviour('gemini'))
+
+
+def stub_enabled() -> bool:
+    return os.environ.get("GABE_LLM_BACKEND", "live").lower() == 'stub'
+
+
+def create_stub_client(provider: str):
+    """A stub client for the provider, or None for providers we don't mimic"""
+    if provider == 'openai':
+        return StubOpenAI()
+    if provider == 'gemini':
+        return StubGenAIClient()
+    return None
@@ -0,0 +1,140 @@
+"""
+Token budgeting for GABE prompts
+Counts tokens locally - no tokenizer download, no network - and packs as many recent
+conversation turns as fit a budget so prompt size, latency and cost stay predictable
+"""
+
+import os
+import re
+import math
+from typing import Dict, List, Optional
+
+from metrics import metrics
+
+# Words the OpenAI and Gemini tokenizers both encode as a single token
+COMMON_WORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can
+could day did do does don't for from get go god good had has have he her him his how i i'm if
+in into is it it's its just know like lord love me more my no not now of on one or our out
+peace pray prayer really so some that the their them then there they this time to today too up
+us very was we were what when where which who will with would you you're your
+""".split())
+
+# Characters per token for each kind of piece, tuned against cl100k on chat-style English
+# ('other' is UTF-8 bytes per token for emoji and non-Latin text)
+TOKEN_TABLE = {
+    'word': 4.0,
+    'number': 3.0,
+    'punctuation': 1.0,
+    'other': 2.0
+}
+
+_PIECES = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|\d+|[^\w\s]|[^\x00-\x7f]")
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Approximate token count for a piece of text"""
+    if not text:
+        return 0
+
+    total = 0
+    for piece in _PIECES.findall(text):
+        total += _piece_tokens(piece)
+    return total
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece[0].isascii() and piece[0].isalpha():
+        if piece.lower() in COMMON_WORDS:
+            return 1
+        return max(1, math.ceil(len(piece) / TOKEN_TABLE['word']))
+    if piece.isdigit():
+        return max(1, math.ceil(len(piece) / TOKEN_TABLE['number']))
+    if piece.isascii():
+        return int(TOKEN_TABLE['punctuation'])
+    # Emoji and other non-ASCII characters usually cost a token or two each
+    return max(1, math.ceil(len(piece.encode('utf-8')) / TOKEN_TABLE['other']))
+
+
+def truncate_to_tokens(text: str, limit: int) -> str:
+    """Cut text down to roughly `limit` tokens, ending with an ellipsis when shortened"""
+    if count_tokens(text) <= limit:
+        return text
+
+    used = 0
+    end = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > limit - 2:  # leave room for the ellipsis
+            break
+        end = match.end()
+    return text[:end].rstrip() + "…"
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Tokens for OpenAI-style chat messages, including the per-message framing"""
+    return sum(count_tokens(message.get('content')) + 4 for message in messages) + 2
+
+
+def normalize_turns(history: Optional[List[Dict]]) -> List[Dict]:
+    """Turn any of the history shapes in the app into user/assistant pairs, oldest first
+
+    Accepts session-style {'user', 'gabe'}, database {'user_message', 'gabe_response'} and
+    gateway {'user', 'assistant'} dicts. Crisis turns are never replayed to the model.
+    """
+    turns = []
+    for exchange in history or []:
+        if exchange.get('is_crisis'):
+            continue
+        user = exchange.get('user') or exchange.get('user_message')
+        assistant = exchange.get('assistant') or exchange.get('gabe') or exchange.get('gabe_response')
+        if user and assistant:
+            turns.append({'user': user, 'assistant': assistant})
+    return turns
+
+
+class HistoryManager:
+    """Packs the most recent turns that fit a token budget, truncating over-long ones"""
+
+    def __init__(self, name: str, budget: Optional[int] = None, max_turn_tokens: Optional[int] = None,
+                 max_turns: Optional[int] = None):
+        self.name = name
+        self.budget = budget or int(os.environ.get("GABE_HISTORY_TOKEN_BUDGET", "800"))
+        self.max_turn_tokens = max_turn_tokens or int(os.environ.get("GABE_HISTORY_MAX_TURN_TOKENS", "200"))
+        self.max_turns = max_turns or int(os.environ.get("GABE_HISTORY_MAX_TURNS", "10"))
+
+    def pack(self, history: Optional[List[Dict]]) -> List[Dict]:
+        """Newest turns first until the budget is spent, returned oldest first"""
+        packed = []
+        used = 0
+        truncated = 0
+        turns = normalize_turns(history)[-self.max_turns:]
+
+        for turn in reversed(turns):
+            user, assistant = turn['user'], turn['assistant']
+            user_tokens, assistant_tokens = count_tokens(user), count_tokens(assistant)
+
+            # One rambling message shouldn't push out every other turn
+            if user_tokens + assistant_tokens > self.max_turn_tokens:
+                half = self.max_turn_tokens // 2
+                user_limit = max(half, self.max_turn_tokens - assistant_tokens)
+                assistant_limit = max(half, self.max_turn_tokens - user_tokens)
+                user = truncate_to_tokens(user, user_limit)
+                assistant = truncate_to_tokens(assistant, assistant_limit)
+                user_tokens, assistant_tokens = count_tokens(user), count_tokens(assistant)
+                truncated += 1
+
+            if used + user_tokens + assistant_tokens > self.budget:
+                break
+            packed.append({'user': user, 'assistant': assistant})
+            used += user_tokens + assistant_tokens
+
+        metrics.observe(f"history.{self.name}.tokens", used)
+        metrics.observe(f"history.{self.name}.turns", len(packed))
+        if truncated:
+            metrics.increment(f"history.{self.name}.truncated_turns", truncated)
+        if len(packed) < len(turns):
+            metrics.increment(f"history.{self.name}.dropped_turns", len(turns) - len(packed))
+
+        packed.reverse()
+        return packed
@@ -0,0 +1,203 @@
+"""
+Recent-turn buffer for GABE chat
+Each user's newest turns and rolling summary kept in a bounded per-user ring buffer, LRU-evicted
+across users, so a steady conversation reads its history from memory instead of the database; a
+per-user version counter in a machine-local SQLite file catches clears, summaries and turns
+committed by other workers without a database round-trip
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+from response_cache import LRUTTLCache
+
+
+class HistoryVersions:
+    """Per-user history version shared by every worker on the machine
+
+    Bumped whenever a user's history changes in the database - a committed turn, a new summary,
+    a clear - so a buffer loaded at an older version knows it is stale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                # Another worker is switching the file to WAL at the same moment
+                pass
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history_versions ("
+                " user_id INTEGER PRIMARY KEY,"
+                " version INTEGER NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def current(self, user_id: int) -> Optional[int]:
+        """The user's version, None when the file can't be read"""
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT version FROM history_versions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            logging.warning(f"History version read failed: {e}")
+            return None
+
+    def bump(self, user_id: int) -> Tuple[Optional[int], Optional[int]]:
+        """(version before, version after) the user's history changed; (None, None) on failure"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT version FROM history_versions WHERE user_id = ?", (user_id,)
+                    ).fetchone()
+                    before = row[0] if row else 0
+                    conn.execute(
+                        "INSERT OR REPLACE INTO history_versions (user_id, version) VALUES (?, ?)",
+                        (user_id, before + 1)
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            return before, before + 1
+        except sqlite3.Error as e:
+            logging.warning(f"History version bump failed: {e}")
+            metrics.increment('turn_buffer.version_errors')
+            return None, None
+
+
+class _UserTurns:
+    """One user's ring buffer plus the summary the turns are counted from"""
+
+    def __init__(self, turns: List[Dict], capacity: int, summary: Optional[str], summarized_through_id: int,
+                 version: Optional[int] = None):
+        self.turns = deque(turns, maxlen=capacity)
+        self.summary = summary
+        self.summarized_through_id = summarized_through_id
+        # History version the buffer reflects - None when it couldn't be read, so it never matches
+        self.version = version
+
+
+class TurnBuffer:
+    """Per-worker cache of each user's newest turns, filled from the database on a miss
+
+    With a HistoryVersions store every read compares the entry's version with the shared one, so
+    a clear or a turn committed through another worker on the machine drops the buffer on the next
+    read; this worker's own commits and summaries move the entry's version along with them.
+    Without it - or across machines - entries are only as fresh as the TTL.
+    """
+
+    def __init__(self, turns_per_user: int, max_users: Optional[int] = None, ttl: Optional[float] = None,
+                 versions: Optional[HistoryVersions] = None):
+        self.turns_per_user = turns_per_user
+        self.versions = versions
+        self._users = LRUTTLCache(
+            max_entries=max_users or int(os.environ.get("GABE_TURN_BUFFER_USERS", "10000")),
+            ttl=ttl or float(os.environ.get("GABE_TURN_BUFFER_TTL_SECONDS", "900"))
+        )
+        self._lock = threading.Lock()
+
+    def recent(self, user_id: int, limit: int,
+               loader: Callable[[], Tuple[Optional[str], int, List[Dict]]]) -> Tuple[Optional[str], List[Dict]]:
+        """(summary, up to `limit` newest turns after it), calling `loader` on a miss or a stale entry
+
+        `loader` returns (summary, summarized_through_id, newest turns oldest first) from the database.
+        """
+        # Read before loading - a change landing mid-load then shows up as stale on the next read
+        version = self.versions.current(user_id) if self.versions else None
+        entry = self._users.get(user_id)
+        if entry is None:
+            metrics.increment('turn_buffer.misses')
+            entry = self._reload(user_id, loader, version)
+        elif self.versions and (version is None or entry.version != version):
+            metrics.increment('turn_buffer.stale')
+            entry = self._reload(user_id, loader, version, entry)
+        else:
+            metrics.increment('turn_buffer.hits')
+
+        with self._lock:
+            # A turn still waiting for its group commit has no id yet - it is newer than any summary
+            turns = [turn for turn in entry.turns
+                     if turn['id'] is None or turn['id'] > entry.summarized_through_id]
+            return entry.summary, turns[-limit:]
+
+    def _reload(self, user_id: int, loader: Callable, version: Optional[int],
+                stale: Optional[_UserTurns] = None) -> _UserTurns:
+        summary, summarized_through_id, turns = loader()
+        if stale is not None:
+            with self._lock:
+                # This worker's turns still waiting for their group commit aren't in the database yet
+                turns = turns + [turn for turn in stale.turns if turn['id'] is None]
+        entry = _UserTurns(turns, self.turns_per_user, summary, summarized_through_id, version)
+        self._users.set(user_id, entry)
+        return entry
+
+    def _changed(self, user_id: int, entry: Optional[_UserTurns]):
+        """Bump the shared version; this worker's entry follows only if it was current before"""
+        if not self.versions:
+            return
+        before, after = self.versions.bump(user_id)
+        if entry is not None:
+            with self._lock:
+                entry.version = after if before is not None and entry.version == before else None
+
+    def append(self, user_id: int, turn: Dict):
+        """Record a saved turn - only for users whose buffer already mirrors the database"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return
+        with self._lock:
+            entry.turns.append(turn)
+        # Refresh the TTL - an active conversation keeps its buffer
+        self._users.set(user_id, entry)
+
+    def committed(self, user_id: int):
+        """A turn of the user reached the database - other workers' buffers are now stale"""
+        self._changed(user_id, self._users.get(user_id))
+
+    def update_summary(self, user_id: int, summary: str, summarized_through_id: int):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            with self._lock:
+                if summarized_through_id >= entry.summarized_through_id:
+                    entry.summary = summary
+                    entry.summarized_through_id = summarized_through_id
+        self._changed(user_id, entry)
+
+    def invalidate(self, user_id: int):
+        """Drop the user's buffer here and in every other worker"""
+        self._users.delete(user_id)
+        self._changed(user_id, None)
+        metrics.increment('turn_buffer.invalidations')
+
+    def stats(self) -> Dict:
+        hits = metrics.count('turn_buffer.hits')
+        misses = metrics.count('turn_buffer.misses')
+        return {
+            'hits': hits,
+            'misses': misses,
+            'stale': metrics.count('turn_buffer.stale'),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'memory_entries': len(self._users)
+        }
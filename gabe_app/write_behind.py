@@ -0,0 +1,122 @@
+"""
+Write-behind queue for GABE's Firestore writes
+Chat turns queue profile activity and moods in memory; a background thread coalesces writes to
+the same document and commits them in Firestore WriteBatches, off the reply path
+"""
+
+import os
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from metrics import metrics
+
+# Firestore rejects batches of more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+class WriteBehindWriter:
+    """Coalesces queued document writes and flushes them in batches"""
+
+    def __init__(self, name: str, batch_factory: Callable[[], Any]):
+        self.name = name
+        self.batch_factory = batch_factory
+        self.flush_interval = float(os.environ.get("GABE_WRITE_BEHIND_FLUSH_SECONDS", "2"))
+        self.max_pending = int(os.environ.get("GABE_WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.batch_size = min(MAX_BATCH_WRITES, int(os.environ.get("GABE_WRITE_BEHIND_BATCH_SIZE", "400")))
+
+        self._reset()
+        # Queued writes belong to the process that queued them - a forked worker starts empty
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = OrderedDict()
+        self._worker = None
+
+    def put(self, key: Hashable, ref, data: Dict) -> bool:
+        """Queue a merge-set of `data` on `ref`; False when the queue is full and the write was dropped
+
+        A write to a key that is still queued is folded into it, newest fields winning.
+        """
+        with self._lock:
+            if key in self._pending:
+                _, queued = self._pending.pop(key)
+                data = {**queued, **data}
+                metrics.increment(f"write_behind.{self.name}.coalesced")
+            elif len(self._pending) >= self.max_pending:
+                metrics.increment(f"write_behind.{self.name}.dropped")
+                self._wake.set()
+                return False
+            self._pending[key] = (ref, data)
+            full = len(self._pending) >= self.batch_size
+
+        self._ensure_worker()
+        if full:
+            self._wake.set()
+        return True
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Commit everything queued so far; returns the number of writes committed"""
+        written = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    break
+                items = [self._pending.popitem(last=False) for _ in range(min(self.batch_size, len(self._pending)))]
+
+            try:
+                self._commit(items)
+            except Exception as e:
+                logging.error(f"Write-behind flush of {len(items)} writes failed: {e}")
+                metrics.increment(f"write_behind.{self.name}.failures")
+                self._requeue(items)
+                break
+
+            written += len(items)
+            metrics.increment(f"write_behind.{self.name}.written", len(items))
+            metrics.observe(f"write_behind.{self.name}.batch_size", len(items))
+
+        metrics.set_gauge(f"write_behind.{self.name}.pending", len(self._pending))
+        return written
+
+    def _commit(self, items: List[Tuple[Hashable, Tuple[Any, Dict]]]):
+        batch = self.batch_factory()
+        for _, (ref, data) in items:
+            batch.set(ref, data, merge=True)
+        batch.commit()
+
+    def _requeue(self, items: List[Tuple[Hashable, Tuple[Any, Dict]]]):
+        # Anything queued for the same document since then is newer and wins
+        with self._lock:
+            for key, (ref, data) in items:
+                if key in self._pending:
+                    _, newer = self._pending[key]
+                    data = {**data, **newer}
+                self._pending[key] = (ref, data)
+
+    # ------------------------------------------------------------------
+    # Background flusher
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-write-behind", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Write-behind flusher {self.name} error: {e}")
@@ -0,0 +1,59 @@
+"""
+Shared fixtures for GABE's tests
+The app modules import each other flat (`from metrics import metrics`), the way they run from
+gabe_app/, so both the repo root and gabe_app/ go on the path
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'gabe_app'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from metrics import metrics  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    """Every test starts from empty counters - modules share the one registry object"""
+    metrics.__init__()
+    yield metrics
+
+
+@pytest.fixture
+def db_app(tmp_path):
+    """A bare Flask app bound to the real models on a temporary SQLite file"""
+    flask = pytest.importorskip('flask')
+    pytest.importorskip('flask_sqlalchemy')
+    import models
+
+    app = flask.Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'gabe.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    models.db.init_app(app)
+
+    with app.app_context():
+        models.db.create_all()
+        yield app
+        models.db.session.remove()
+        models.db.drop_all()
+        models.db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(db_app):
+    """Create a user row and return its id"""
+    import models
+
+    def make(username='grace', name='Grace', password='faith-hope-love'):
+        user = models.User(username=username, name=name, age_range='25-34')
+        user.set_password(password)
+        models.db.session.add(user)
+        models.db.session.commit()
+        return user.id
+
+    return make
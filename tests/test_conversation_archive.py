@@ -0,0 +1,111 @@
+"""
+Tests for the compressed conversation archive tier
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from conversation_archive import ConversationArchiver, compress, decompress  # noqa: E402
+
+
+@pytest.fixture
+def archiver(db_app, monkeypatch):
+    import models
+
+    monkeypatch.setenv('GABE_ARCHIVE_AFTER_DAYS', '30')
+    return ConversationArchiver(models.db, models.Conversation, models.ConversationArchive, keep_turns=2)
+
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+
+def add_turns(user_id, *turns):
+    """(days ago, message) pairs, saved oldest first"""
+    import models
+
+    now = datetime.utcnow()
+    for days_ago, message in turns:
+        models.db.session.add(models.Conversation(
+            user_id=user_id, user_message=message, gabe_response=f"reply to {message}",
+            timestamp=now - timedelta(days=days_ago)
+        ))
+    models.db.session.commit()
+
+
+def hot_messages(user_id):
+    import models
+    return [row.user_message for row in models.Conversation.query.filter_by(user_id=user_id)
+            .order_by(models.Conversation.id).all()]
+
+
+@pytest.fixture
+def history(user_id):
+    add_turns(user_id, (100, 'first'), (100, 'second'), (60, 'third'), (45, 'fourth'), (40, 'fifth'), (1, 'today'))
+    return user_id
+
+
+def test_old_turns_move_into_one_block_per_day(archiver, history):
+    import models
+
+    stats = archiver.archive()
+
+    # fifth is old but one of the two newest turns, so it stays hot
+    assert hot_messages(history) == ['fifth', 'today']
+    assert stats['turns'] == 4 and stats['blocks'] == 3 and stats['users'] == 1
+    blocks = models.ConversationArchive.query.order_by(models.ConversationArchive.day).all()
+    assert [block.turn_count for block in blocks] == [2, 1, 1]
+
+
+def test_archiving_again_moves_nothing(archiver, history):
+    archiver.archive()
+    assert archiver.archive()['turns'] == 0
+    assert hot_messages(history) == ['fifth', 'today']
+
+
+def test_reads_see_both_tiers_in_order(archiver, history):
+    before = [turn['user_message'] for turn in archiver.iter_turns(history)]
+    archiver.archive()
+    after = list(archiver.iter_turns(history))
+
+    assert [turn['user_message'] for turn in after] == before
+    assert before == ['first', 'second', 'third', 'fourth', 'fifth', 'today']
+    assert after[0]['gabe_response'] == 'reply to first'
+
+    after_id = after[2]['id']
+    assert [turn['user_message'] for turn in archiver.iter_turns(history, after_id)] == ['fourth', 'fifth', 'today']
+
+
+def test_search_covers_the_archive_newest_first(archiver, history):
+    archiver.archive()
+
+    matches = archiver.search(history, 'REPLY TO', limit=10)
+    assert [turn['user_message'] for turn in matches] == ['today', 'fifth', 'fourth', 'third', 'second', 'first']
+    assert [turn['user_message'] for turn in archiver.search(history, 'reply', limit=3)] == ['today', 'fifth', 'fourth']
+
+
+def test_search_matches_wildcards_literally(archiver, user_id):
+    add_turns(user_id, (1, 'I gave 100% today'), (1, 'snake_case'), (1, 'plain words'))
+
+    assert [turn['user_message'] for turn in archiver.search(user_id, '100%')] == ['I gave 100% today']
+    assert [turn['user_message'] for turn in archiver.search(user_id, '%')] == ['I gave 100% today']
+    assert [turn['user_message'] for turn in archiver.search(user_id, 'e_c')] == ['snake_case']
+
+
+def test_other_users_are_not_touched(archiver, history, make_user):
+    other = make_user('sam', 'Sam')
+    add_turns(other, (100, 'old but recent for sam'))
+
+    archiver.archive()
+
+    assert hot_messages(other) == ['old but recent for sam']
+    assert archiver.search(other, 'first') == []
+
+
+def test_zlib_blocks_round_trip():
+    payload = b'{"turns": []}' * 10
+    assert decompress(compress(payload, 'zlib'), 'zlib') == payload
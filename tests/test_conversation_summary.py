@@ -0,0 +1,58 @@
+"""
+Tests for the rolling conversation summary's message counts
+Runs against the real Conversation model on a temporary SQLite file; nothing is sent to a model
+"""
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('openai')
+pytest.importorskip('google.genai')
+
+from conversation_summary import ConversationSummarizer  # noqa: E402
+
+
+@pytest.fixture
+def summarizer(db_app, monkeypatch):
+    import models
+
+    monkeypatch.setenv('GABE_SUMMARY_EVERY_N', '20')
+    monkeypatch.setenv('GABE_SUMMARY_TAIL_TURNS', '4')
+    summarizer = ConversationSummarizer(db_app, models.db, models.Conversation, models.ConversationSummary)
+    # Tests run summarize_user by hand instead of on the worker
+    summarizer._ensure_worker = lambda: None
+    return summarizer
+
+
+def save_turns(user_id, count):
+    import models
+
+    for i in range(count):
+        models.db.session.add(models.Conversation(user_id=user_id, user_message=f"message {i}", gabe_response='reply'))
+    models.db.session.commit()
+
+
+def test_backlog_seeds_the_count(summarizer, make_user):
+    user_id = make_user()
+    save_turns(user_id, 10)
+    summarizer.note_message(user_id, 'Grace')
+
+    assert summarizer.summarize_user(user_id, 'Grace') is False
+    # Everything older than the four-turn tail
+    assert summarizer._pending_counts[user_id] == 6
+
+
+def test_turns_noted_before_the_read_are_not_counted_twice(summarizer, make_user):
+    user_id = make_user()
+    save_turns(user_id, 10)
+    summarizer.note_message(user_id, 'Grace')
+    # Committed and noted while the summary check was still queued
+    save_turns(user_id, 2)
+    summarizer.note_message(user_id, 'Grace')
+    summarizer.note_message(user_id, 'Grace')
+
+    summarizer.summarize_user(user_id, 'Grace')
+    assert summarizer._pending_counts[user_id] == 8
+
+    summarizer.note_message(user_id, 'Grace')
+    assert summarizer._pending_counts[user_id] == 9
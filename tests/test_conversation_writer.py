@@ -0,0 +1,195 @@
+"""
+Tests for group-committed chat turns, the dead-letter file and spill recovery
+Runs against the real Conversation model on a temporary SQLite file
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from conversation_writer import ConversationWriter  # noqa: E402
+
+
+@pytest.fixture
+def saved():
+    return []
+
+
+@pytest.fixture
+def writer(db_app, tmp_path, monkeypatch, saved):
+    import models
+
+    monkeypatch.setenv('GABE_CONVERSATION_SPILL_DIR', str(tmp_path / 'spill'))
+    # Tests flush by hand unless they wake the flusher themselves
+    monkeypatch.setenv('GABE_CONVERSATION_FLUSH_MS', '60000')
+    monkeypatch.setenv('GABE_CONVERSATION_RECOVER_SECONDS', '3600')
+    return ConversationWriter(db_app, models.db, models.Conversation,
+                              on_saved=lambda user_id, name: saved.append((user_id, name)))
+
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+
+def fields(user_id, message='hello', **extra):
+    return {'user_id': user_id, 'user_message': message, 'gabe_response': 'hi friend', **extra}
+
+
+def stored_messages():
+    import models
+    return [row.user_message for row in models.Conversation.query.order_by(models.Conversation.id).all()]
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_sync_save_commits_before_returning(writer, user_id, saved):
+    turn = writer.save(fields(user_id), 'Ray', sync=True)
+
+    assert turn['id'] is not None
+    assert stored_messages() == ['hello']
+    assert saved == [(user_id, 'Ray')]
+
+
+def test_queued_turns_commit_together_and_get_their_ids(writer, user_id, saved, fresh_metrics):
+    turns = [writer.save(fields(user_id, f"message {i}"), 'Ray') for i in range(3)]
+    assert all(turn['id'] is None for turn in turns)
+    assert os.path.exists(writer._spill_path())
+
+    assert writer.flush() == 3
+
+    assert stored_messages() == ['message 0', 'message 1', 'message 2']
+    assert [turn['id'] for turn in turns] == sorted(turn['id'] for turn in turns)
+    assert len(saved) == 3
+    assert not os.path.exists(writer._spill_path())
+    assert fresh_metrics.count('conversation_writer.committed') == 3
+
+
+def test_full_batch_wakes_the_flusher(writer, user_id):
+    writer.batch_size = 2
+    turns = [writer.save(fields(user_id, f"message {i}"), 'Ray') for i in range(2)]
+
+    for _ in range(200):
+        if turns[-1]['id'] is not None:
+            break
+        time.sleep(0.01)
+
+    assert turns[-1]['id'] is not None
+
+
+def test_rejected_row_is_dead_lettered_and_the_rest_commit(writer, user_id, fresh_metrics):
+    writer.save(fields(user_id, 'before'), 'Ray')
+    writer.save(fields(user_id, None), 'Ray')
+    writer.save(fields(user_id, 'after'), 'Ray')
+
+    assert writer.flush() == 2
+
+    assert stored_messages() == ['before', 'after']
+    assert writer.pending() == 0
+    with open(writer._dead_letter_path(), encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]['fields']['user_id'] == user_id and records[0]['error']
+    assert fresh_metrics.count('conversation_writer.dead_lettered') == 1
+
+
+def test_database_outage_keeps_turns_queued_and_spilled(writer, user_id, monkeypatch):
+    writer.save(fields(user_id, 'first'), 'Ray')
+    writer.save(fields(user_id, 'second'), 'Ray')
+
+    def unavailable(items):
+        raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(writer, '_insert', unavailable)
+    assert writer.flush() == 0
+    assert writer.pending() == 2
+    with open(writer._spill_path(), encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+    assert not os.path.exists(writer._dead_letter_path())
+
+    monkeypatch.undo()
+    assert writer.flush() == 2
+    assert stored_messages() == ['first', 'second']
+
+
+def test_dead_workers_spill_is_replayed(writer, user_id, fresh_metrics):
+    pid = dead_pid()
+    timestamp = datetime(2026, 1, 1, 9, 30, 0, 123456)
+    records = [
+        {'key': 'a', 'user_name': 'Ray', 'fields': writer._encode(fields(user_id, 'lost one', timestamp=timestamp))},
+        {'key': 'b', 'user_name': 'Ray', 'fields': writer._encode(fields(user_id, 'lost two', timestamp=datetime(2026, 1, 1, 9, 31)))}
+    ]
+    path = os.path.join(writer.spill_dir, f"conversations.{pid}.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        # Cut off mid-write by the crash
+        f.write('{"key": "c", "user_na')
+
+    assert writer.recover() == 2
+    assert stored_messages() == ['lost one', 'lost two']
+    assert not os.path.exists(path)
+
+    # Committed before the crash but the file was never removed - nothing is duplicated
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(records[0]) + "\n")
+    assert writer.recover() == 0
+    assert stored_messages() == ['lost one', 'lost two']
+    assert fresh_metrics.count('conversation_writer.recovered') == 2
+
+
+def test_live_workers_spill_is_left_alone(writer, user_id):
+    path = os.path.join(writer.spill_dir, f"conversations.{os.getppid()}.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'key': 'a', 'user_name': 'Ray', 'fields': writer._encode(fields(user_id, timestamp=datetime.utcnow()))}) + "\n")
+
+    assert writer.recover() == 0
+    assert os.path.exists(path)
+
+
+def test_unexpected_flush_error_keeps_the_batch(writer, user_id, monkeypatch):
+    writer.save(fields(user_id, 'first'), 'Ray')
+    writer.save(fields(user_id, 'second'), 'Ray')
+
+    def broken(items):
+        raise RuntimeError('connection pool exhausted')
+
+    monkeypatch.setattr(writer, '_insert', broken)
+    monkeypatch.setattr(writer, '_insert_each', broken)
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+    assert writer.pending() == 2
+    assert not [name for name in os.listdir(writer.spill_dir) if name.endswith('.flushing')]
+
+    monkeypatch.undo()
+    assert writer.flush() == 2
+    assert stored_messages() == ['first', 'second']
+
+
+def test_own_leftover_batch_file_is_replayed(writer, user_id):
+    record = {'key': 'a', 'user_name': 'Ray', 'fields': writer._encode(fields(user_id, 'left behind', timestamp=datetime.utcnow()))}
+    path = f"{writer._spill_path()}.0123abcd.flushing"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+    # A batch this process is still committing is left alone
+    writer._flushing.add(path)
+    assert writer.recover() == 0
+
+    writer._flushing.discard(path)
+    assert writer.recover() == 1
+    assert stored_messages() == ['left behind']
+    assert not os.path.exists(path)
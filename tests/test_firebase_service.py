@@ -0,0 +1,81 @@
+"""
+Tests for the memory bundle cache in FirebaseService
+The Firestore lookups are replaced with coroutines, so no Firebase project is needed
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from firebase_service import FirebaseService  # noqa: E402
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('GABE_JOURNAL_OUTBOX_DB', str(tmp_path / 'outbox.db'))
+    for name in ('FIREBASE_SERVICE_ACCOUNT', 'FIREBASE_PROJECT_ID', 'GOOGLE_CLOUD_PROJECT'):
+        monkeypatch.delenv(name, raising=False)
+    service = FirebaseService()
+    service.db = object()
+    return service
+
+
+def fake_lookups(service, profile_started=None, release=None, fail=None):
+    async def fetch_profile(user_id):
+        if profile_started:
+            profile_started.set()
+            await release.wait()
+        if fail == 'profile':
+            raise RuntimeError('firestore unavailable')
+        return {'name': 'Ray'}
+
+    async def page(user_id, limit, *args, **kwargs):
+        return [], None
+
+    service._fetch_profile = fetch_profile
+    service.get_mood_page = service.get_journal_page = service.get_prayer_page = page
+
+
+def test_complete_bundle_is_cached(service):
+    fake_lookups(service)
+
+    memory = asyncio.run(service.get_user_memory('u1'))
+
+    assert memory['profile'] == {'name': 'Ray'}
+    assert service.memory_cache.get('u1') == memory
+    assert service._memory_loads == {}
+
+
+def test_failed_lookup_is_not_cached(service):
+    fake_lookups(service, fail='profile')
+
+    memory = asyncio.run(service.get_user_memory('u1'))
+
+    assert memory['profile'] is None
+    assert service.memory_cache.get('u1') is None
+    assert service._memory_loads == {}
+
+
+def test_write_during_a_load_keeps_it_out_of_the_cache(service):
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+        fake_lookups(service, started, release)
+        load = asyncio.ensure_future(service.get_user_memory('u1'))
+        await started.wait()
+        service.invalidate_user_memory('u1')
+        release.set()
+        return await load
+
+    assert asyncio.run(scenario())['profile'] == {'name': 'Ray'}
+    assert service.memory_cache.get('u1') is None
+    assert service._memory_loads == {}
+
+
+def test_writes_without_a_load_leave_no_state_behind(service):
+    for i in range(100):
+        service.invalidate_user_memory(f"u{i}")
+        service._update_cached_memory(f"u{i}", 'profile', lambda profile: {'name': 'Ray'})
+
+    assert service._memory_loads == {}
@@ -0,0 +1,142 @@
+"""
+Tests for hedged provider calls
+Providers are the stub LLM clients with fixed latencies, so every race has a known winner
+"""
+
+import time
+
+import pytest
+
+import hedging
+import provider_health
+from deadline import Deadline
+from stub_llm import StubGenAIClient, StubOpenAI, StubProviderError
+
+PRIMARY = ('openai', 'gpt-4o')
+SECONDARY = ('gemini', 'gemini-2.5-flash')
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    registry = provider_health.ProviderHealthRegistry()
+    monkeypatch.setattr(hedging, 'provider_health', registry)
+    return registry
+
+
+def ask_openai(calls):
+    def call():
+        calls.append('openai')
+        response = StubOpenAI().chat.completions.create(model=PRIMARY[1], messages=[{'role': 'user', 'content': 'hi'}])
+        return response.choices[0].message.content
+    return call
+
+
+def ask_gemini(calls):
+    def call():
+        calls.append('gemini')
+        return StubGenAIClient().models.generate_content(model=SECONDARY[1], contents='hi').text
+    return call
+
+
+def dispatcher(monkeypatch, delay_ms='50'):
+    monkeypatch.setenv('GABE_HEDGE_DELAY_MS', delay_ms)
+    return hedging.HedgedDispatcher('test', PRIMARY, SECONDARY)
+
+
+def test_fast_primary_wins_without_hedging(monkeypatch, fresh_metrics):
+    monkeypatch.setenv('GABE_STUB_OPENAI_LATENCY', 'fixed:5')
+    calls = []
+
+    result = dispatcher(monkeypatch, '500').call(ask_openai(calls), ask_gemini(calls))
+
+    assert result
+    assert calls == ['openai']
+    assert fresh_metrics.count('hedge.test.default.primary_wins') == 1
+    assert fresh_metrics.count('hedge.test.default.hedges_fired') == 0
+
+
+def test_slow_primary_is_hedged_and_secondary_wins(monkeypatch, fresh_metrics):
+    monkeypatch.setenv('GABE_STUB_OPENAI_LATENCY', 'fixed:1000')
+    monkeypatch.setenv('GABE_STUB_GEMINI_LATENCY', 'fixed:5')
+    calls = []
+
+    started = time.monotonic()
+    result = dispatcher(monkeypatch).call(ask_openai(calls), ask_gemini(calls))
+
+    assert result
+    assert time.monotonic() - started < 0.5
+    assert calls == ['openai', 'gemini']
+    assert fresh_metrics.count('hedge.test.default.hedges_fired') == 1
+    assert fresh_metrics.count('hedge.test.default.hedge_wins') == 1
+
+
+def test_primary_error_falls_back_to_secondary(monkeypatch, fresh_metrics):
+    monkeypatch.setenv('GABE_STUB_OPENAI_ERROR_RATE', '1')
+    monkeypatch.setenv('GABE_STUB_GEMINI_LATENCY', 'fixed:5')
+    calls = []
+
+    result = dispatcher(monkeypatch, '500').call(ask_openai(calls), ask_gemini(calls))
+
+    assert result
+    assert calls == ['openai', 'gemini']
+    assert fresh_metrics.count('hedge.test.default.fallbacks') == 1
+    assert fresh_metrics.count('hedge.test.default.secondary_wins') == 1
+    assert fresh_metrics.count('hedge.test.default.hedges_fired') == 0
+
+
+def test_empty_answers_from_both_return_none(monkeypatch, fresh_metrics):
+    result = dispatcher(monkeypatch).call(lambda: '', lambda: None)
+
+    assert result is None
+    assert fresh_metrics.count('hedge.test.default.both_failed') == 1
+
+
+def test_deadline_stops_waiting_for_slow_providers(monkeypatch, fresh_metrics):
+    monkeypatch.setenv('GABE_STUB_LATENCY', 'fixed:1000')
+    calls = []
+
+    started = time.monotonic()
+    result = dispatcher(monkeypatch).call(ask_openai(calls), ask_gemini(calls), deadline=Deadline(0.2))
+
+    assert result is None
+    assert time.monotonic() - started < 0.6
+    assert fresh_metrics.count('hedge.test.default.deadline_exceeded') == 1
+
+
+def test_open_circuit_reroutes_to_the_other_provider(monkeypatch, fresh_metrics, fresh_health):
+    monkeypatch.setenv('GABE_STUB_GEMINI_LATENCY', 'fixed:5')
+    for _ in range(fresh_health.failure_threshold):
+        fresh_health.record(*PRIMARY, success=False, latency=1.0)
+    calls = []
+
+    result = dispatcher(monkeypatch, '500').call(ask_openai(calls), ask_gemini(calls))
+
+    assert result
+    assert calls == ['gemini']
+    assert fresh_metrics.count('hedge.test.default.rerouted') == 1
+
+
+def test_adaptive_delay_follows_primary_p95(monkeypatch, fresh_metrics):
+    monkeypatch.delenv('GABE_HEDGE_DELAY_MS', raising=False)
+    hedger = hedging.HedgedDispatcher('test', PRIMARY, SECONDARY)
+    assert hedger.hedge_delay('openai') == hedger.default_delay
+
+    for _ in range(hedger.min_samples):
+        fresh_metrics.observe('hedge.test.default.openai_latency', 0.6)
+    assert hedger.hedge_delay('openai') == pytest.approx(0.6)
+
+    # Clamped on both sides
+    for _ in range(hedger.min_samples):
+        fresh_metrics.observe('hedge.test.fast.openai_latency', 0.001)
+        fresh_metrics.observe('hedge.test.slow.openai_latency', 60)
+    assert hedger.hedge_delay('openai', 'fast') == hedger.min_delay
+    assert hedger.hedge_delay('openai', 'slow') == hedger.max_delay
+
+
+def test_provider_errors_count_against_the_circuit(monkeypatch, fresh_health):
+    def broken():
+        raise StubProviderError('boom')
+
+    dispatcher(monkeypatch, '500').call(broken, lambda: 'ok')
+
+    assert fresh_health.snapshot()['openai/gpt-4o']['consecutive_failures'] == 1
@@ -0,0 +1,209 @@
+"""
+Tests for chunked history deletion
+Jobs are run by hand with run_once, except where the background worker itself is under test
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from history_purge import HistoryPurger  # noqa: E402
+
+
+def make_purger(app, monkeypatch):
+    import models
+
+    monkeypatch.setenv('GABE_PURGE_CHUNK_ROWS', '2')
+    monkeypatch.setenv('GABE_PURGE_PAUSE_MS', '0')
+    monkeypatch.setenv('GABE_PURGE_POLL_SECONDS', '0.05')
+    return HistoryPurger(app, models.db, models.User, models.Conversation, models.ConversationArchive,
+                         models.ConversationSummary, models.HistoryPurge)
+
+
+@pytest.fixture
+def purger(db_app, monkeypatch):
+    purger = make_purger(db_app, monkeypatch)
+    monkeypatch.setattr(purger, '_ensure_worker', lambda: None)
+    return purger
+
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+
+def add_turns(user_id, count, prefix='turn'):
+    import models
+
+    for i in range(count):
+        models.db.session.add(models.Conversation(user_id=user_id, user_message=f"{prefix} {i}", gabe_response='reply'))
+    models.db.session.commit()
+
+
+def add_archive_block(user_id, first_id, last_id):
+    import models
+
+    models.db.session.add(models.ConversationArchive(
+        user_id=user_id, day=date(2025, 1, 1), first_id=first_id, last_id=last_id,
+        turn_count=last_id - first_id + 1, codec='zlib', payload=b''
+    ))
+    models.db.session.commit()
+
+
+def messages(user_id):
+    import models
+    return [row.user_message for row in models.Conversation.query.filter_by(user_id=user_id)
+            .order_by(models.Conversation.id).all()]
+
+
+def test_clear_hides_history_at_once_and_deletes_it_later(purger, user_id, monkeypatch, fresh_metrics):
+    import models
+
+    chunks = []
+    delete_chunk = purger._delete_chunk
+    monkeypatch.setattr(purger, '_delete_chunk', lambda *args: chunks.append(delete_chunk(*args)) or chunks[-1])
+
+    add_turns(user_id, 5)
+    newest = models.Conversation.query.order_by(models.Conversation.id.desc()).first().id
+
+    job = purger.clear_history(user_id)
+
+    assert job['status'] == 'pending'
+    assert purger.hidden_through(user_id) == newest
+    summary = models.ConversationSummary.query.filter_by(user_id=user_id).one()
+    assert summary.summarized_through_id == newest and summary.message_count == 0
+    # Nothing deleted on the request path
+    assert len(messages(user_id)) == 5
+
+    add_turns(user_id, 1, 'after the clear')
+    assert purger.run_once()
+
+    assert messages(user_id) == ['after the clear 0']
+    status = purger.status(job['id'], user_id)
+    assert status['status'] == 'done' and status['deleted'] == status['total'] == 5
+    assert purger.hidden_through(user_id) == 0
+    # Two rows per chunk, then an empty read for each table
+    assert chunks == [2, 2, 1, 0, 0]
+    assert fresh_metrics.count('history_purge.rows') == 5
+    assert not purger.run_once()
+
+
+def test_clear_deletes_only_archive_blocks_it_covers(purger, user_id):
+    import models
+
+    add_turns(user_id, 2)
+    add_archive_block(user_id, 1, 2)
+    purger.clear_history(user_id)
+    add_archive_block(user_id, 10, 12)
+
+    purger.run_once()
+
+    assert [block.first_id for block in models.ConversationArchive.query.all()] == [10]
+
+
+def test_delete_account_locks_it_out_and_removes_everything(purger, user_id, make_user):
+    import models
+
+    add_turns(user_id, 3)
+    add_archive_block(user_id, 1, 3)
+    other = make_user('sam', 'Sam')
+    add_turns(other, 1, 'sam')
+
+    job = purger.delete_account(user_id, 'faith-hope-love')
+    user = models.db.session.get(models.User, user_id)
+    assert user.username == f"deleted-{user_id}"
+    assert not user.check_password('anything')
+    # The username is free for someone new straight away
+    make_user('grace', 'Grace')
+
+    purger.run_once()
+
+    assert models.db.session.get(models.User, user_id) is None
+    assert messages(user_id) == []
+    assert models.ConversationArchive.query.count() == 0
+    assert messages(other) == ['sam 0']
+    assert purger.status(job['id'], user_id)['status'] == 'done'
+
+
+def test_delete_account_needs_the_current_password(purger, user_id, fresh_metrics):
+    import models
+
+    add_turns(user_id, 2)
+
+    assert purger.delete_account(user_id, 'wrong password') is None
+    assert purger.delete_account(user_id, '') is None
+
+    user = models.db.session.get(models.User, user_id)
+    assert user.username == 'grace' and user.check_password('faith-hope-love')
+    assert models.HistoryPurge.query.count() == 0
+    assert len(messages(user_id)) == 2
+    assert fresh_metrics.count('history_purge.delete_rejected') == 2
+
+
+def test_status_is_private_to_the_owner(purger, user_id):
+    job = purger.clear_history(user_id)
+
+    assert purger.status(job['id'], user_id)['id'] == job['id']
+    assert purger.status(job['id'], user_id + 1) is None
+
+
+def test_running_job_is_only_taken_over_once_stale(purger, user_id):
+    import models
+
+    add_turns(user_id, 2)
+    job = purger.clear_history(user_id)
+    models.HistoryPurge.query.filter_by(id=job['id']).update({'status': 'running', 'updated_at': datetime.utcnow()})
+    models.db.session.commit()
+
+    # Another worker is on it
+    assert not purger.run_once()
+    assert len(messages(user_id)) == 2
+
+    models.HistoryPurge.query.filter_by(id=job['id']).update(
+        {'updated_at': datetime.utcnow() - timedelta(seconds=purger.stale_after + 1)}
+    )
+    models.db.session.commit()
+    assert purger.run_once()
+    assert messages(user_id) == []
+
+
+def test_failed_job_records_the_error_and_stays_unfinished(purger, user_id, monkeypatch, fresh_metrics):
+    import models
+
+    add_turns(user_id, 2)
+    job = purger.clear_history(user_id)
+
+    def broken(*args):
+        raise RuntimeError('disk I/O error')
+
+    monkeypatch.setattr(purger, '_delete_chunk', broken)
+    purger.run_once()
+
+    purge = models.db.session.get(models.HistoryPurge, job['id'])
+    models.db.session.refresh(purge)
+    assert purge.status == 'running' and 'disk I/O error' in purge.last_error
+    assert purger.hidden_through(user_id) > 0
+    assert fresh_metrics.count('history_purge.failures') == 1
+
+
+def test_background_worker_finishes_queued_jobs(db_app, monkeypatch, user_id):
+    import models
+
+    purger = make_purger(db_app, monkeypatch)
+    add_turns(user_id, 5)
+    job = purger.clear_history(user_id)
+
+    for _ in range(200):
+        models.db.session.expire_all()
+        if purger.status(job['id'], user_id)['status'] == 'done':
+            break
+        time.sleep(0.01)
+    # Park the worker so it doesn't poll the database after the test drops it
+    purger.poll_interval = 3600
+    time.sleep(0.1)
+
+    assert purger.status(job['id'], user_id)['status'] == 'done'
+    assert messages(user_id) == []
@@ -0,0 +1,139 @@
+"""
+Tests for the durable journal outbox
+A fake Firestore client records the batches the syncer commits
+"""
+
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from journal_outbox import JournalOutbox
+
+
+class FakeRef:
+
+    def __init__(self, path):
+        self.path = path
+
+    def collection(self, name):
+        return FakeRef(f"{self.path}/{name}")
+
+    def document(self, doc_id):
+        return FakeRef(f"{self.path}/{doc_id}")
+
+
+class FakeBatch:
+
+    def __init__(self, firestore):
+        self.firestore = firestore
+        self.writes = {}
+
+    def set(self, ref, data):
+        self.writes[ref.path] = data
+
+    def commit(self):
+        if self.firestore.failing:
+            raise RuntimeError('firestore unavailable')
+        self.firestore.docs.update(self.writes)
+
+
+class FakeFirestore:
+
+    def __init__(self):
+        self.docs = {}
+        self.failing = False
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return FakeRef(name)
+
+
+@pytest.fixture
+def firestore():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def connected():
+    # The background syncer stays idle until a test connects it
+    return {'db': None}
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch, connected):
+    monkeypatch.setenv('GABE_JOURNAL_SYNC_INTERVAL_SECONDS', '60')
+    monkeypatch.setenv('GABE_JOURNAL_SYNC_BACKOFF_SECONDS', '0.05')
+    return JournalOutbox(str(tmp_path / 'outbox.db'), lambda: connected['db'])
+
+
+def test_pending_entries_are_readable_newest_first(outbox):
+    first = outbox.add('u1', 'morning thanks', 'grateful')
+    time.sleep(0.01)
+    second = outbox.add('u1', 'evening prayer')
+    outbox.add('u2', 'someone else')
+
+    assert [e['id'] for e in outbox.pending_for('u1', 10)] == [second['id'], first['id']]
+    assert [e['id'] for e in outbox.pending_for('u1', 10, before=first['timestamp'])] == [first['id']]
+    assert outbox.backlog() == 3
+
+
+def test_sync_writes_each_entry_under_its_own_id(outbox, connected, firestore, fresh_metrics):
+    entry = outbox.add('u1', 'morning thanks', 'grateful')
+    connected['db'] = firestore
+
+    assert outbox.sync_once() == 1
+
+    doc = firestore.docs[f"users/u1/journal/{entry['id']}"]
+    assert doc['content'] == 'morning thanks' and doc['mood'] == 'grateful'
+    assert outbox.pending_for('u1', 10) == []
+    assert outbox.backlog() == 0
+    assert fresh_metrics.count('journal_outbox.synced') == 1
+
+
+def test_failed_sync_backs_off_then_retries(outbox, connected, firestore, fresh_metrics):
+    outbox.add('u1', 'morning thanks')
+    connected['db'] = firestore
+    firestore.failing = True
+
+    assert outbox.sync_once() == 0
+    firestore.failing = False
+    # Not due yet - the backoff holds it back
+    assert outbox.sync_once() == 0
+    assert outbox.backlog() == 1
+
+    time.sleep(0.1)
+    assert outbox.sync_once() == 1
+    assert fresh_metrics.count('journal_outbox.failures') == 1
+
+
+def test_workers_sharing_the_file_do_not_claim_the_same_rows(tmp_path, outbox):
+    outbox.add('u1', 'morning thanks')
+    other_worker = JournalOutbox(outbox.path, lambda: None)
+
+    assert len(outbox._claim()) == 1
+    assert other_worker._claim() == []
+
+
+def test_entries_survive_a_restart(tmp_path, outbox, connected, firestore):
+    outbox.add('u1', 'morning thanks')
+    restarted = JournalOutbox(outbox.path, lambda: firestore)
+
+    assert len(restarted.pending_for('u1', 10)) == 1
+    assert restarted.sync_once() == 1
+    assert outbox.backlog() == 0
+
+
+def test_background_syncer_drains_new_entries(outbox, connected, firestore):
+    connected['db'] = firestore
+    entry = outbox.add('u1', 'morning thanks')
+
+    for _ in range(100):
+        if firestore.docs:
+            break
+        time.sleep(0.01)
+
+    assert list(firestore.docs) == [f"users/u1/journal/{entry['id']}"]
+    assert isinstance(entry['timestamp'], datetime) and entry['timestamp'].tzinfo == timezone.utc
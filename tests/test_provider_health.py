@@ -0,0 +1,124 @@
+"""
+Tests for provider circuit breakers and health ranking
+"""
+
+import time
+
+import pytest
+
+from provider_health import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, ProviderHealth, ProviderHealthRegistry
+
+OPENAI = ('openai', 'gpt-4o')
+GEMINI = ('gemini', 'gemini-2.5-flash')
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setenv('GABE_BREAKER_FAILURE_THRESHOLD', '3')
+    monkeypatch.setenv('GABE_BREAKER_COOLDOWN_SECONDS', '0.05')
+    return ProviderHealthRegistry()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    health = ProviderHealth('openai', 'gpt-4o', alpha=0.2, failure_threshold=3, cooldown=30)
+
+    health.record(False, 1.0)
+    health.record(False, 1.0)
+    assert health.state == CLOSED
+    health.record(False, 1.0)
+
+    assert health.state == OPEN
+    assert not health.allow_request()
+
+
+def test_success_resets_the_failure_streak():
+    health = ProviderHealth('openai', 'gpt-4o', alpha=0.2, failure_threshold=3, cooldown=30)
+
+    health.record(False, 1.0)
+    health.record(False, 1.0)
+    health.record(True, 0.5)
+    health.record(False, 1.0)
+
+    assert health.state == CLOSED
+    assert health.consecutive_failures == 1
+
+
+def test_half_open_allows_a_single_probe():
+    health = ProviderHealth('openai', 'gpt-4o', alpha=0.2, failure_threshold=1, cooldown=0.05)
+    health.record(False, 1.0)
+    assert not health.allow_request()
+
+    time.sleep(0.06)
+    assert health.allow_request()
+    assert health.state == HALF_OPEN
+    assert not health.allow_request()
+
+
+def test_failed_probe_reopens_and_successful_probe_closes():
+    health = ProviderHealth('openai', 'gpt-4o', alpha=0.2, failure_threshold=1, cooldown=0.05)
+    health.record(False, 1.0)
+    time.sleep(0.06)
+    assert health.allow_request()
+
+    health.record(False, 1.0)
+    assert health.state == OPEN
+
+    time.sleep(0.06)
+    assert health.allow_request()
+    health.record(True, 0.2)
+    assert health.state == CLOSED
+    assert health.allow_request()
+
+
+def test_failure_latency_does_not_feed_the_latency_average():
+    health = ProviderHealth('openai', 'gpt-4o', alpha=0.5, failure_threshold=5, cooldown=30)
+    assert health.score() is None
+
+    health.record(True, 1.0)
+    health.record(False, 30.0)
+
+    assert health.ewma_latency == 1.0
+    assert health.ewma_error_rate == 0.5
+    assert health.score() == pytest.approx(2.0)
+
+
+def test_call_short_circuits_an_open_provider(registry, fresh_metrics):
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError('upstream down')
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            registry.call(*OPENAI, failing)
+    with pytest.raises(CircuitOpenError):
+        registry.call(*OPENAI, failing)
+
+    assert len(calls) == 3
+    assert fresh_metrics.count('provider.openai.gpt-4o.short_circuited') == 1
+    assert fresh_metrics.count('provider.openai.gpt-4o.circuit_opened') == 1
+
+
+def test_empty_result_counts_as_failure(registry):
+    assert registry.call(*OPENAI, lambda: '') == ''
+    assert registry.snapshot()['openai/gpt-4o']['consecutive_failures'] == 1
+
+
+def test_rank_keeps_preference_unless_another_is_clearly_faster(registry):
+    registry.record(*OPENAI, success=True, latency=1.0)
+    registry.record(*GEMINI, success=True, latency=0.9)
+    assert registry.rank([OPENAI, GEMINI]) == [OPENAI, GEMINI]
+
+    for _ in range(20):
+        registry.record(*GEMINI, success=True, latency=0.2)
+    assert registry.rank([OPENAI, GEMINI]) == [GEMINI, OPENAI]
+
+
+def test_rank_puts_open_circuits_last_until_probe_is_due(registry):
+    for _ in range(3):
+        registry.record(*OPENAI, success=False, latency=1.0)
+    assert registry.rank([OPENAI, GEMINI]) == [GEMINI, OPENAI]
+
+    time.sleep(0.06)
+    assert registry.rank([OPENAI, GEMINI]) == [OPENAI, GEMINI]
@@ -0,0 +1,174 @@
+"""
+Tests for the two-tier response cache
+"""
+
+import threading
+import time
+
+import pytest
+
+from response_cache import LRUTTLCache, ResponseCache
+
+
+@pytest.fixture
+def cache_db(tmp_path, monkeypatch):
+    monkeypatch.setenv('GABE_CACHE_DB', str(tmp_path / 'cache.db'))
+    monkeypatch.setenv('GABE_CACHE_VARIANTS', '2')
+    monkeypatch.delenv('GABE_SINGLE_FLIGHT_DB', raising=False)
+    return tmp_path / 'cache.db'
+
+
+def generator(*responses):
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return responses[(len(calls) - 1) % len(responses)]
+
+    return generate, calls
+
+
+def test_lru_evicts_oldest_and_expires_entries():
+    cache = LRUTTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    cache.set('d', 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get('d', 'gone') == 'gone'
+
+
+def test_normalized_requests_share_a_key(cache_db):
+    cache = ResponseCache('scripture')
+    assert cache.cache_key('  John 3:16!! ', 'adult') == cache.cache_key('john 3:16', 'adult')
+    assert cache.cache_key('john 3:16', 'adult') != cache.cache_key('john 3:16', 'teen')
+
+
+def test_pool_fills_before_serving_hits(cache_db, fresh_metrics):
+    cache = ResponseCache('prayer')
+    generate, calls = generator('Lord, give rest.', 'Father, bring peace.')
+
+    first = cache.get_or_generate('worried', 'adult', 'Ray', generate)
+    second = cache.get_or_generate('worried', 'adult', 'Ray', generate)
+    for _ in range(5):
+        assert cache.get_or_generate('worried', 'adult', 'Ray', generate) in (first, second)
+
+    assert len(calls) == 2
+    assert fresh_metrics.count('cache.prayer.memory_hits') == 5
+
+
+def test_disk_tier_is_shared_between_instances(cache_db, fresh_metrics):
+    generate, calls = generator('Lord, give rest.', 'Father, bring peace.')
+    writer = ResponseCache('prayer')
+    writer.get_or_generate('worried', 'adult', 'Ray', generate)
+    writer.get_or_generate('worried', 'adult', 'Ray', generate)
+
+    reader = ResponseCache('prayer')
+    reader.memory.clear()
+    assert reader.get_or_generate('worried', 'adult', 'Ray', generate)
+
+    assert len(calls) == 2
+    assert fresh_metrics.count('cache.prayer.disk_hits') == 1
+
+
+def test_greeting_name_is_swapped_for_the_next_user(cache_db):
+    cache = ResponseCache('prayer')
+    cache.variants = 1
+    generate, _ = generator('Dear Ray, God is near. Amen, Ray.')
+
+    assert cache.get_or_generate('lonely', 'adult', 'Ray', generate) == 'Dear Ray, God is near. Amen, Ray.'
+    assert cache.get_or_generate('lonely', 'adult', 'Sam', generate) == 'Dear Sam, God is near. Amen, Sam.'
+
+
+def test_name_used_as_a_word_is_not_cached(cache_db, fresh_metrics):
+    cache = ResponseCache('prayer')
+    cache.variants = 1
+    response = 'Dear Grace, may His amazing grace carry you.'
+    generate, calls = generator(response)
+
+    assert cache.get_or_generate('tired', 'adult', 'Grace', generate) == response
+    # Nobody else ever sees "Dear Sam, may His amazing Sam carry you"
+    generate_other, _ = generator('Dear Sam, rest in Him.')
+    assert cache.get_or_generate('tired', 'adult', 'Sam', generate_other) == 'Dear Sam, rest in Him.'
+
+    assert len(calls) == 1
+    assert fresh_metrics.count('cache.prayer.uncacheable') == 1
+
+
+def test_failed_generation_is_not_cached(cache_db):
+    cache = ResponseCache('prayer')
+    generate, calls = generator(None)
+
+    assert cache.get_or_generate('anxious', 'adult', 'Ray', generate) is None
+    assert cache.get_or_generate('anxious', 'adult', 'Ray', generate) is None
+    assert len(calls) == 2
+    assert cache.disk.load(cache.cache_key('anxious', 'adult')) == []
+
+
+def test_concurrent_misses_generate_once(cache_db):
+    cache = ResponseCache('prayer')
+    calls = []
+
+    def slow_generate():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'Lord, hold us.'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_generate('storm', 'adult', 'Ray', slow_generate)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['Lord, hold us.'] * 5
+
+
+def test_waiters_get_the_shared_answer_in_their_own_name(cache_db):
+    cache = ResponseCache('prayer')
+    cache.variants = 5
+
+    def slow_generate():
+        time.sleep(0.1)
+        return 'Dear Ray, God is near.'
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.update(
+        ray=cache.get_or_generate('storm', 'adult', 'Ray', slow_generate)
+    ))
+    leader.start()
+    time.sleep(0.02)
+    results['sam'] = cache.get_or_generate('storm', 'adult', 'Sam', lambda: 'never called')
+    leader.join()
+
+    assert results == {'ray': 'Dear Ray, God is near.', 'sam': 'Dear Sam, God is near.'}
+
+
+def test_waiters_regenerate_when_the_answer_is_uncacheable(cache_db, fresh_metrics):
+    cache = ResponseCache('prayer')
+
+    def slow_generate():
+        time.sleep(0.1)
+        return 'Grace, may His grace carry you.'
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.update(
+        grace=cache.get_or_generate('tired', 'adult', 'Grace', slow_generate)
+    ))
+    leader.start()
+    time.sleep(0.02)
+    results['sam'] = cache.get_or_generate('tired', 'adult', 'Sam', lambda: 'Sam, rest in Him.')
+    leader.join()
+
+    assert results['grace'] == 'Grace, may His grace carry you.'
+    assert results['sam'] == 'Sam, rest in Him.'
+    assert fresh_metrics.count('cache.prayer.uncacheable_regenerated') == 1
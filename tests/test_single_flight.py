@@ -0,0 +1,143 @@
+"""
+Tests for single-flight coalescing, in process and across workers through the SQLite lease
+"""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import LeaseStore, SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def no_shared_leases(monkeypatch):
+    monkeypatch.delenv('GABE_SINGLE_FLIGHT_DB', raising=False)
+
+
+def run_in_threads(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def slow(value, calls, seconds=0.1):
+    def fn():
+        calls.append(1)
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+def lease_store(path, lease_seconds=5.0):
+    return LeaseStore(str(path), lease_seconds=lease_seconds, poll_interval=0.01)
+
+
+def test_concurrent_callers_share_one_call(fresh_metrics):
+    flights = SingleFlight('test')
+    calls = []
+
+    results = run_in_threads(5, lambda: flights.do('key', slow('answer', calls)))
+
+    assert results == ['answer'] * 5
+    assert len(calls) == 1
+    assert fresh_metrics.count('single_flight.test.coalesced') == 4
+
+
+def test_waiters_see_the_leaders_error():
+    flights = SingleFlight('test')
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def call():
+        try:
+            flights.do('key', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    call()
+    leader.join()
+
+    assert len(errors) == 2
+
+
+def test_waiter_gives_up_at_its_timeout(fresh_metrics):
+    flights = SingleFlight('test')
+    calls = []
+    leader = threading.Thread(target=lambda: flights.do('key', slow('answer', calls, 0.5)))
+    leader.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    assert flights.do('key', slow('other', calls), timeout=0.05) is None
+    assert time.monotonic() - started < 0.3
+    leader.join()
+
+    assert fresh_metrics.count('single_flight.test.wait_timeouts') == 1
+
+
+def test_late_arrivals_start_a_fresh_call():
+    flights = SingleFlight('test')
+    calls = []
+
+    flights.do('key', slow('first', calls, 0))
+    assert flights.do('key', slow('second', calls, 0)) == 'second'
+    assert len(calls) == 2
+
+
+def test_lease_coalesces_across_workers(tmp_path, fresh_metrics):
+    path = tmp_path / 'flights.db'
+    worker_a, worker_b = lease_store(path), lease_store(path)
+    calls = []
+
+    holder = threading.Thread(target=lambda: worker_a.run('key', slow('answer', calls, 0.2), 'test'))
+    holder.start()
+    time.sleep(0.05)
+    result = worker_b.run('key', slow('duplicate', calls), 'test')
+    holder.join()
+
+    assert result == 'answer'
+    assert len(calls) == 1
+    assert fresh_metrics.count('single_flight.test.cross_worker_coalesced') == 1
+
+
+def test_lease_waiter_respects_its_timeout(tmp_path, fresh_metrics):
+    path = tmp_path / 'flights.db'
+    worker_a, worker_b = lease_store(path), lease_store(path)
+    calls = []
+
+    holder = threading.Thread(target=lambda: worker_a.run('key', slow('answer', calls, 1.0), 'test'))
+    holder.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    assert worker_b.run('key', slow('duplicate', calls), 'test', timeout=0.1) is None
+    assert time.monotonic() - started < 0.5
+    holder.join()
+
+    assert len(calls) == 1
+    assert fresh_metrics.count('single_flight.test.wait_timeouts') == 1
+
+
+def test_expired_lease_of_a_dead_worker_is_taken_over(tmp_path):
+    path = tmp_path / 'flights.db'
+    dead, alive = lease_store(path, lease_seconds=0.1), lease_store(path, lease_seconds=0.1)
+    # The holder took the lease and never published a result
+    assert dead._acquire('key')
+    calls = []
+
+    assert alive.run('key', slow('answer', calls, 0), 'test') == 'answer'
+    assert len(calls) == 1
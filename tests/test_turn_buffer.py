@@ -0,0 +1,175 @@
+"""
+Tests for the per-user recent-turn buffer
+A list stands in for the conversations table; two buffers sharing one version file are two workers
+"""
+
+import pytest
+
+from turn_buffer import HistoryVersions, TurnBuffer
+
+
+def turn(turn_id, text='hello'):
+    return {'id': turn_id, 'user_message': text, 'gabe_response': 'reply'}
+
+
+class FakeHistory:
+    """The database as seen by every worker - summary row plus saved turns"""
+
+    def __init__(self, turns=(), summary=None, summarized_through_id=0):
+        self.turns = list(turns)
+        self.summary = summary
+        self.summarized_through_id = summarized_through_id
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return self.summary, self.summarized_through_id, [dict(t) for t in self.turns[-4:]]
+
+
+@pytest.fixture
+def history():
+    return FakeHistory([turn(1), turn(2)])
+
+
+@pytest.fixture
+def versions(tmp_path):
+    return HistoryVersions(str(tmp_path / 'versions.db'))
+
+
+@pytest.fixture
+def worker(versions):
+    return TurnBuffer(turns_per_user=4, versions=versions)
+
+
+@pytest.fixture
+def other_worker(versions):
+    return TurnBuffer(turns_per_user=4, versions=versions)
+
+
+def read(buffer, history, user_id=7, limit=4):
+    return buffer.recent(user_id, limit, history.loader)
+
+
+def ids(turns):
+    return [t['id'] for t in turns]
+
+
+def test_second_read_is_served_from_memory(worker, history):
+    read(worker, history)
+    _, turns = read(worker, history)
+
+    assert ids(turns) == [1, 2]
+    assert history.loads == 1
+    assert worker.stats()['hits'] == 1 and worker.stats()['misses'] == 1
+
+
+def test_own_turns_keep_the_buffer_fresh(worker, history):
+    read(worker, history)
+
+    pending = turn(None, 'new')
+    worker.append(7, pending)
+    assert ids(read(worker, history)[1]) == [1, 2, None]
+
+    # The group commit fills the id in place and reports the row
+    pending['id'] = 3
+    history.turns.append(turn(3, 'new'))
+    worker.committed(7)
+
+    assert ids(read(worker, history)[1]) == [1, 2, 3]
+    assert history.loads == 1
+
+
+def test_turn_committed_by_another_worker_reloads(worker, other_worker, history, fresh_metrics):
+    read(worker, history)
+    read(other_worker, history)
+
+    history.turns.append(turn(3, 'from the other worker'))
+    other_worker.append(7, turn(3, 'from the other worker'))
+    other_worker.committed(7)
+
+    assert ids(read(worker, history)[1]) == [1, 2, 3]
+    assert history.loads == 3
+    assert fresh_metrics.count('turn_buffer.stale') == 1
+    # The worker that wrote it stays current
+    assert ids(read(other_worker, history)[1]) == [1, 2, 3]
+    assert history.loads == 3
+
+
+def test_clear_through_another_worker_reloads_and_keeps_pending_turns(worker, other_worker, history):
+    read(worker, history)
+    worker.append(7, turn(None, 'still committing'))
+
+    # clear_history moves the summary past every saved turn, then the buffers are invalidated
+    history.summarized_through_id, history.summary = 2, ''
+    other_worker.invalidate(7)
+    summary, turns = read(worker, history)
+
+    assert summary == ''
+    assert ids(turns) == [None]
+    assert history.loads == 2
+
+
+def test_summary_from_another_worker_reloads(worker, other_worker, history):
+    read(worker, history)
+
+    history.summary, history.summarized_through_id = 'talked about work', 1
+    other_worker.update_summary(7, 'talked about work', 1)
+
+    summary, turns = read(worker, history)
+    assert summary == 'talked about work'
+    assert ids(turns) == [2]
+
+
+def test_summary_update_hides_summarized_turns(worker, history):
+    read(worker, history)
+
+    worker.update_summary(7, 'talked about work', 1)
+    # An older summary arriving late doesn't roll it back
+    worker.update_summary(7, 'stale', 0)
+
+    summary, turns = read(worker, history)
+    assert summary == 'talked about work'
+    assert ids(turns) == [2]
+    assert history.loads == 1
+
+
+def test_unreadable_versions_fall_back_to_the_database(worker, versions, history, monkeypatch):
+    read(worker, history)
+    monkeypatch.setattr(versions, 'current', lambda user_id: None)
+
+    read(worker, history)
+    read(worker, history)
+    assert history.loads == 3
+
+
+def test_versions_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'versions.db')
+    assert HistoryVersions(path).bump(7) == (0, 1)
+    assert HistoryVersions(path).bump(7) == (1, 2)
+    assert HistoryVersions(path).current(7) == 2
+    assert HistoryVersions(path).current(8) == 0
+
+
+def test_ring_buffer_keeps_only_the_newest_turns(history):
+    buffer = TurnBuffer(turns_per_user=3)
+    read(buffer, history)
+    for turn_id in (3, 4):
+        buffer.append(7, turn(turn_id))
+
+    assert ids(read(buffer, history, limit=10)[1]) == [2, 3, 4]
+    assert ids(read(buffer, history, limit=2)[1]) == [3, 4]
+
+
+def test_append_ignores_users_without_a_buffer(worker):
+    worker.append(7, turn(1))
+
+    assert worker.stats()['memory_entries'] == 0
+
+
+def test_least_recently_used_users_are_evicted(history):
+    buffer = TurnBuffer(turns_per_user=4, max_users=2)
+    for user_id in (1, 2, 3):
+        read(buffer, history, user_id=user_id)
+
+    read(buffer, history, user_id=1)
+    assert history.loads == 4
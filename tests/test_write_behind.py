@@ -0,0 +1,99 @@
+"""
+Tests for the write-behind Firestore queue
+A fake WriteBatch records what each commit would have sent
+"""
+
+import time
+
+import pytest
+
+from write_behind import WriteBehindWriter
+
+
+class FakeBatch:
+
+    def __init__(self, log, fail=False):
+        self.log = log
+        self.fail = fail
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        assert merge
+        self.writes.append((ref, data))
+
+    def commit(self):
+        if self.fail:
+            raise RuntimeError('firestore unavailable')
+        self.log.append(self.writes)
+
+
+@pytest.fixture
+def committed():
+    return []
+
+
+@pytest.fixture
+def writer(monkeypatch, committed):
+    monkeypatch.setenv('GABE_WRITE_BEHIND_FLUSH_SECONDS', '60')
+    monkeypatch.setenv('GABE_WRITE_BEHIND_BATCH_SIZE', '3')
+    monkeypatch.setenv('GABE_WRITE_BEHIND_MAX_PENDING', '5')
+    writer = WriteBehindWriter('test', lambda: FakeBatch(committed, fail=writer.failing))
+    writer.failing = False
+    return writer
+
+
+def test_writes_to_one_document_are_coalesced(writer, committed, fresh_metrics):
+    writer.put('users/1', 'ref1', {'name': 'Ray', 'last_active': 1})
+    writer.put('users/1', 'ref1', {'last_active': 2})
+
+    assert writer.flush() == 1
+    assert committed == [[('ref1', {'name': 'Ray', 'last_active': 2})]]
+    assert fresh_metrics.count('write_behind.test.coalesced') == 1
+
+
+def test_flush_splits_into_batches(writer, committed):
+    for i in range(2):
+        writer.put(f'users/{i}', f'ref{i}', {'n': i})
+    writer.batch_size = 1
+
+    assert writer.flush() == 2
+    assert [len(batch) for batch in committed] == [1, 1]
+
+
+def test_full_queue_drops_new_documents(writer, fresh_metrics):
+    writer.batch_size = 100
+    for i in range(5):
+        assert writer.put(f'users/{i}', f'ref{i}', {'n': i})
+
+    assert not writer.put('users/5', 'ref5', {'n': 5})
+    # Updates to an already queued document still fold in
+    assert writer.put('users/0', 'ref0', {'n': 'updated'})
+    assert writer.pending() == 5
+    assert fresh_metrics.count('write_behind.test.dropped') == 1
+
+
+def test_failed_commit_requeues_with_newer_fields_winning(writer, committed, fresh_metrics):
+    writer.put('users/1', 'ref1', {'name': 'Ray', 'last_active': 1})
+    writer.failing = True
+    assert writer.flush() == 0
+    assert writer.pending() == 1
+
+    writer.put('users/1', 'ref1', {'last_active': 2})
+    writer.failing = False
+    assert writer.flush() == 1
+
+    assert committed == [[('ref1', {'name': 'Ray', 'last_active': 2})]]
+    assert fresh_metrics.count('write_behind.test.failures') == 1
+
+
+def test_full_batch_wakes_the_background_flusher(writer, committed):
+    for i in range(3):
+        writer.put(f'users/{i}', f'ref{i}', {'n': i})
+
+    for _ in range(100):
+        if committed:
+            break
+        time.sleep(0.01)
+
+    assert len(committed) == 1 and len(committed[0]) == 3
+    assert writer.pending() == 0